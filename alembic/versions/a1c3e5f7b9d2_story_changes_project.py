@@ -0,0 +1,54 @@
+"""Record the project of each story change
+
+Revision ID: a1c3e5f7b9d2
+Revises: f4b6d8a0c2e3
+Create Date: 2026-10-20 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'f4b6d8a0c2e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "a1c3e5f7b9d2_story_changes_project_id"
+
+# Changes of stories deleted before this revision fall back to the default project
+PROJECT_OF_STORY = (
+    "project_id = COALESCE("
+    "(SELECT stories.project_id FROM stories WHERE stories.id = story_changes.story_id), "
+    "(SELECT stories_archive.project_id FROM stories_archive WHERE stories_archive.id = story_changes.story_id), "
+    "1)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if "project_id" not in [c["name"] for c in inspect(conn).get_columns("story_changes")]:
+        backfill.start(conn, BACKFILL)
+        op.add_column("story_changes", sa.Column("project_id", sa.Integer(), nullable=True))
+
+    if backfill.is_pending(conn, BACKFILL):
+        backfill.update(conn, BACKFILL, "story_changes", PROJECT_OF_STORY)
+
+    if "ix_story_changes_project_id_id" not in {i["name"] for i in inspect(conn).get_indexes("story_changes")}:
+        op.create_index("ix_story_changes_project_id_id", "story_changes", ["project_id", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    backfill.reset(conn, BACKFILL)
+    if "ix_story_changes_project_id_id" in {i["name"] for i in inspect(conn).get_indexes("story_changes")}:
+        op.drop_index("ix_story_changes_project_id_id", table_name="story_changes")
+    if "project_id" in [c["name"] for c in inspect(conn).get_columns("story_changes")]:
+        op.drop_column("story_changes", "project_id")
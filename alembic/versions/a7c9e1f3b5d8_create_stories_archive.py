@@ -0,0 +1,68 @@
+"""Create stories_archive for stories past the retention policy
+
+Revision ID: a7c9e1f3b5d8
+Revises: f6b8d0e2a4c7
+Create Date: 2026-10-19 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f3b5d8'
+down_revision: Union[str, Sequence[str], None] = 'f6b8d0e2a4c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "stories_archive" not in inspector.get_table_names():
+        op.create_table(
+            "stories_archive",
+            # The story's original id, kept so it can be restored under it
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("title", sa.String(length=250), nullable=False),
+            sa.Column("description", sa.Text(), nullable=False),
+            sa.Column("assignees", sa.JSON(), nullable=True),
+            sa.Column("status", sa.String(length=250), nullable=False, server_default="Backlog"),
+            sa.Column("tags", sa.String(length=500), nullable=True),
+            sa.Column("acceptance_criteria", sa.JSON(), nullable=True),
+            sa.Column("story_points", sa.Integer(), nullable=True),
+            sa.Column("moscow_priority", sa.String(length=50), nullable=True),
+            sa.Column("activity", sa.JSON(), nullable=True),
+            sa.Column("created_by", sa.String(length=250), nullable=True),
+            sa.Column("created_on", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("bv", sa.Integer(), nullable=True),
+            sa.Column("refinement_session_scheduled", sa.Boolean(), nullable=True),
+            sa.Column("groomed", sa.Boolean(), nullable=True),
+            sa.Column("dependencies", sa.JSON(), nullable=True),
+            sa.Column("session_documented", sa.Boolean(), nullable=True),
+            sa.Column("refinement_dependencies", sa.JSON(), nullable=True),
+            sa.Column("team_approval", sa.Boolean(), nullable=True),
+            sa.Column("po_approval", sa.Boolean(), nullable=True),
+            sa.Column("sprint_capacity", sa.Integer(), nullable=True),
+            sa.Column("skills_available", sa.Boolean(), nullable=True),
+            sa.Column("team_commits", sa.Boolean(), nullable=True),
+            sa.Column("tasks_identified", sa.Boolean(), nullable=True),
+            sa.Column("archived_on", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("archived_reason", sa.String(length=50), nullable=True),
+            sa.Column("dependents", sa.JSON(), nullable=True),
+        )
+        op.create_index(op.f("ix_stories_archive_archived_on"), "stories_archive", ["archived_on"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "stories_archive" in inspector.get_table_names():
+        op.drop_index(op.f("ix_stories_archive_archived_on"), table_name="stories_archive")
+        op.drop_table("stories_archive")
@@ -0,0 +1,141 @@
+"""Key daily_status_rollup by project and recompute it per project
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-20 11:00:00.000000
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e1'
+down_revision: Union[str, Sequence[str], None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+DEFAULT_PROJECT_ID = 1
+
+rollup_table = sa.table(
+    "daily_status_rollup",
+    sa.column("project_id", sa.Integer),
+    sa.column("day", sa.Date),
+    sa.column("status", sa.String),
+    sa.column("entered", sa.Integer),
+    sa.column("exited", sa.Integer),
+)
+
+# The table before this revision
+global_rollup_table = sa.table(
+    "daily_status_rollup",
+    sa.column("day", sa.Date),
+    sa.column("status", sa.String),
+    sa.column("entered", sa.Integer),
+    sa.column("exited", sa.Integer),
+)
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _create_table(with_project: bool):
+    columns = [sa.Column("project_id", sa.Integer(), nullable=False, server_default="1")] if with_project else []
+    op.create_table(
+        "daily_status_rollup",
+        *columns,
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("status", sa.String(length=250), nullable=False),
+        sa.Column("entered", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("exited", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint(*(["project_id"] if with_project else []), "day", "status"),
+    )
+
+
+def _story_projects(conn) -> dict:
+    """story id -> project id, for live, archived and deleted stories."""
+    projects = {}
+    for query in (
+        "SELECT story_id, project_id FROM story_changes WHERE project_id IS NOT NULL",
+        "SELECT id, project_id FROM stories_archive",
+        "SELECT id, project_id FROM stories",
+    ):
+        projects.update(conn.execute(sa.text(query)).fetchall())
+    return projects
+
+
+def _counts(conn) -> Counter:
+    """(project_id, day, status, "entered"/"exited") -> count from the transition log."""
+    project_of = _story_projects(conn)
+    counts = Counter()
+    last_status = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, story_id, from_status, to_status, changed_on "
+                "FROM story_status_transitions WHERE id > :last_id ORDER BY id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        for _, story_id, from_status, to_status, changed_on in rows:
+            changed_on = _as_datetime(changed_on)
+            day = changed_on.date()
+            project_id = project_of.get(story_id, DEFAULT_PROJECT_ID)
+            if from_status:
+                counts[(project_id, day, from_status, "exited")] += 1
+            counts[(project_id, day, to_status, "entered")] += 1
+            if story_id not in last_status or last_status[story_id][0] <= changed_on:
+                last_status[story_id] = (changed_on, to_status)
+        last_id = rows[-1][0]
+
+    # Deleted stories leave their last status on the day they were deleted
+    deletions = conn.execute(sa.text(
+        "SELECT story_id, changed_on FROM story_changes WHERE operation = 'deleted'"
+    ))
+    for story_id, changed_on in deletions:
+        if story_id in last_status:
+            project_id = project_of.get(story_id, DEFAULT_PROJECT_ID)
+            counts[(project_id, _as_datetime(changed_on).date(), last_status[story_id][1], "exited")] += 1
+    return counts
+
+
+def _insert(counts: Counter, with_project: bool):
+    rows = {}
+    for (project_id, day, status, column), count in counts.items():
+        key = (project_id, day, status) if with_project else (day, status)
+        row = rows.setdefault(key, {"day": day, "status": status, "entered": 0, "exited": 0})
+        if with_project:
+            row["project_id"] = project_id
+        row[column] += count
+    if rows:
+        op.bulk_insert(rollup_table if with_project else global_rollup_table, list(rows.values()))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if "project_id" in [c["name"] for c in inspect(conn).get_columns("daily_status_rollup")]:
+        return
+    # The rollup is derived data: rebuild it under the new key rather than migrating rows
+    op.drop_table("daily_status_rollup")
+    _create_table(with_project=True)
+    _insert(_counts(conn), with_project=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    if "project_id" not in [c["name"] for c in inspect(conn).get_columns("daily_status_rollup")]:
+        return
+    op.drop_table("daily_status_rollup")
+    _create_table(with_project=False)
+    _insert(_counts(conn), with_project=False)
@@ -0,0 +1,105 @@
+"""Create projects and project_members, scope stories by project_id
+
+Revision ID: c1e3a5b7d9f0
+Revises: a7c9e1f3b5d8
+Create Date: 2026-10-19 14:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1e3a5b7d9f0'
+down_revision: Union[str, Sequence[str], None] = 'a7c9e1f3b5d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Existing stories and users move into this project
+DEFAULT_PROJECT_ID = 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+
+    if "projects" not in tables:
+        op.create_table(
+            "projects",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(length=250), nullable=False, unique=True),
+            sa.Column("created_by", sa.String(length=250), nullable=True),
+            sa.Column("created_on", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index(op.f("ix_projects_id"), "projects", ["id"])
+        op.execute(f"INSERT INTO projects (id, name) VALUES ({DEFAULT_PROJECT_ID}, 'Default')")
+
+    if "project_members" not in tables:
+        op.create_table(
+            "project_members",
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id", ondelete="CASCADE"),
+                      primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"),
+                      primary_key=True),
+        )
+        op.create_index(op.f("ix_project_members_user_id"), "project_members", ["user_id"])
+        op.execute(
+            f"INSERT INTO project_members (project_id, user_id) SELECT {DEFAULT_PROJECT_ID}, id FROM users"
+        )
+
+    # A column with a server default needs no backfill: existing rows read the default
+    columns = [c["name"] for c in inspector.get_columns("stories")]
+    if "project_id" not in columns:
+        op.add_column(
+            "stories",
+            sa.Column("project_id", sa.Integer(), nullable=False, server_default=str(DEFAULT_PROJECT_ID)),
+        )
+        op.create_index("ix_stories_project_id_status", "stories", ["project_id", "status"])
+        op.create_index("ix_stories_project_id_created_on", "stories", ["project_id", "created_on"])
+        # SQLite cannot add a constraint to an existing table
+        if conn.dialect.name != "sqlite":
+            op.create_foreign_key(
+                "fk_stories_project_id_projects", "stories", "projects", ["project_id"], ["id"]
+            )
+
+    columns = [c["name"] for c in inspector.get_columns("stories_archive")]
+    if "project_id" not in columns:
+        op.add_column(
+            "stories_archive",
+            sa.Column("project_id", sa.Integer(), nullable=False, server_default=str(DEFAULT_PROJECT_ID)),
+        )
+        op.drop_index(op.f("ix_stories_archive_archived_on"), table_name="stories_archive")
+        op.create_index("ix_stories_archive_project_id_archived_on", "stories_archive",
+                        ["project_id", "archived_on"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+
+    columns = [c["name"] for c in inspector.get_columns("stories_archive")]
+    if "project_id" in columns:
+        op.drop_index("ix_stories_archive_project_id_archived_on", table_name="stories_archive")
+        op.create_index(op.f("ix_stories_archive_archived_on"), "stories_archive", ["archived_on"])
+        op.drop_column("stories_archive", "project_id")
+
+    columns = [c["name"] for c in inspector.get_columns("stories")]
+    if "project_id" in columns:
+        if conn.dialect.name != "sqlite":
+            op.drop_constraint("fk_stories_project_id_projects", "stories", type_="foreignkey")
+        op.drop_index("ix_stories_project_id_created_on", table_name="stories")
+        op.drop_index("ix_stories_project_id_status", table_name="stories")
+        op.drop_column("stories", "project_id")
+
+    if "project_members" in tables:
+        op.drop_index(op.f("ix_project_members_user_id"), table_name="project_members")
+        op.drop_table("project_members")
+    if "projects" in tables:
+        op.drop_index(op.f("ix_projects_id"), table_name="projects")
+        op.drop_table("projects")
@@ -0,0 +1,49 @@
+"""Create story_changes outbox table
+
+Revision ID: c3e5a7b9d1f2
+Revises: abcd1234_moscow
+Create Date: 2026-10-18 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f2'
+down_revision: Union[str, Sequence[str], None] = 'abcd1234_moscow'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "story_changes" not in inspector.get_table_names():
+        op.create_table(
+            "story_changes",
+            sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+                      primary_key=True, autoincrement=True),
+            sa.Column("story_id", sa.Integer(), nullable=False),
+            sa.Column("operation", sa.String(length=20), nullable=False),
+            sa.Column("changed_by", sa.String(length=250), nullable=True),
+            sa.Column("changed_on", sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+        )
+        op.create_index(op.f("ix_story_changes_story_id"),
+                        "story_changes", ["story_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "story_changes" in inspector.get_table_names():
+        op.drop_index(op.f("ix_story_changes_story_id"),
+                      table_name="story_changes")
+        op.drop_table("story_changes")
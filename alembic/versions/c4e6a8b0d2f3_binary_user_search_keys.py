@@ -0,0 +1,69 @@
+"""Binary collation and Python-normalized values for user search keys
+
+Revision ID: c4e6a8b0d2f3
+Revises: b2d4f6a8c0e1
+Create Date: 2026-10-20 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e6a8b0d2f3'
+down_revision: Union[str, Sequence[str], None] = 'b2d4f6a8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# For databases that ran f4b6d8a0c2e3 before it set the collation and
+# computed the keys in Python
+BACKFILL = "c4e6a8b0d2f3_users_search_keys"
+
+KEYS = [
+    ("username_key", "username", 250),
+    ("first_name_key", "first_name", 250),
+    ("last_name_key", "last_name", 250),
+    ("email_key", "email", 255),
+]
+
+
+def search_key(value):
+    # models.search_key
+    return value.lower() if value else None
+
+
+def fill_keys(chunk, low, high):
+    rows = chunk.execute(
+        sa.text("SELECT id, " + ", ".join(source for _, source, _ in KEYS)
+                + " FROM users WHERE id > :low AND id <= :high"),
+        {"low": low, "high": high},
+    ).mappings().fetchall()
+    if rows:
+        chunk.execute(
+            sa.text("UPDATE users SET " + ", ".join(f"{key} = :{key}" for key, _, _ in KEYS) + " WHERE id = :id"),
+            [{"id": row["id"], **{key: search_key(row[source]) for key, source, _ in KEYS}} for row in rows],
+        )
+    return len(rows)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if conn.dialect.name == "mysql":
+        for key, _, length in KEYS:
+            op.alter_column("users", key, type_=mysql.VARCHAR(length, collation="utf8mb4_bin"),
+                            existing_nullable=True)
+    backfill.run(conn, BACKFILL, "users", fill_keys)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    backfill.reset(conn, BACKFILL)
+    if conn.dialect.name == "mysql":
+        for key, _, length in KEYS:
+            op.alter_column("users", key, type_=sa.String(length=length), existing_nullable=True)
@@ -0,0 +1,95 @@
+"""Canonical status and created_by_key with project-leading filter indexes
+
+Revision ID: d2f4b6c8e0a1
+Revises: c1e3a5b7d9f0
+Create Date: 2026-10-19 16:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f4b6c8e0a1'
+down_revision: Union[str, Sequence[str], None] = 'c1e3a5b7d9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# main.VALID_STATUSES at the time of this revision
+STATUSES = [
+    "Backlog",
+    "Proposed",
+    "Needs Refinement",
+    "In Refinement",
+    "Ready To Commit",
+    "Sprint Ready",
+]
+
+# Rewrite legacy differently-cased statuses to their canonical label
+NORMALIZE = (
+    "status = CASE LOWER(status) "
+    + " ".join(f"WHEN '{s.lower()}' THEN '{s}'" for s in STATUSES)
+    + " ELSE status END, created_by_key = LOWER(created_by)"
+)
+
+TABLES = {
+    "stories": [
+        ("ix_stories_project_id_status_created_on", ["project_id", "status", "created_on"]),
+        ("ix_stories_project_id_created_by_key_created_on", ["project_id", "created_by_key", "created_on"]),
+    ],
+    "stories_archive": [
+        ("ix_stories_archive_project_id_status_created_on", ["project_id", "status", "created_on"]),
+        ("ix_stories_archive_project_id_created_by_key_created_on",
+         ["project_id", "created_by_key", "created_on"]),
+    ],
+}
+
+
+def _backfill_name(table):
+    return f"d2f4b6c8e0a1_{table}_filter_columns"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    for table, indexes in TABLES.items():
+        inspector = inspect(conn)
+        columns = [c["name"] for c in inspector.get_columns(table)]
+        if "created_by_key" not in columns:
+            backfill.start(conn, _backfill_name(table))
+            op.add_column(table, sa.Column("created_by_key", sa.String(length=250), nullable=True))
+
+        # Fill the rows before building the indexes over them
+        if backfill.is_pending(conn, _backfill_name(table)):
+            backfill.update(conn, _backfill_name(table), table, NORMALIZE)
+
+        existing = {index["name"] for index in inspect(conn).get_indexes(table)}
+        for name, index_columns in indexes:
+            if name not in existing:
+                op.create_index(name, table, index_columns)
+
+    # Superseded by (project_id, status, created_on)
+    if "ix_stories_project_id_status" in {index["name"] for index in inspect(conn).get_indexes("stories")}:
+        op.drop_index("ix_stories_project_id_status", table_name="stories")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+
+    if "ix_stories_project_id_status" not in {index["name"] for index in inspect(conn).get_indexes("stories")}:
+        op.create_index("ix_stories_project_id_status", "stories", ["project_id", "status"])
+
+    for table, indexes in TABLES.items():
+        backfill.reset(conn, _backfill_name(table))
+        existing = {index["name"] for index in inspect(conn).get_indexes(table)}
+        for name, _ in indexes:
+            if name in existing:
+                op.drop_index(name, table_name=table)
+        if "created_by_key" in [c["name"] for c in inspect(conn).get_columns(table)]:
+            op.drop_column(table, "created_by_key")
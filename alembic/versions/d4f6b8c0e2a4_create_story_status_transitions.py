@@ -0,0 +1,154 @@
+"""Create story_status_transitions and backfill it from activity logs
+
+Revision ID: d4f6b8c0e2a4
+Revises: c3e5a7b9d1f2
+Create Date: 2026-10-18 11:00:00.000000
+"""
+import json
+import re
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e2a4'
+down_revision: Union[str, Sequence[str], None] = 'c3e5a7b9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "d4f6b8c0e2a4_story_status_transitions"
+
+# Matches both "Changed status from 'A' to 'B'" and "DEMOTED status from 'A' to 'B'"
+STATUS_CHANGE = re.compile(r"status from '([^']*)' to '([^']*)'")
+
+# main.VALID_STATUSES at the time of this revision; legacy differently-cased
+# labels are recorded in their canonical form, as d2f4b6c8e0a1 later
+# rewrites stories.status
+STATUSES = [
+    "Backlog",
+    "Proposed",
+    "Needs Refinement",
+    "In Refinement",
+    "Ready To Commit",
+    "Sprint Ready",
+]
+CANONICAL = {s.lower(): s for s in STATUSES}
+
+
+def _canonical(status):
+    return CANONICAL.get(status.strip().lower(), status) if status else status
+
+transitions_table = sa.table(
+    "story_status_transitions",
+    sa.column("story_id", sa.Integer),
+    sa.column("from_status", sa.String),
+    sa.column("to_status", sa.String),
+    sa.column("changed_by", sa.String),
+    sa.column("changed_on", sa.DateTime),
+)
+
+
+def _transitions_for(story_id, status, created_by, created_on, activity):
+    """Rebuild a story's transitions from its free-text activity entries."""
+    if isinstance(activity, str):
+        activity = json.loads(activity)
+    moves = []
+    for entry in activity or []:
+        if not isinstance(entry, dict):
+            continue
+        match = STATUS_CHANGE.search(entry.get("action", ""))
+        if not match:
+            continue
+        try:
+            when = datetime.strptime(entry.get("timestamp", ""), "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+        moves.append((when, _canonical(match.group(1)), _canonical(match.group(2)), entry.get("user")))
+    moves.sort(key=lambda m: m[0])
+
+    if isinstance(created_on, str):
+        created_on = datetime.fromisoformat(created_on)
+    created_on = created_on or (moves[0][0] if moves else datetime.now())
+    status = _canonical(status)
+    initial = moves[0][1] if moves else status
+    rows = [{
+        "story_id": story_id, "from_status": None, "to_status": initial,
+        "changed_by": created_by, "changed_on": created_on,
+    }]
+    rows.extend({
+        "story_id": story_id, "from_status": old, "to_status": new,
+        "changed_by": user, "changed_on": when,
+    } for when, old, new, user in moves)
+    # Moves that were never logged (or not parsed) must still end the history
+    # in the story's current status; the time of such a move is unknown, so it
+    # is placed at the last known one
+    last = rows[-1]
+    if status and last["to_status"] != status:
+        rows.append({
+            "story_id": story_id, "from_status": last["to_status"], "to_status": status,
+            "changed_by": None, "changed_on": max(last["changed_on"], created_on),
+        })
+    return rows
+
+
+def _backfill_range(chunk, low, high):
+    stories = chunk.execute(
+        sa.text(
+            "SELECT id, status, created_by, created_on, activity FROM stories "
+            "WHERE id > :low AND id <= :high"
+        ),
+        {"low": low, "high": high},
+    ).fetchall()
+    rows = []
+    for story in stories:
+        rows.extend(_transitions_for(*story))
+    if rows:
+        chunk.execute(transitions_table.insert(), rows)
+    return len(stories)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "story_status_transitions" not in inspector.get_table_names():
+        backfill.start(conn, BACKFILL)
+        op.create_table(
+            "story_status_transitions",
+            sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+                      primary_key=True, autoincrement=True),
+            sa.Column("story_id", sa.Integer(), nullable=False),
+            sa.Column("from_status", sa.String(length=250), nullable=True),
+            sa.Column("to_status", sa.String(length=250), nullable=False),
+            sa.Column("changed_by", sa.String(length=250), nullable=True),
+            sa.Column("changed_on", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index("ix_story_status_transitions_story_id_changed_on",
+                        "story_status_transitions", ["story_id", "changed_on"])
+        op.create_index(op.f("ix_story_status_transitions_changed_on"),
+                        "story_status_transitions", ["changed_on"])
+
+    # Backfill history from the activity log, one primary-key range at a time
+    if backfill.is_pending(conn, BACKFILL):
+        backfill.run(conn, BACKFILL, "stories", _backfill_range)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    backfill.reset(conn, BACKFILL)
+    if "story_status_transitions" in inspector.get_table_names():
+        op.drop_index(op.f("ix_story_status_transitions_changed_on"),
+                      table_name="story_status_transitions")
+        op.drop_index("ix_story_status_transitions_story_id_changed_on",
+                      table_name="story_status_transitions")
+        op.drop_table("story_status_transitions")
@@ -0,0 +1,62 @@
+"""Resolve story creators whose username differs only in case
+
+Revision ID: d6f8a0c2e4b5
+Revises: c4e6a8b0d2f3
+Create Date: 2026-10-20 13:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6f8a0c2e4b5'
+down_revision: Union[str, Sequence[str], None] = 'c4e6a8b0d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# e3a5c7e9f1b2 first matched creators by exact username only; databases that
+# ran it then still have created_by_id null where story_users would match
+STORY_TABLES = ("stories", "stories_archive")
+
+
+def _backfill(table):
+    return f"d6f8a0c2e4b5_{table}_created_by_id"
+
+
+def _fill_creators(table, folded):
+    def process(chunk, low, high):
+        stories = chunk.execute(
+            sa.text(f"SELECT id, created_by FROM {table} WHERE id > :low AND id <= :high "
+                    "AND created_by IS NOT NULL AND created_by_id IS NULL"),
+            {"low": low, "high": high},
+        ).fetchall()
+        rows = [
+            {"story_id": story_id, "user_id": folded[created_by.lower()]}
+            for story_id, created_by in stories if created_by.lower() in folded
+        ]
+        if rows:
+            chunk.execute(sa.text(f"UPDATE {table} SET created_by_id = :user_id WHERE id = :story_id"), rows)
+        return len(rows)
+    return process
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    folded = {
+        username.lower(): user_id
+        for user_id, username in conn.execute(sa.text("SELECT id, username FROM users"))
+    }
+    for table in STORY_TABLES:
+        backfill.run(conn, _backfill(table), table, _fill_creators(table, folded))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    for table in STORY_TABLES:
+        backfill.reset(conn, _backfill(table))
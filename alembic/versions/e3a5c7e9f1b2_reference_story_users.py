@@ -0,0 +1,145 @@
+"""Reference story creators and assignees by user id
+
+Revision ID: e3a5c7e9f1b2
+Revises: d2f4b6c8e0a1
+Create Date: 2026-10-19 18:00:00.000000
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a5c7e9f1b2'
+down_revision: Union[str, Sequence[str], None] = 'd2f4b6c8e0a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STORY_TABLES = ("stories", "stories_archive")
+
+assignees_table = sa.table(
+    "story_assignees",
+    sa.column("story_id", sa.Integer),
+    sa.column("user_id", sa.Integer),
+)
+
+
+def _creator_backfill(table):
+    return f"e3a5c7e9f1b2_{table}_created_by_id"
+
+
+def _assignee_backfill(table):
+    return f"e3a5c7e9f1b2_{table}_assignees"
+
+
+def _user_ids(conn):
+    """(username -> id, lowercased username -> id), as story_users.stage_story matches them."""
+    exact, folded = {}, {}
+    for user_id, username in conn.execute(sa.text("SELECT id, username FROM users")):
+        exact[username] = user_id
+        folded[username.lower()] = user_id
+    return exact, folded
+
+
+def _copy_creators(table, exact, folded):
+    # Exact username first, case-insensitive fallback for the rest
+    def process(chunk, low, high):
+        stories = chunk.execute(
+            sa.text(f"SELECT id, created_by FROM {table} "
+                    "WHERE id > :low AND id <= :high AND created_by IS NOT NULL"),
+            {"low": low, "high": high},
+        ).fetchall()
+        rows = [
+            {"story_id": story_id, "user_id": exact.get(created_by, folded.get(created_by.lower()))}
+            for story_id, created_by in stories
+        ]
+        rows = [row for row in rows if row["user_id"] is not None]
+        if rows:
+            chunk.execute(sa.text(f"UPDATE {table} SET created_by_id = :user_id WHERE id = :story_id"), rows)
+        return len(stories)
+    return process
+
+
+def _copy_assignees(table, user_ids):
+    def process(chunk, low, high):
+        stories = chunk.execute(
+            sa.text(f"SELECT id, assignees FROM {table} WHERE id > :low AND id <= :high"),
+            {"low": low, "high": high},
+        ).fetchall()
+        rows = []
+        for story_id, assignees in stories:
+            if isinstance(assignees, str):
+                assignees = json.loads(assignees)
+            if isinstance(assignees, str):
+                assignees = [name.strip() for name in assignees.split(",")]
+            wanted = {user_ids[name.lower()] for name in assignees or [] if name and name.lower() in user_ids}
+            rows.extend({"story_id": story_id, "user_id": user_id} for user_id in sorted(wanted))
+        if rows:
+            chunk.execute(assignees_table.insert(), rows)
+        return len(stories)
+    return process
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "story_assignees" not in inspector.get_table_names():
+        for table in STORY_TABLES:
+            backfill.start(conn, _assignee_backfill(table))
+        op.create_table(
+            "story_assignees",
+            sa.Column("story_id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"),
+                      primary_key=True),
+        )
+        op.create_index(op.f("ix_story_assignees_user_id"), "story_assignees", ["user_id"])
+
+    for table in STORY_TABLES:
+        columns = [c["name"] for c in inspect(conn).get_columns(table)]
+        if "created_by_id" not in columns:
+            backfill.start(conn, _creator_backfill(table))
+            op.add_column(table, sa.Column("created_by_id", sa.Integer(), nullable=True))
+
+    exact, folded = _user_ids(conn)
+    for table in STORY_TABLES:
+        if backfill.is_pending(conn, _creator_backfill(table)):
+            backfill.run(conn, _creator_backfill(table), table, _copy_creators(table, exact, folded))
+        if backfill.is_pending(conn, _assignee_backfill(table)):
+            backfill.run(conn, _assignee_backfill(table), table, _copy_assignees(table, folded))
+
+    if op.f("ix_stories_created_by_id") not in {index["name"] for index in inspect(conn).get_indexes("stories")}:
+        op.create_index(op.f("ix_stories_created_by_id"), "stories", ["created_by_id"])
+        # SQLite cannot add a constraint to an existing table
+        if conn.dialect.name != "sqlite":
+            op.create_foreign_key(
+                "fk_stories_created_by_id_users", "stories", "users",
+                ["created_by_id"], ["id"], ondelete="SET NULL",
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if op.f("ix_stories_created_by_id") in {index["name"] for index in inspector.get_indexes("stories")}:
+        if conn.dialect.name != "sqlite":
+            op.drop_constraint("fk_stories_created_by_id_users", "stories", type_="foreignkey")
+        op.drop_index(op.f("ix_stories_created_by_id"), table_name="stories")
+
+    for table in STORY_TABLES:
+        backfill.reset(conn, _creator_backfill(table))
+        backfill.reset(conn, _assignee_backfill(table))
+        if "created_by_id" in [c["name"] for c in inspect(conn).get_columns(table)]:
+            op.drop_column(table, "created_by_id")
+
+    if "story_assignees" in inspector.get_table_names():
+        op.drop_index(op.f("ix_story_assignees_user_id"), table_name="story_assignees")
+        op.drop_table("story_assignees")
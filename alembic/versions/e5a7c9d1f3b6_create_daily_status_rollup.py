@@ -0,0 +1,100 @@
+"""Create daily_status_rollup and backfill it from story_status_transitions
+
+Revision ID: e5a7c9d1f3b6
+Revises: d4f6b8c0e2a4
+Create Date: 2026-10-18 14:00:00.000000
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f3b6'
+down_revision: Union[str, Sequence[str], None] = 'd4f6b8c0e2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+rollup_table = sa.table(
+    "daily_status_rollup",
+    sa.column("day", sa.Date),
+    sa.column("status", sa.String),
+    sa.column("entered", sa.Integer),
+    sa.column("exited", sa.Integer),
+)
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "daily_status_rollup" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "daily_status_rollup",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("status", sa.String(length=250), nullable=False),
+        sa.Column("entered", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("exited", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("day", "status"),
+    )
+
+    # Per-day entries/exits from the transition log, read one id range at a time
+    counts = Counter()
+    last_status = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, story_id, from_status, to_status, changed_on "
+                "FROM story_status_transitions WHERE id > :last_id ORDER BY id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        for _, story_id, from_status, to_status, changed_on in rows:
+            changed_on = _as_datetime(changed_on)
+            day = changed_on.date()
+            if from_status:
+                counts[(day, from_status, "exited")] += 1
+            counts[(day, to_status, "entered")] += 1
+            if story_id not in last_status or last_status[story_id][0] <= changed_on:
+                last_status[story_id] = (changed_on, to_status)
+        last_id = rows[-1][0]
+
+    # Deleted stories leave their last status on the day they were deleted
+    deletions = conn.execute(sa.text(
+        "SELECT story_id, changed_on FROM story_changes WHERE operation = 'deleted'"
+    ))
+    for story_id, changed_on in deletions:
+        if story_id in last_status:
+            counts[(_as_datetime(changed_on).date(), last_status[story_id][1], "exited")] += 1
+
+    rollup = {}
+    for (day, status, column), count in counts.items():
+        row = rollup.setdefault((day, status), {"day": day, "status": status, "entered": 0, "exited": 0})
+        row[column] = count
+    if rollup:
+        op.bulk_insert(rollup_table, list(rollup.values()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "daily_status_rollup" in inspector.get_table_names():
+        op.drop_table("daily_status_rollup")
@@ -0,0 +1,103 @@
+"""End every story's transition history in its current status
+
+Revision ID: e8a0c2e4f6b7
+Revises: d6f8a0c2e4b5
+Create Date: 2026-10-21 09:00:00.000000
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a0c2e4f6b7'
+down_revision: Union[str, Sequence[str], None] = 'd6f8a0c2e4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# d4f6b8c0e2a4 first rebuilt history from the activity log alone, so stories
+# with unlogged, legacy-cased or unparsable moves could end in another status
+# than the one they are in. Rebuild the rollup afterwards:
+# `python rollup.py --full`.
+STORY_TABLES = ("stories", "stories_archive")
+
+# main.VALID_STATUSES at the time of this revision
+STATUSES = [
+    "Backlog",
+    "Proposed",
+    "Needs Refinement",
+    "In Refinement",
+    "Ready To Commit",
+    "Sprint Ready",
+]
+
+NORMALIZE = ", ".join(
+    f"{column} = CASE LOWER({column}) "
+    + " ".join(f"WHEN '{s.lower()}' THEN '{s}'" for s in STATUSES)
+    + f" ELSE {column} END"
+    for column in ("from_status", "to_status")
+)
+
+transitions_table = sa.table(
+    "story_status_transitions",
+    sa.column("story_id", sa.Integer),
+    sa.column("from_status", sa.String),
+    sa.column("to_status", sa.String),
+    sa.column("changed_by", sa.String),
+    sa.column("changed_on", sa.DateTime),
+)
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _reconcile(table):
+    def process(chunk, low, high):
+        stories = chunk.execute(
+            sa.text(f"SELECT id, status, created_on FROM {table} WHERE id > :low AND id <= :high"),
+            {"low": low, "high": high},
+        ).fetchall()
+        last = {}
+        for story_id, to_status, changed_on in chunk.execute(
+            sa.text(
+                "SELECT story_id, to_status, changed_on FROM story_status_transitions "
+                "WHERE story_id > :low AND story_id <= :high ORDER BY story_id, changed_on, id"
+            ),
+            {"low": low, "high": high},
+        ):
+            last[story_id] = (to_status, _as_datetime(changed_on))
+        rows = []
+        for story_id, status, created_on in stories:
+            created_on = _as_datetime(created_on) or datetime.now()
+            to_status, changed_on = last.get(story_id, (None, created_on))
+            if status and to_status != status:
+                rows.append({
+                    "story_id": story_id, "from_status": to_status, "to_status": status,
+                    "changed_by": None, "changed_on": max(changed_on, created_on),
+                })
+        if rows:
+            chunk.execute(transitions_table.insert(), rows)
+        return len(rows)
+    return process
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    backfill.update(conn, "e8a0c2e4f6b7_transitions_canonical", "story_status_transitions", NORMALIZE)
+    for table in STORY_TABLES:
+        backfill.run(conn, f"e8a0c2e4f6b7_{table}_transitions", table, _reconcile(table))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The added transitions describe real moves; only forget the progress
+    conn = op.get_bind()
+    backfill.reset(conn, "e8a0c2e4f6b7_transitions_canonical")
+    for table in STORY_TABLES:
+        backfill.reset(conn, f"e8a0c2e4f6b7_{table}_transitions")
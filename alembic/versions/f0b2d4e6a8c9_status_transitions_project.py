@@ -0,0 +1,60 @@
+"""Record the project of each status transition
+
+Revision ID: f0b2d4e6a8c9
+Revises: e8a0c2e4f6b7
+Create Date: 2026-10-21 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0b2d4e6a8c9'
+down_revision: Union[str, Sequence[str], None] = 'e8a0c2e4f6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "f0b2d4e6a8c9_story_status_transitions_project_id"
+INDEX = "ix_story_status_transitions_project_id_changed_on"
+
+# Deleted stories keep the project their outbox rows recorded; anything
+# older than that falls back to the default project
+PROJECT_OF_STORY = (
+    "project_id = COALESCE("
+    "(SELECT stories.project_id FROM stories "
+    "WHERE stories.id = story_status_transitions.story_id), "
+    "(SELECT stories_archive.project_id FROM stories_archive "
+    "WHERE stories_archive.id = story_status_transitions.story_id), "
+    "(SELECT MAX(story_changes.project_id) FROM story_changes "
+    "WHERE story_changes.story_id = story_status_transitions.story_id), "
+    "1)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if "project_id" not in [c["name"] for c in inspect(conn).get_columns("story_status_transitions")]:
+        backfill.start(conn, BACKFILL)
+        op.add_column("story_status_transitions", sa.Column("project_id", sa.Integer(), nullable=True))
+
+    if backfill.is_pending(conn, BACKFILL):
+        backfill.update(conn, BACKFILL, "story_status_transitions", PROJECT_OF_STORY)
+
+    if INDEX not in {i["name"] for i in inspect(conn).get_indexes("story_status_transitions")}:
+        op.create_index(INDEX, "story_status_transitions", ["project_id", "changed_on"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    backfill.reset(conn, BACKFILL)
+    if INDEX in {i["name"] for i in inspect(conn).get_indexes("story_status_transitions")}:
+        op.drop_index(INDEX, table_name="story_status_transitions")
+    if "project_id" in [c["name"] for c in inspect(conn).get_columns("story_status_transitions")]:
+        op.drop_column("story_status_transitions", "project_id")
@@ -0,0 +1,85 @@
+"""Lowercased, indexed user search keys
+
+Revision ID: f4b6d8a0c2e3
+Revises: e3a5c7e9f1b2
+Create Date: 2026-10-19 19:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.dialects import mysql
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b6d8a0c2e3'
+down_revision: Union[str, Sequence[str], None] = 'e3a5c7e9f1b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "f4b6d8a0c2e3_users_search_keys"
+
+KEYS = [
+    ("username_key", "username", 250),
+    ("first_name_key", "first_name", 250),
+    ("last_name_key", "last_name", 250),
+    ("email_key", "email", 255),
+]
+
+
+def key_type(length: int):
+    # Binary collation on MySQL so the prefix ranges compare code points
+    return sa.String(length=length).with_variant(mysql.VARCHAR(length, collation="utf8mb4_bin"), "mysql")
+
+
+def search_key(value):
+    # models.search_key; computed in Python because SQL LOWER() differs from
+    # str.lower() outside ASCII, and the queries are normalized in Python
+    return value.lower() if value else None
+
+
+def fill_keys(chunk, low, high):
+    rows = chunk.execute(
+        sa.text("SELECT id, " + ", ".join(source for _, source, _ in KEYS)
+                + " FROM users WHERE id > :low AND id <= :high"),
+        {"low": low, "high": high},
+    ).mappings().fetchall()
+    if rows:
+        chunk.execute(
+            sa.text("UPDATE users SET " + ", ".join(f"{key} = :{key}" for key, _, _ in KEYS) + " WHERE id = :id"),
+            [{"id": row["id"], **{key: search_key(row[source]) for key, source, _ in KEYS}} for row in rows],
+        )
+    return len(rows)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    columns = [c["name"] for c in inspect(conn).get_columns("users")]
+    if "username_key" not in columns:
+        backfill.start(conn, BACKFILL)
+        for key, _, length in KEYS:
+            op.add_column("users", sa.Column(key, key_type(length), nullable=True))
+
+    if backfill.is_pending(conn, BACKFILL):
+        backfill.run(conn, BACKFILL, "users", fill_keys)
+
+    existing = {index["name"] for index in inspect(conn).get_indexes("users")}
+    for key, _, _ in KEYS:
+        if op.f(f"ix_users_{key}") not in existing:
+            op.create_index(op.f(f"ix_users_{key}"), "users", [key])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    backfill.reset(conn, BACKFILL)
+    existing = {index["name"] for index in inspect(conn).get_indexes("users")}
+    for key, _, _ in KEYS:
+        if op.f(f"ix_users_{key}") in existing:
+            op.drop_index(op.f(f"ix_users_{key}"), table_name="users")
+        if key in [c["name"] for c in inspect(conn).get_columns("users")]:
+            op.drop_column("users", key)
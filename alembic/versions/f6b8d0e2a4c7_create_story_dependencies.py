@@ -0,0 +1,115 @@
+"""Create story_dependencies and backfill it from the dependency lists
+
+Revision ID: f6b8d0e2a4c7
+Revises: e5a7c9d1f3b6
+Create Date: 2026-10-18 16:00:00.000000
+"""
+import json
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+import backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a4c7'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c9d1f3b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "f6b8d0e2a4c7_story_dependencies"
+
+# Same story reference forms as dependency_graph.referenced_ids
+STORY_REFERENCE = re.compile(r"^\s*(?:#|(?:story|us)[\s#-]*)?(\d+)\s*$", re.IGNORECASE)
+
+edges_table = sa.table(
+    "story_dependencies",
+    sa.column("story_id", sa.Integer),
+    sa.column("depends_on_id", sa.Integer),
+)
+
+
+def _referenced(*lists):
+    ids = set()
+    for values in lists:
+        if isinstance(values, str):
+            values = json.loads(values)
+        for value in values or []:
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, int):
+                ids.add(value)
+            elif isinstance(value, str):
+                match = STORY_REFERENCE.match(value)
+                if match:
+                    ids.add(int(match.group(1)))
+    return ids
+
+
+def _backfill_range(chunk, low, high):
+    stories = chunk.execute(
+        sa.text(
+            "SELECT id, dependencies, refinement_dependencies FROM stories "
+            "WHERE id > :low AND id <= :high"
+        ),
+        {"low": low, "high": high},
+    ).fetchall()
+    referenced = {
+        story_id: _referenced(dependencies, refinement_dependencies)
+        for story_id, dependencies, refinement_dependencies in stories
+    }
+    # Only references to stories that exist become edges
+    wanted = sorted(set().union(*referenced.values())) if referenced else []
+    existing = set()
+    for start in range(0, len(wanted), 500):
+        existing.update(row[0] for row in chunk.execute(
+            sa.text("SELECT id FROM stories WHERE id IN :ids").bindparams(sa.bindparam("ids", expanding=True)),
+            {"ids": wanted[start:start + 500]},
+        ))
+    rows = [
+        {"story_id": story_id, "depends_on_id": depends_on_id}
+        for story_id, depends_on in referenced.items()
+        for depends_on_id in sorted(depends_on)
+        if depends_on_id in existing and depends_on_id != story_id
+    ]
+    if rows:
+        chunk.execute(edges_table.insert(), rows)
+    return len(stories)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if "story_dependencies" not in inspector.get_table_names():
+        backfill.start(conn, BACKFILL)
+        op.create_table(
+            "story_dependencies",
+            sa.Column("story_id", sa.Integer(), nullable=False),
+            sa.Column("depends_on_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["story_id"], ["stories.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["depends_on_id"], ["stories.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("story_id", "depends_on_id"),
+        )
+        op.create_index(op.f("ix_story_dependencies_depends_on_id"),
+                        "story_dependencies", ["depends_on_id"])
+
+    if backfill.is_pending(conn, BACKFILL):
+        backfill.run(conn, BACKFILL, "stories", _backfill_range)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    backfill.reset(conn, BACKFILL)
+    if "story_dependencies" in inspector.get_table_names():
+        op.drop_index(op.f("ix_story_dependencies_depends_on_id"),
+                      table_name="story_dependencies")
+        op.drop_table("story_dependencies")
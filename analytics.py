@@ -0,0 +1,225 @@
+"""
+Flow analytics computed from story_status_transitions.
+
+All metrics are derived in one vectorized pass over the transition log with
+pandas/NumPy:
+
+    stage cycle time  time spent in each status per visit (completed visits)
+    cycle time        first entry into WORK_START_STATUS -> first DONE_STATUS
+    lead time         creation -> first DONE_STATUS
+    throughput        stories first reaching DONE_STATUS per period
+    aging WIP         open stories' age in their current status and since start
+
+Results are cached per process in a small LRU keyed on the project, the
+request parameters and the outbox cursor (refreshed at least every
+CACHE_SECONDS so aging stays current), so repeated dashboard loads of
+several projects do not recompute. pandas is imported on first use rather
+than at startup.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+import outbox
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DONE_STATUS = "Sprint Ready"
+WORK_START_STATUS = "In Refinement"
+NOT_WIP_STATUSES = {"Backlog", DONE_STATUS}
+PERIODS = {"day": "D", "week": "W-MON", "month": "MS"}
+AGING_WIP_LIMIT = 50
+CACHE_SECONDS = 300
+CACHE_ENTRIES = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_transitions(db: Session, project_id: int) -> pd.DataFrame:
+    """A project's transition log as a DataFrame sorted by story and time."""
+    import pandas as pd
+
+    statement = select(
+        models.StatusTransition.story_id,
+        models.StatusTransition.to_status,
+        models.StatusTransition.changed_on,
+    ).where(models.StatusTransition.project_id == project_id)
+    rows = db.execute(statement).all()
+    frame = pd.DataFrame(rows, columns=["story_id", "to_status", "changed_on"])
+    frame["changed_on"] = pd.to_datetime(frame["changed_on"], utc=True).dt.tz_localize(None)
+    frame["to_status"] = frame["to_status"].astype("category")
+    return frame.sort_values(["story_id", "changed_on"], kind="mergesort", ignore_index=True)
+
+
+def _duration_stats(days: pd.Series) -> dict:
+    if days.empty:
+        return {"count": 0, "mean_days": None, "median_days": None, "p85_days": None}
+    values = days.to_numpy(dtype=float)
+    return {
+        "count": int(values.size),
+        "mean_days": round(float(values.mean()), 2),
+        "median_days": round(float(np.median(values)), 2),
+        "p85_days": round(float(np.percentile(values, 85)), 2),
+    }
+
+
+def compute_flow_metrics(
+    transitions: pd.DataFrame,
+    open_story_ids=None,
+    now: datetime = None,
+    start: datetime = None,
+    end: datetime = None,
+    period: str = "week",
+) -> dict:
+    """
+    Pure computation over a transition frame (story_id, to_status, changed_on).
+    open_story_ids limits aging WIP to stories that still exist.
+    """
+    import pandas as pd
+
+    now = pd.Timestamp(now or datetime.now())
+    if transitions.empty:
+        return {
+            "stage_cycle_time": {}, "cycle_time": _duration_stats(pd.Series(dtype=float)),
+            "lead_time": _duration_stats(pd.Series(dtype=float)), "throughput": [],
+            "aging_wip": {"by_status": {}, "oldest": []},
+        }
+
+    story = transitions["story_id"].to_numpy()
+    changed = transitions["changed_on"].to_numpy()
+    status = transitions["to_status"]
+
+    # Each row opens a visit to `to_status`; the next row of the same story closes it
+    same_story_next = np.empty(len(story), dtype=bool)
+    same_story_next[:-1] = story[1:] == story[:-1]
+    same_story_next[-1] = False
+    next_changed = np.empty_like(changed)
+    next_changed[:-1] = changed[1:]
+    next_changed[-1] = changed[-1]
+    visit_days = (next_changed - changed) / np.timedelta64(1, "D")
+
+    completed = pd.DataFrame({"status": status[same_story_next], "days": visit_days[same_story_next]})
+    stage_cycle_time = {
+        str(name): _duration_stats(group["days"])
+        for name, group in completed.groupby("status", observed=True)
+    }
+
+    # First time each story was created / started / done
+    created = transitions.groupby("story_id", sort=False)["changed_on"].min()
+    started = transitions.loc[status == WORK_START_STATUS].groupby("story_id")["changed_on"].min()
+    done = transitions.loc[status == DONE_STATUS].groupby("story_id")["changed_on"].min()
+
+    lead = (done - created.reindex(done.index)) / pd.Timedelta(days=1)
+    cycle = (done - started.reindex(done.index)).dropna() / pd.Timedelta(days=1)
+
+    if start is not None:
+        done_window = done[done >= pd.Timestamp(start)]
+    else:
+        done_window = done
+    if end is not None:
+        done_window = done_window[done_window <= pd.Timestamp(end)]
+    lead = lead.reindex(done_window.index)
+    cycle = cycle.reindex(done_window.index).dropna()
+
+    if done_window.empty:
+        throughput = pd.Series(dtype=int)
+    else:
+        throughput = (
+            pd.Series(1, index=pd.DatetimeIndex(done_window.to_numpy()))
+            .resample(PERIODS.get(period, "W-MON"), label="left", closed="left")
+            .sum()
+        )
+
+    # Aging WIP: the last visit of each open story
+    last = ~same_story_next
+    current = pd.DataFrame({
+        "story_id": story[last],
+        "status": status[last].astype(str).to_numpy(),
+        "in_status_days": (now.to_datetime64() - changed[last]) / np.timedelta64(1, "D"),
+    })
+    if open_story_ids is not None:
+        current = current[current["story_id"].isin(open_story_ids)]
+    current = current[~current["status"].isin(NOT_WIP_STATUSES)].copy()
+    started_on = started.reindex(current["story_id"]).to_numpy(dtype="datetime64[ns]")
+    current["since_start_days"] = (now.to_datetime64() - started_on) / np.timedelta64(1, "D")
+    oldest = current.sort_values("in_status_days", ascending=False).head(AGING_WIP_LIMIT)
+
+    return {
+        "stage_cycle_time": stage_cycle_time,
+        "cycle_time": _duration_stats(cycle),
+        "lead_time": _duration_stats(lead),
+        "throughput": [
+            {"period_start": ts.date().isoformat(), "count": int(count)}
+            for ts, count in throughput.items()
+        ],
+        "aging_wip": {
+            "by_status": {
+                str(name): _duration_stats(group["in_status_days"])
+                for name, group in current.groupby("status")
+            },
+            "oldest": [
+                {
+                    "story_id": int(row.story_id),
+                    "status": row.status,
+                    "in_status_days": round(float(row.in_status_days), 2),
+                    "since_start_days": None if pd.isna(row.since_start_days)
+                    else round(float(row.since_start_days), 2),
+                }
+                for row in oldest.itertuples(index=False)
+            ],
+        },
+    }
+
+
+def flow_metrics(db: Session, project_id: int, start=None, end=None, period: str = "week") -> dict:
+    """Cached flow metrics for a project's whole backlog."""
+    # Keyed on database state (not on writes seen by this process) so every worker
+    # agrees; every story write, and so every transition, advances the outbox cursor
+    key = (project_id, start, end, period, outbox.current_cursor(db), int(time.time() // CACHE_SECONDS))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    transitions = load_transitions(db, project_id)
+    open_ids = [
+        row[0] for row in
+        db.query(models.UserStory.id).filter(models.UserStory.project_id == project_id)
+    ]
+    result = compute_flow_metrics(transitions, open_ids, start=start, end=end, period=period)
+    result["transitions"] = int(len(transitions))
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return result
+
+
+def record_transition(db: Session, story_id: int, from_status, to_status: str, changed_by: str = None, *,
+                      project_id: int):
+    """
+    Add a transition row to db, committed with the caller's story write;
+    tasks.after_story_change counts it in the daily rollup after the commit.
+    """
+    now = datetime.now()
+    db.add(models.StatusTransition(
+        story_id=story_id,
+        from_status=from_status,
+        to_status=to_status,
+        changed_by=changed_by,
+        changed_on=now,
+        project_id=project_id,
+    ))
@@ -0,0 +1,204 @@
+"""
+Hot/cold story archival.
+
+Stories past the retention policy are moved, whole (activity log, dependency
+lists and all), from `stories` into `stories_archive`, so the hot table and
+every list query over it stay proportional to active work:
+
+    done    in DONE_STATUS and untouched for ARCHIVE_DONE_AFTER_DAYS (default 90)
+    stale   any other status and untouched for ARCHIVE_STALE_AFTER_DAYS
+            (default 365; 0 disables)
+
+"Untouched" is the newest of the story's creation, status transitions and
+story_changes outbox rows. Each move writes an "archived" outbox row, so
+delta-sync clients and other workers' indexes drop the story; the status
+transition log is kept for flow analytics.
+
+List endpoints read the archive only with include_archived=true, and
+POST /stories/{id}/restore moves a story back under its original id. The
+newest story is never archived, so databases that reuse the highest id
+after a delete (SQLite, MySQL < 8) cannot hand it out again.
+
+Run nightly with the archive_stories task or `python archive.py [--dry-run]`.
+"""
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import dependency_graph
+import models
+import outbox
+
+DONE_STATUS = "Sprint Ready"
+ARCHIVE_DONE_AFTER_DAYS = int(os.getenv("ARCHIVE_DONE_AFTER_DAYS", "90"))
+ARCHIVE_STALE_AFTER_DAYS = int(os.getenv("ARCHIVE_STALE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = 500
+
+STORY_FIELDS = tuple(
+    column.name for column in models.UserStory.__table__.columns if column.name != "id"
+)
+
+
+def _naive(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return value
+
+
+def _last_touched(db: Session, story_ids: list) -> dict:
+    """story id -> newest outbox or transition timestamp."""
+    touched = {}
+    for model in (models.StoryChange, models.StatusTransition):
+        rows = (
+            db.query(model.story_id, func.max(model.changed_on))
+            .filter(model.story_id.in_(story_ids))
+            .group_by(model.story_id)
+        )
+        for story_id, changed_on in rows:
+            changed_on = _naive(changed_on)
+            if changed_on is not None and (story_id not in touched or changed_on > touched[story_id]):
+                touched[story_id] = changed_on
+    return touched
+
+
+def due_for_archive(db: Session, now: datetime = None) -> list:
+    """[(story_id, reason)] of stories past the retention policy."""
+    now = now or datetime.now()
+    done_cutoff = now - timedelta(days=ARCHIVE_DONE_AFTER_DAYS)
+    stale_cutoff = now - timedelta(days=ARCHIVE_STALE_AFTER_DAYS) if ARCHIVE_STALE_AFTER_DAYS else None
+    newest = db.query(func.max(models.UserStory.id)).scalar()
+
+    due = []
+    last_id = 0
+    while True:
+        stories = (
+            db.query(models.UserStory.id, models.UserStory.status, models.UserStory.created_on)
+            .filter(models.UserStory.id > last_id)
+            .order_by(models.UserStory.id)
+            .limit(ARCHIVE_BATCH_SIZE)
+            .all()
+        )
+        if not stories:
+            break
+        touched = _last_touched(db, [row[0] for row in stories])
+        for story_id, story_status, created_on in stories:
+            if story_id == newest:
+                continue
+            last = max(filter(None, [_naive(created_on), touched.get(story_id)]), default=None)
+            if last is None:
+                continue
+            if story_status == DONE_STATUS:
+                if last < done_cutoff:
+                    due.append((story_id, "done"))
+            elif stale_cutoff is not None and last < stale_cutoff:
+                due.append((story_id, "stale"))
+        last_id = stories[-1][0]
+    return due
+
+
+def archive_stories(db: Session, due: list, archived_by: str = None) -> list:
+    """
+    Move [(story_id, reason)] into stories_archive, ARCHIVE_BATCH_SIZE per
+    transaction. Returns [(outbox change id, deleted-event payload)].
+    """
+    archived = []
+    for start in range(0, len(due), ARCHIVE_BATCH_SIZE):
+        reasons = dict(due[start:start + ARCHIVE_BATCH_SIZE])
+        ids = list(reasons)
+        already = {
+            row[0] for row in
+            db.query(models.ArchivedStory.id).filter(models.ArchivedStory.id.in_(ids))
+        }
+        dependents = {}
+        edges = db.query(models.StoryDependency.depends_on_id, models.StoryDependency.story_id).filter(
+            models.StoryDependency.depends_on_id.in_(ids))
+        for depends_on_id, story_id in edges:
+            dependents.setdefault(depends_on_id, []).append(story_id)
+
+        now = datetime.now()
+        batch = []
+        for story in db.query(models.UserStory).filter(models.UserStory.id.in_(ids)):
+            if story.id in already:
+                continue
+            db.add(models.ArchivedStory(
+                id=story.id,
+                archived_on=now,
+                archived_reason=reasons[story.id],
+                dependents=sorted(dependents.get(story.id, [])),
+                **{name: getattr(story, name) for name in STORY_FIELDS},
+            ))
+            batch.append({"id": story.id, "status": story.status,
+                          "assignees": list(story.assignees or []), "projectId": story.project_id})
+            dependency_graph.stage_delete(db, story.id)
+            db.delete(story)
+        change_ids = [outbox.record_change(db, story["id"], "archived", archived_by, project_id=story["projectId"])
+                      for story in batch]
+        db.commit()
+        archived.extend(zip(change_ids, batch))
+    return archived
+
+
+def restore_story(db: Session, story_id: int, restored_by: str = None):
+    """
+    Move an archived story back into stories and record the outbox row (not
+    committed). Returns (story, {story id: upstream ids} to hand to
+    dependency_graph.commit_story() after the commit, outbox change id).
+    """
+    archived = db.get(models.ArchivedStory, story_id)
+    if archived is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archived story not found"
+        )
+    if db.get(models.UserStory, story_id) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Story #{story_id} already exists in the active backlog"
+        )
+
+    story = models.UserStory(id=story_id, **{name: getattr(archived, name) for name in STORY_FIELDS})
+    dependents = archived.dependents or []
+    db.delete(archived)
+    db.add(story)
+    db.flush()
+
+    # Re-link the story's own dependencies and those of active stories that pointed at it
+    upstream = {story_id: dependency_graph.stage_story(db, story)}
+    graph = dependency_graph.get_index(db)
+    if dependents:
+        rows = db.query(
+            models.UserStory.id, models.UserStory.dependencies, models.UserStory.refinement_dependencies
+        ).filter(models.UserStory.id.in_(dependents))
+        for dependent_id, dependencies, refinement_dependencies in rows:
+            if story_id in dependency_graph.referenced_ids(dependencies, refinement_dependencies):
+                db.add(models.StoryDependency(story_id=dependent_id, depends_on_id=story_id))
+                upstream[dependent_id] = graph.upstream_of(dependent_id) | {story_id}
+    change_id = outbox.record_change(db, story_id, "restored", restored_by, project_id=story.project_id)
+    return story, upstream, change_id
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Move stories past the retention policy into stories_archive")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stories that would move")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        found = due_for_archive(session)
+        if args.dry_run:
+            for story_id, reason in found:
+                print(f"#{story_id} {reason}")
+        else:
+            archive_stories(session, found)
+    finally:
+        session.close()
+    print(f"{len(found)} stories {'due for archive' if args.dry_run else 'archived'}")
@@ -0,0 +1,147 @@
+"""
+Chunked, resumable data backfills for Alembic migrations.
+
+A single `UPDATE stories SET ...` (or INSERT ... SELECT) over a large table
+holds its locks until the whole statement finishes. run() instead walks the
+table's integer primary key in ranges of BACKFILL_BATCH_SIZE rows and hands
+each range to a callback on its own short transaction, together with a row in
+backfill_progress recording how far it got:
+
+    NAME = "f6b8d0e2a4c7_story_dependencies"
+
+    def upgrade():
+        conn = op.get_bind()
+        if "story_dependencies" not in inspect(conn).get_table_names():
+            backfill.start(conn, NAME)
+            op.create_table(...)
+        if backfill.is_pending(conn, NAME):
+            backfill.run(conn, NAME, "stories", _copy_edges)
+
+    def _copy_edges(chunk, low, high):
+        rows = chunk.execute(text("SELECT ... WHERE id > :low AND id <= :high"), ...)
+        ...
+        return len(rows)
+
+update() covers the plain SQL case. After each range the backfill sleeps for
+BACKFILL_PAUSE_RATIO times as long as the range took, so it yields the
+database to application traffic in proportion to how loaded it is. If the
+migration is interrupted, the next `alembic upgrade` resumes after the last
+committed range. Work already done before run() is committed first (Alembic's
+autocommit block), so migrations using it should keep the schema change and
+the backfill in one revision and make the schema change idempotent.
+
+Only online (not --sql) migrations are supported. This module must not
+import application code, so it stays valid for old revisions.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "1000"))
+BACKFILL_PAUSE_RATIO = float(os.getenv("BACKFILL_PAUSE_RATIO", "0.5"))
+PROGRESS_LOG_SECONDS = 10
+
+logger = logging.getLogger("alembic.backfill")
+
+progress_table = sa.Table(
+    "backfill_progress",
+    sa.MetaData(),
+    sa.Column("name", sa.String(191), primary_key=True),
+    sa.Column("last_key", sa.BigInteger(), nullable=False, server_default="0"),
+    sa.Column("rows_done", sa.BigInteger(), nullable=False, server_default="0"),
+    sa.Column("started_on", sa.DateTime(), nullable=True),
+    sa.Column("updated_on", sa.DateTime(), nullable=True),
+    sa.Column("finished_on", sa.DateTime(), nullable=True),
+)
+
+
+def _progress(conn, name):
+    return conn.execute(
+        sa.select(progress_table.c.last_key, progress_table.c.rows_done, progress_table.c.finished_on)
+        .where(progress_table.c.name == name)
+    ).first()
+
+
+def start(conn, name: str):
+    """Register a backfill (idempotent). Call it in the same step that creates its target."""
+    progress_table.create(conn, checkfirst=True)
+    if _progress(conn, name) is None:
+        conn.execute(progress_table.insert().values(name=name, started_on=datetime.now()))
+
+
+def is_pending(conn, name: str) -> bool:
+    """True when the backfill was registered and has not finished."""
+    if not sa.inspect(conn).has_table("backfill_progress"):
+        return False
+    state = _progress(conn, name)
+    return state is not None and state.finished_on is None
+
+
+def reset(conn, name: str):
+    """Forget a backfill's progress, e.g. in downgrade(), so a later upgrade redoes it."""
+    if sa.inspect(conn).has_table("backfill_progress"):
+        conn.execute(progress_table.delete().where(progress_table.c.name == name))
+
+
+def run(conn, name: str, table: str, process, key: str = "id",
+        batch_size: int = None, pause_ratio: float = None) -> int:
+    """
+    Call process(chunk_connection, low, high) for consecutive ranges
+    low < key <= high of `table`, batch_size rows at a time, each in its own
+    transaction that also records the progress. process returns the number
+    of rows it handled (None counts as 0). Returns the total for this run.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    pause_ratio = BACKFILL_PAUSE_RATIO if pause_ratio is None else pause_ratio
+    start(conn, name)
+    state = _progress(conn, name)
+    if state.finished_on is not None:
+        return 0
+
+    next_high = sa.text(
+        f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} WHERE {key} > :low "
+        f"ORDER BY {key} LIMIT :batch) AS backfill_chunk"
+    )
+    low, done, total = state.last_key, state.rows_done, 0
+    logged_at = time.monotonic()
+    if low:
+        logger.info("Resuming backfill %s after %s=%s (%d rows done)", name, key, low, done)
+
+    with op.get_context().autocommit_block():
+        engine = conn.engine
+        while True:
+            started = time.perf_counter()
+            with engine.begin() as chunk:
+                high = chunk.execute(next_high, {"low": low, "batch": batch_size}).scalar()
+                progress = progress_table.update().where(progress_table.c.name == name)
+                if high is None:
+                    chunk.execute(progress.values(updated_on=datetime.now(), finished_on=datetime.now()))
+                    break
+                handled = process(chunk, low, high) or 0
+                chunk.execute(progress.values(
+                    last_key=high, rows_done=done + handled, updated_on=datetime.now()))
+            low, done, total = high, done + handled, total + handled
+
+            if time.monotonic() - logged_at >= PROGRESS_LOG_SECONDS:
+                logger.info("Backfill %s: %s=%s, %d rows done", name, key, low, done)
+                logged_at = time.monotonic()
+            time.sleep((time.perf_counter() - started) * pause_ratio)
+
+    logger.info("Backfill %s finished: %d rows", name, done)
+    return total
+
+
+def update(conn, name: str, table: str, assignments: str, where: str = None,
+           params: dict = None, key: str = "id", **options) -> int:
+    """Chunked `UPDATE table SET assignments [WHERE where]`, one key range per transaction."""
+    condition = f"{key} > :low AND {key} <= :high" + (f" AND ({where})" if where else "")
+    statement = sa.text(f"UPDATE {table} SET {assignments} WHERE {condition}")
+
+    def process(chunk, low, high):
+        return chunk.execute(statement, {**(params or {}), "low": low, "high": high}).rowcount
+
+    return run(conn, name, table, process, key=key, **options)
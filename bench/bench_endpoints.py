@@ -0,0 +1,192 @@
+"""
+Benchmark the hot endpoints through the ASGI app against a seeded database.
+
+    python bench/bench_endpoints.py --users 200 --stories 5000 --output run.json
+    python bench/bench_endpoints.py --compare run.json --output run2.json
+
+By default a fresh SQLite file (bench/bench.db) is created and seeded. Pass
+--database-url to target a MySQL-compatible server instead; --reset is then
+required because the schema is dropped and recreated.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import common
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--reset", action="store_true",
+                        help="Drop and recreate the schema on a non-default database")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--stories", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="Requests per scenario")
+    parser.add_argument("--login-iterations", type=int, default=10,
+                        help="Requests for /login (bcrypt makes each one slow)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=515)
+    parser.add_argument("--scenario", action="append",
+                        help="Only run the named scenario(s)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args()
+
+
+def build_scenarios(client, headers, usernames, story_ids, backlog_ids, rng):
+    """Each scenario is a callable issuing one request and returning the response."""
+    today = date.today()
+
+    def stories_filter_mix():
+        choice = rng.randrange(6)
+        if choice == 0:
+            params = {"status": rng.choice(common.STATUSES)}
+        elif choice == 1:
+            params = {"tags": ",".join(rng.sample(common.TAGS, 2))}
+        elif choice == 2:
+            params = {"created_by": rng.choice(usernames)}
+        elif choice == 3:
+            params = {"assignees": rng.choice(usernames)}
+        elif choice == 4:
+            params = {"start_date": (today - timedelta(days=90)).isoformat(), "end_date": today.isoformat()}
+        else:
+            params = {"status": "backlog,proposed", "tags": rng.choice(common.TAGS)}
+        return client.get("/stories", headers=headers, params=params)
+
+    transition_state = {}
+
+    def story_transition():
+        # Backlog <-> Proposed is always permitted once bv and description are set
+        story_id = rng.choice(backlog_ids)
+        current = transition_state.get(story_id, "Backlog")
+        target = "Proposed" if current == "Backlog" else "Backlog"
+        response = client.put(f"/stories/{story_id}", headers=headers, json={
+            "title": f"Benchmark story {story_id}",
+            "description": "Benchmark transition description",
+            "status": target,
+            "bv": 50,
+            "story_points": 3,
+            "tags": ["backend"],
+        })
+        if response.status_code == 200:
+            transition_state[story_id] = target
+        return response
+
+    def login():
+        return client.post("/login", json={
+            "email": f"{rng.choice(usernames)}@example.com",
+            "password": common.BENCH_PASSWORD,
+        })
+
+    def filter_search():
+        if rng.random() < 0.2:
+            return client.get("/filter", headers=headers, params={"search": str(rng.choice(story_ids))})
+        return client.get("/filter", headers=headers, params={"search": rng.choice(common.WORDS)})
+
+    def users_typeahead():
+        i = usernames.index(rng.choice(usernames))
+        word = rng.choice([usernames[i], f"First{i}", f"Last{i}"])
+        return client.get("/users", params={"q": word[:rng.randint(1, len(word))], "limit": 10})
+
+    return {
+        "get_stories_all": lambda: client.get("/stories", headers=headers),
+        "get_stories_filter_mix": stories_filter_mix,
+        "put_story_transition": story_transition,
+        "login": login,
+        "filter_search": filter_search,
+        "users_typeahead": users_typeahead,
+    }
+
+
+def run_scenario(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        response = fn()
+        latencies.append(round((time.perf_counter() - t0) * 1000, 3))
+        if response.status_code >= 400:
+            errors += 1
+    return common.summarize(latencies, errors, time.perf_counter() - started)
+
+
+def main():
+    args = parse_args()
+    url = common.configure_database(args.database_url)
+    if url != common.DEFAULT_DATABASE_URL and not args.reset:
+        sys.exit("Refusing to drop tables on a non-default database without --reset")
+
+    import database
+    common.prepare_engine(database.engine)
+    common.reset_schema(database.engine)
+
+    seed_started = time.perf_counter()
+    db = database.SessionLocal()
+    try:
+        usernames = common.seed(db, args.users, args.stories, args.seed)
+        import models
+        story_ids = [row[0] for row in db.query(models.UserStory.id).all()]
+        backlog_ids = [
+            row[0] for row in
+            db.query(models.UserStory.id).filter(models.UserStory.status == "Backlog").all()
+        ]
+    finally:
+        db.close()
+    seed_seconds = time.perf_counter() - seed_started
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    client = TestClient(app_main.app)
+    token = client.post("/login", json={
+        "email": f"{usernames[0]}@example.com", "password": common.BENCH_PASSWORD,
+    }).json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(client, headers, usernames, story_ids, backlog_ids, rng)
+    if args.scenario:
+        scenarios = {name: fn for name, fn in scenarios.items() if name in args.scenario}
+
+    results = {}
+    for name, fn in scenarios.items():
+        iterations = args.login_iterations if name == "login" else args.iterations
+        results[name] = run_scenario(fn, iterations, args.warmup)
+        print(f"{name:<24} p50={results[name]['p50_ms']:>9} ms  p95={results[name]['p95_ms']:>9} ms  "
+              f"p99={results[name]['p99_ms']:>9} ms  {results[name]['throughput_rps']} req/s",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "database": database.engine.dialect.name,
+            "users": args.users,
+            "stories": args.stories,
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2),
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["delta_pct"] = common.compare(json.load(f), report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
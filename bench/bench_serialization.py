@@ -0,0 +1,111 @@
+"""
+Per-row cost of serializing a story list: the ORM + StoryResponse path that
+GET /stories used to take versus the row-tuple + orjson fast path in
+serializers.py.
+
+    python bench/bench_serialization.py --stories 5000 --repeat 5
+
+Both paths read the same seeded SQLite database; the load and the encode
+stages are timed separately and reported in microseconds per row.
+"""
+import argparse
+import json
+import time
+
+import common
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=515)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+
+def best_of(repeat, fn):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    args = parse_args()
+    common.configure_database()
+
+    import database
+    common.prepare_engine(database.engine)
+    common.reset_schema(database.engine)
+    db = database.SessionLocal()
+    common.seed(db, args.users, args.stories, args.seed)
+
+    from pydantic import TypeAdapter
+    import models
+    import schemas
+    import serializers
+
+    adapter = TypeAdapter(list[schemas.StoryResponse])
+
+    def orm_load():
+        db.expunge_all()
+        stories = db.query(models.UserStory).all()
+        for s in stories:
+            s.mvp_score = 0.0
+        return stories
+
+    def orm_encode(stories):
+        # What FastAPI does with a response_model: validate, then dump by alias
+        return adapter.dump_json(adapter.validate_python(stories, from_attributes=True), by_alias=True)
+
+    def fast_load():
+        return db.query(*serializers.STORY_COLUMNS).all()
+
+    def fast_encode(rows):
+        return serializers.json_response(
+            [serializers.story_row_to_dict(row, mvp_score=0.0) for row in rows]
+        ).body
+
+    orm_load_s, stories = best_of(args.repeat, orm_load)
+    orm_encode_s, orm_body = best_of(args.repeat, lambda: orm_encode(stories))
+    fast_load_s, rows = best_of(args.repeat, fast_load)
+    fast_encode_s, fast_body = best_of(args.repeat, lambda: fast_encode(rows))
+    db.close()
+
+    if json.loads(orm_body) != json.loads(fast_body):
+        raise SystemExit("Fast path output differs from StoryResponse output")
+
+    def per_row_us(seconds):
+        return round(seconds / args.stories * 1e6, 2)
+
+    report = {
+        "meta": {"stories": args.stories, "repeat": args.repeat, "bytes": len(fast_body)},
+        "orm_pydantic": {
+            "load_us_per_row": per_row_us(orm_load_s),
+            "encode_us_per_row": per_row_us(orm_encode_s),
+            "total_us_per_row": per_row_us(orm_load_s + orm_encode_s),
+        },
+        "rows_orjson": {
+            "load_us_per_row": per_row_us(fast_load_s),
+            "encode_us_per_row": per_row_us(fast_encode_s),
+            "total_us_per_row": per_row_us(fast_load_s + fast_encode_s),
+        },
+    }
+    report["speedup"] = round(
+        report["orm_pydantic"]["total_us_per_row"] / report["rows_orjson"]["total_us_per_row"], 2
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Shared helpers for the benchmark scripts: database setup, deterministic
+seeding and latency statistics.
+
+The app's modules read DATABASE_URL at import time, so call
+configure_database() before importing database, models or main.
+"""
+import json
+import math
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(ROOT, 'bench', 'bench.db')}"
+BENCH_PASSWORD = "benchmark-password"
+
+STATUSES = [
+    "Backlog",
+    "Proposed",
+    "Needs Refinement",
+    "In Refinement",
+    "Ready To Commit",
+    "Sprint Ready",
+]
+TAGS = ["frontend", "backend", "api", "ux", "security", "performance", "infra", "reporting", "mobile", "auth"]
+MOSCOW = ["Must", "Should", "Could", "Won't", None]
+STORY_POINTS = [1, 2, 3, 5, 8, 13, 21, None]
+WORDS = (
+    "user login board story sprint backlog filter report export import dashboard "
+    "notification search profile settings role permission audit payment invoice "
+    "calendar comment attachment team workspace chart metric api cache sync"
+).split()
+
+
+def configure_database(database_url: str = None) -> str:
+    """Point the app at database_url (defaults to a local SQLite file)."""
+    url = database_url or os.getenv("BENCH_DATABASE_URL") or DEFAULT_DATABASE_URL
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    # Bench load comes from one client; measure the endpoints, not the limiter
+    os.environ.setdefault("RATE_LIMIT", "off")
+    return url
+
+
+def _json_contains(target, candidate):
+    """SQLite stand-in for MySQL JSON_CONTAINS on a JSON array of scalars."""
+    if target is None or candidate is None:
+        return 0
+    try:
+        return int(json.loads(candidate) in json.loads(target))
+    except (TypeError, ValueError):
+        return 0
+
+
+def prepare_engine(engine):
+    """Register MySQL-only SQL functions the app relies on when running on SQLite."""
+    if engine.dialect.name != "sqlite":
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("json_contains", 2, _json_contains)
+
+
+def reset_schema(engine):
+    from database import Base
+    import models  # noqa: F401  (registers tables on Base.metadata)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def seed(db, users: int, stories: int, seed_value: int = 515):
+    """
+    Fill an empty schema with `users` users and `stories` stories.
+    Returns the list of usernames created.
+    """
+    import models
+    import projects
+    from main import get_pwd_context
+
+    rng = random.Random(seed_value)
+    for code, name in [
+        ("product-manager", "Product Manager"),
+        ("stakeholder", "Stakeholder"),
+        ("dev-team", "Dev Team"),
+        ("scrum-master", "Scrum Master"),
+    ]:
+        db.add(models.Role(code=code, name=name))
+    db.add(models.Project(id=projects.DEFAULT_PROJECT_ID, name="Default"))
+    db.flush()
+
+    # Hashing is deliberately slow; every seeded user shares one hash.
+    password_hash = get_pwd_context().hash(BENCH_PASSWORD)
+    roles = ["product-manager", "stakeholder", "dev-team", "scrum-master"]
+    usernames = [f"user{i}" for i in range(users)]
+    db.bulk_insert_mappings(models.User, [
+        {
+            "username": username,
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "email": f"{username}@example.com",
+            "username_key": username,
+            "first_name_key": f"first{i}",
+            "last_name_key": f"last{i}",
+            "email_key": f"{username}@example.com",
+            "password_hash": password_hash,
+            "role_code": roles[i % len(roles)],
+        }
+        for i, username in enumerate(usernames)
+    ])
+    user_ids = dict(db.query(models.User.username, models.User.id))
+    db.bulk_insert_mappings(models.ProjectMember, [
+        {"project_id": projects.DEFAULT_PROJECT_ID, "user_id": user_id}
+        for user_id in user_ids.values()
+    ])
+
+    now = datetime.now()
+    rows = []
+    for i in range(stories):
+        created_on = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+        creator = rng.choice(usernames)
+        activity = [{
+            "timestamp": created_on.strftime("%Y-%m-%d %H:%M:%S"),
+            "user": creator,
+            "action": f"[{created_on:%Y-%m-%d %H:%M:%S}] {creator}: Created story",
+        }]
+        for _ in range(rng.randint(0, 8)):
+            when = created_on + timedelta(hours=rng.randint(1, 2000))
+            actor = rng.choice(usernames)
+            activity.append({
+                "timestamp": when.strftime("%Y-%m-%d %H:%M:%S"),
+                "user": actor,
+                "action": f"[{when:%Y-%m-%d %H:%M:%S}] {actor}: Comment: {_sentence(rng, 10)}",
+            })
+        rows.append({
+            "title": _sentence(rng, rng.randint(3, 8)),
+            "description": _sentence(rng, rng.randint(15, 60)),
+            "assignees": rng.sample(usernames, k=min(len(usernames), rng.randint(0, 3))),
+            "status": rng.choice(STATUSES),
+            "tags": ",".join(rng.sample(TAGS, k=rng.randint(0, 3))),
+            "acceptance_criteria": [_sentence(rng, 8) for _ in range(rng.randint(0, 5))],
+            "story_points": rng.choice(STORY_POINTS),
+            "moscow_priority": rng.choice(MOSCOW),
+            "activity": activity,
+            "created_by": creator,
+            "created_by_key": creator.lower(),
+            "created_by_id": user_ids[creator],
+            "created_on": created_on,
+            "bv": rng.randint(1, 100),
+            "dependencies": [_sentence(rng, 4) for _ in range(rng.randint(0, 2))],
+            "refinement_dependencies": [_sentence(rng, 4) for _ in range(rng.randint(0, 2))],
+        })
+        if len(rows) >= 1000:
+            db.bulk_insert_mappings(models.UserStory, rows)
+            rows = []
+    if rows:
+        db.bulk_insert_mappings(models.UserStory, rows)
+    db.bulk_insert_mappings(models.StoryAssignee, [
+        {"story_id": story_id, "user_id": user_ids[username]}
+        for story_id, assignees in db.query(models.UserStory.id, models.UserStory.assignees)
+        for username in assignees or []
+    ])
+    db.commit()
+    return usernames
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies_ms, errors=0, elapsed_s=None):
+    """Throughput and latency distribution for one scenario."""
+    values = sorted(latencies_ms)
+    total = elapsed_s if elapsed_s is not None else sum(values) / 1000
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / total, 2) if total else None,
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else None,
+    }
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """Per-scenario relative change of p50/p95/p99 and throughput."""
+    deltas = {}
+    for name, result in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        deltas[name] = {}
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if base.get(key) and result.get(key) is not None:
+                deltas[name][key] = round((result[key] - base[key]) / base[key] * 100, 1)
+    return deltas
@@ -0,0 +1,104 @@
+"""
+Check that the GET /stories filters are served by their indexes.
+
+    python bench/explain_filters.py
+    python bench/explain_filters.py --database-url mysql+pymysql://... --reset
+
+Seeds a database like bench_endpoints.py, issues the status / created_by
+(with and without a date range) requests through the ASGI app, captures the
+SQL they run against stories and EXPLAINs it. Exits non-zero when a query is
+not planned on the expected (project_id, ..., created_on) index.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+import common
+
+CHECKS = [
+    ("status", {"status": "backlog"}, "ix_stories_project_id_status_created_on"),
+    ("status + dates", {"status": "proposed,backlog", "start_date": "{start}", "end_date": "{end}"},
+     "ix_stories_project_id_status_created_on"),
+    ("created_by", {"created_by": "{user}"}, "ix_stories_project_id_created_by_key_created_on"),
+    ("created_by + dates", {"created_by": "{user}", "start_date": "{start}", "end_date": "{end}"},
+     "ix_stories_project_id_created_by_key_created_on"),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--reset", action="store_true",
+                        help="Drop and recreate the schema on a non-default database")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--stories", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=515)
+    return parser.parse_args()
+
+
+def explain(connection, statement, parameters) -> str:
+    """The plan of one statement, flattened to text."""
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+def main():
+    args = parse_args()
+    url = common.configure_database(args.database_url)
+    if url != common.DEFAULT_DATABASE_URL and not args.reset:
+        sys.exit("Refusing to drop tables on a non-default database without --reset")
+
+    import database
+    from sqlalchemy import event, text
+
+    common.prepare_engine(database.engine)
+    common.reset_schema(database.engine)
+    db = database.SessionLocal()
+    try:
+        usernames = common.seed(db, args.users, args.stories, args.seed)
+    finally:
+        db.close()
+    # Give the planner row statistics, as a long-running database would have
+    with database.engine.begin() as connection:
+        connection.execute(text("ANALYZE" if database.engine.dialect.name == "sqlite" else "ANALYZE TABLE stories"))
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    captured = []
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM stories" in statement:
+            captured.append((statement, parameters))
+
+    client = TestClient(app_main.app)
+    token = client.post("/login", json={
+        "email": f"{usernames[0]}@example.com", "password": common.BENCH_PASSWORD,
+    }).json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    values = {
+        "user": usernames[0],
+        "start": (date.today() - timedelta(days=90)).isoformat(),
+        "end": date.today().isoformat(),
+    }
+    failures = 0
+    for name, params, index in CHECKS:
+        captured.clear()
+        response = client.get("/stories", headers=headers, params={key: value.format(**values) for key, value in params.items()})
+        if response.status_code != 200 or not captured:
+            print(f"FAIL {name}: HTTP {response.status_code}")
+            failures += 1
+            continue
+        statement, parameters = captured[-1]
+        with database.engine.connect() as connection:
+            plan = explain(connection, statement, parameters)
+        ok = index in plan
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: expected {index}\n    " + plan.replace("\n", "\n    "))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
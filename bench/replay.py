@@ -0,0 +1,176 @@
+"""
+Replay a captured traffic trace (see traffic.py) against one or two running
+instances and compare their latency distributions.
+
+    python bench/replay.py traces.jsonl --target http://localhost:8000
+    python bench/replay.py traces.jsonl --target http://localhost:8000 \\
+        --target http://localhost:8001 --speed 4 --output compare.json
+
+--speed 1 keeps the original inter-arrival times, --speed 4 replays four
+times faster and --speed 0 sends requests back to back. Requests that were
+authenticated when captured are sent with a token obtained by logging in
+with --email/--password on each target; /login itself is replayed with the
+same credentials because captured passwords are redacted. Write requests
+whose body was not captured (TRAFFIC_CAPTURE_BODIES unset) are skipped and
+counted in the report, since a placeholder body would only fail validation.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+import common
+
+REDACTED = "***"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="JSON-lines file written by traffic capture")
+    parser.add_argument("--target", action="append", required=True,
+                        help="Base URL of an instance; give twice to compare two builds")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Maximum requests in flight")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--read-only", action="store_true",
+                        help="Skip POST/PUT/PATCH/DELETE requests (except /login)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N traces")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+
+def needs_body(trace):
+    """A write whose JSON body was captured only as a shape."""
+    return "body_shape" in trace and "body" not in trace and trace["path"] != "/login"
+
+
+def load_traces(path, limit=None, read_only=False):
+    """Traces to replay, sorted by time, and the number skipped for lack of a body."""
+    traces, skipped = [], 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            trace = json.loads(line)
+            if read_only and trace["method"] != "GET" and trace["path"] != "/login":
+                continue
+            if needs_body(trace):
+                skipped += 1
+                continue
+            traces.append(trace)
+            if limit and len(traces) >= limit:
+                break
+    traces.sort(key=lambda t: t["ts"])
+    return traces, skipped
+
+
+def request_body(trace, args):
+    if trace["path"] == "/login":
+        return {"email": args.email, "password": args.password}
+    return trace.get("body")
+
+
+async def login(client, args):
+    if not (args.email and args.password):
+        return None
+    response = await client.post("/login", json={"email": args.email, "password": args.password})
+    response.raise_for_status()
+    return response.json()["accessToken"]
+
+
+async def replay_target(base_url, traces, args):
+    """Replay traces against base_url, returning per-route latencies in ms."""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        token = await login(client, args)
+        auth_headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+        async def issue(trace):
+            key = f"{trace['method']} {trace['route']}"
+            headers = auth_headers if trace.get("auth") else {}
+            body = request_body(trace, args)
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    response = await client.request(
+                        trace["method"], trace["path"],
+                        params=[(k, v) for k, v in trace.get("params", []) if v != REDACTED],
+                        json=body, headers=headers,
+                    )
+                    failed = response.status_code >= 500 or (
+                        response.status_code >= 400 and (trace.get("status") or 0) < 400
+                    )
+                except httpx.HTTPError:
+                    failed = True
+                latencies[key].append(round((time.perf_counter() - t0) * 1000, 3))
+                if failed:
+                    errors[key] += 1
+
+        origin = traces[0]["ts"] if traces else 0
+        started = time.perf_counter()
+        tasks = []
+        for trace in traces:
+            if args.speed > 0:
+                delay = (trace["ts"] - origin) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(issue(trace)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    results = {key: common.summarize(values, errors[key]) for key, values in sorted(latencies.items())}
+    everything = [v for values in latencies.values() for v in values]
+    results["ALL"] = common.summarize(everything, sum(errors.values()), elapsed)
+    return results
+
+
+def main():
+    args = parse_args()
+    if len(args.target) > 2:
+        sys.exit("At most two --target values can be compared")
+    traces, skipped = load_traces(args.trace, args.limit, args.read_only)
+    if skipped:
+        print(f"Skipping {skipped} write requests captured without a body "
+              "(set TRAFFIC_CAPTURE_BODIES=1 to replay them)", file=sys.stderr)
+    if not traces:
+        sys.exit("No traces to replay")
+
+    captured = defaultdict(list)
+    for trace in traces:
+        captured[f"{trace['method']} {trace['route']}"].append(trace["duration_ms"])
+    report = {
+        "meta": {"trace": args.trace, "requests": len(traces),
+                 "skipped_without_body": skipped, "speed": args.speed},
+        "captured": {key: common.summarize(values) for key, values in sorted(captured.items())},
+        "targets": {},
+    }
+
+    for base_url in args.target:
+        print(f"Replaying {len(traces)} requests against {base_url}...", file=sys.stderr)
+        report["targets"][base_url] = asyncio.run(replay_target(base_url, traces, args))
+
+    if len(args.target) == 2:
+        first, second = args.target
+        report["delta_pct"] = common.compare(
+            {"results": report["targets"][first]}, {"results": report["targets"][second]}
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Request deadlines, statement timeouts and load shedding.
+
+Every HTTP request gets a deadline: REQUEST_DEADLINE_SECONDS, or the value
+for its route in ROUTE_DEADLINES ("GET /stories=10,..."; 0 exempts a route,
+as for the SSE stream). The deadline is a context variable, so it follows
+sync endpoints into the threadpool, and every SQL statement is bounded by the
+time left:
+
+    MySQL       SELECTs carry a /*+ MAX_EXECUTION_TIME(ms) */ hint
+    PostgreSQL  SET LOCAL statement_timeout before each statement
+    SQLite      a progress handler aborts the statement once the deadline passes
+
+Statements are not started at all after the deadline. A request that misses
+its deadline is answered 504 at the deadline, even while its worker thread
+is still unwinding. While MAX_IN_FLIGHT requests with a deadline are running
+in this worker, new ones are turned away with 503 and Retry-After instead of
+queueing for a threadpool slot and timing out later.
+
+REQUEST_DEADLINES=off installs none of this.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+import ratelimit
+
+REQUEST_DEADLINES = os.getenv("REQUEST_DEADLINES", "on")
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+ROUTE_DEADLINES = os.getenv("ROUTE_DEADLINES", "GET /stories/stream=0,GET /stories=10,GET /filter=10")
+# The default threadpool runs 40 sync endpoints at once; a few more may queue
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "64"))
+SHED_RETRY_AFTER_SECONDS = 1
+# SQLite VM instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 10000
+# A DB error this close to the deadline is taken to be its statement timeout
+TIMEOUT_TOLERANCE_SECONDS = 0.05
+
+logger = logging.getLogger("deadlines")
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of running a statement once the request deadline has passed."""
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    left = remaining()
+    if left is None:
+        return statement, parameters
+    if left <= 0:
+        raise DeadlineExceeded()
+    ms = max(int(left * 1000), 1)
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        if statement.lstrip()[:6].upper() == "SELECT":
+            statement = statement.lstrip()
+            statement = f"SELECT /*+ MAX_EXECUTION_TIME({ms}) */{statement[6:]}"
+    elif dialect == "postgresql":
+        cursor.execute(f"SET LOCAL statement_timeout = {ms}")
+    elif dialect == "sqlite" and not conn.info.get("deadline_handler"):
+        cursor.connection.set_progress_handler(_sqlite_progress, SQLITE_PROGRESS_STEPS)
+        conn.info["deadline_handler"] = True
+    return statement, parameters
+
+
+def _sqlite_progress():
+    # Runs in the thread executing the statement; non-zero interrupts it
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() > deadline
+
+
+def is_timeout(exc: BaseException, deadline: float) -> bool:
+    """Whether exc is a request with this deadline running out of time."""
+    if isinstance(exc, DeadlineExceeded):
+        return True
+    return isinstance(exc, DBAPIError) and time.monotonic() >= deadline - TIMEOUT_TOLERANCE_SECONDS
+
+
+async def _send_error(send, status_code: int, detail: str, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), *headers],
+    })
+    await send({"type": "http.response.body", "body": orjson.dumps({"detail": detail})})
+
+
+class DeadlineMiddleware:
+    """ASGI middleware setting the request deadline and shedding load past MAX_IN_FLIGHT."""
+
+    def __init__(self, app, routes: list, default_seconds: float, max_in_flight: int):
+        self.app = app
+        self.routes = routes
+        self.default_seconds = default_seconds
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+    def seconds_for(self, scope) -> float:
+        for method, pattern, _, seconds in self.routes:
+            if scope["method"] == method and pattern.match(scope["path"]):
+                return seconds
+        return self.default_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.seconds_for(scope)
+        if seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_in_flight:
+            await _send_error(
+                send, 503, "Server busy, retry shortly",
+                [(b"retry-after", str(SHED_RETRY_AFTER_SECONDS).encode())],
+            )
+            return
+
+        state = {"started": False, "abandoned": False}
+
+        async def send_wrapper(message):
+            if state["abandoned"]:
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        # The task copies the context, deadline included, into the endpoint
+        deadline = time.monotonic() + seconds
+        token = _deadline.set(deadline)
+        try:
+            task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        finally:
+            _deadline.reset(token)
+        # Counted until the work really stops, not just until the 504 is sent
+        self.in_flight += 1
+        task.add_done_callback(self._finished)
+
+        done, _ = await asyncio.wait({task}, timeout=seconds)
+        if not done:
+            state["abandoned"] = True
+            task.cancel()
+            if not state["started"]:
+                logger.warning("%s %s missed its %ss deadline", scope["method"], scope["path"], seconds)
+                await _send_error(send, 504, "Request deadline exceeded")
+            return
+
+        exc = task.exception()
+        if exc is None:
+            return
+        if is_timeout(exc, deadline) and not state["started"]:
+            logger.warning("%s %s timed out in the database: %s", scope["method"], scope["path"], exc)
+            await _send_error(send, 504, "Request deadline exceeded")
+            return
+        raise exc
+
+    def _finished(self, task):
+        self.in_flight -= 1
+        if not task.cancelled():
+            # Retrieved here so abandoned tasks do not log "never retrieved"
+            task.exception()
+
+
+def install(app, engine):
+    """Attach the statement hooks to engine and the middleware to app."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute, retval=True)
+    app.add_middleware(
+        DeadlineMiddleware,
+        routes=ratelimit.parse_routes(ROUTE_DEADLINES, float),
+        default_seconds=REQUEST_DEADLINE_SECONDS,
+        max_in_flight=MAX_IN_FLIGHT,
+    )
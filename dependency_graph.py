@@ -0,0 +1,330 @@
+"""
+Story dependency graph.
+
+Story references in `dependencies` and `refinement_dependencies` (12, "12",
+"#12", "story 12", "US-12"; other text is ignored) are stored as edges in
+story_dependencies, one row per (story, story it depends on). Each process
+keeps an adjacency index of those edges plus story points, loaded once and
+updated incrementally after every story write (its own directly, other
+workers' through the story_changes outbox), so traversal, ordering and
+critical-path queries never scan the stories table.
+
+Writes that would close a dependency cycle are rejected with HTTP 400. The
+index only gives a fast answer: writes compare with and re-check the
+committed edges, under a lock on the project row, before changing them.
+"""
+import heapq
+import re
+import threading
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+import models
+import outbox
+
+_STORY_REFERENCE = re.compile(r"^\s*(?:#|(?:story|us)[\s#-]*)?(\d+)\s*$", re.IGNORECASE)
+
+
+def referenced_ids(*lists) -> set:
+    """Story ids referenced by one or more dependency lists."""
+    ids = set()
+    for values in lists:
+        for value in values or []:
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, int):
+                ids.add(value)
+            elif isinstance(value, str):
+                match = _STORY_REFERENCE.match(value)
+                if match:
+                    ids.add(int(match.group(1)))
+    return ids
+
+
+class DependencyIndex:
+    """In-memory adjacency lists; `upstream[s]` are the stories s depends on."""
+
+    def __init__(self):
+        self.upstream = {}
+        self.downstream = {}
+        self.points = {}
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, db: Session) -> "DependencyIndex":
+        index = cls()
+        index.follower = outbox.ChangeFollower(outbox.settled_cursor(db))
+        for story_id, story_points in db.query(models.UserStory.id, models.UserStory.story_points):
+            index.points[story_id] = story_points
+        edges = db.query(models.StoryDependency.story_id, models.StoryDependency.depends_on_id)
+        for story_id, depends_on_id in edges:
+            index.upstream.setdefault(story_id, set()).add(depends_on_id)
+            index.downstream.setdefault(depends_on_id, set()).add(story_id)
+        return index
+
+    def refresh(self, db: Session, changes: dict):
+        """Reload the given stories' points and edges from the database."""
+        story_ids = sorted(changes)
+        for start in range(0, len(story_ids), outbox.REFRESH_BATCH_SIZE):
+            batch = story_ids[start:start + outbox.REFRESH_BATCH_SIZE]
+            points = dict(
+                db.query(models.UserStory.id, models.UserStory.story_points)
+                .filter(models.UserStory.id.in_(batch))
+            )
+            upstream = {}
+            edges = db.query(models.StoryDependency.story_id, models.StoryDependency.depends_on_id)
+            for story_id, depends_on_id in edges.filter(models.StoryDependency.story_id.in_(batch)):
+                upstream.setdefault(story_id, set()).add(depends_on_id)
+            with self.lock:
+                for story_id in batch:
+                    if story_id in points:
+                        self.set_story(story_id, upstream.get(story_id, set()), points[story_id])
+                    else:
+                        self.remove_story(story_id)
+
+    def __contains__(self, story_id):
+        return story_id in self.points
+
+    def upstream_of(self, story_id) -> set:
+        with self.lock:
+            return set(self.upstream.get(story_id, ()))
+
+    def set_story(self, story_id: int, upstream: set, story_points=None):
+        """Record a story's current dependencies and points."""
+        with self.lock:
+            self.points[story_id] = story_points
+            for old in self.upstream.pop(story_id, set()) - set(upstream):
+                self.downstream.get(old, set()).discard(story_id)
+            if upstream:
+                self.upstream[story_id] = set(upstream)
+                for dep in upstream:
+                    self.downstream.setdefault(dep, set()).add(story_id)
+
+    def remove_story(self, story_id: int):
+        with self.lock:
+            self.set_story(story_id, set())
+            for dependent in self.downstream.pop(story_id, set()):
+                self.upstream.get(dependent, set()).discard(story_id)
+            self.points.pop(story_id, None)
+
+    def find_cycle(self, story_id: int, upstream: set):
+        """
+        The cycle story_id -> ... -> story_id that depending on `upstream`
+        would create, as a list of ids, or None.
+        """
+        with self.lock:
+            for start in sorted(upstream):
+                if start == story_id:
+                    return [story_id, story_id]
+                parents = {start: None}
+                stack = [start]
+                while stack:
+                    node = stack.pop()
+                    for dep in self.upstream.get(node, ()):
+                        if dep == story_id:
+                            chain = [node]
+                            while parents[chain[-1]] is not None:
+                                chain.append(parents[chain[-1]])
+                            return [story_id] + chain[::-1] + [story_id]
+                        if dep not in parents:
+                            parents[dep] = node
+                            stack.append(dep)
+        return None
+
+    def traverse(self, story_id: int, direction: str = "upstream", max_depth: int = None) -> list:
+        """Breadth-first [(id, depth)] of everything story_id (transitively) depends on, or that depends on it."""
+        edges = self.upstream if direction == "upstream" else self.downstream
+        with self.lock:
+            seen = {story_id}
+            frontier = [story_id]
+            result = []
+            depth = 0
+            while frontier and (max_depth is None or depth < max_depth):
+                depth += 1
+                following = []
+                for node in frontier:
+                    for neighbour in sorted(edges.get(node, ())):
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            following.append(neighbour)
+                            result.append((neighbour, depth))
+                frontier = following
+        return result
+
+    def topological_order(self, story_ids=None):
+        """
+        Dependencies-first order of story_ids and everything they depend on
+        (default: every story with a dependency edge). Returns (order, cyclic)
+        where cyclic lists stories that sit on or behind a cycle.
+        """
+        with self.lock:
+            if story_ids is None:
+                nodes = set(self.upstream) | set(self.downstream)
+            else:
+                nodes = set()
+                for story_id in story_ids:
+                    if story_id in self.points:
+                        nodes.add(story_id)
+                        nodes.update(node for node, _ in self.traverse(story_id, "upstream"))
+            pending = {node: len(self.upstream.get(node, set()) & nodes) for node in nodes}
+            ready = [node for node, count in pending.items() if count == 0]
+            heapq.heapify(ready)
+            order = []
+            while ready:
+                node = heapq.heappop(ready)
+                order.append(node)
+                for dependent in self.downstream.get(node, ()):
+                    if dependent in pending:
+                        pending[dependent] -= 1
+                        if pending[dependent] == 0:
+                            heapq.heappush(ready, dependent)
+        placed = set(order)
+        return order, sorted(nodes - placed)
+
+    def critical_path(self, story_id: int):
+        """
+        Longest chain of dependencies ending at story_id, weighted by story
+        points (unestimated stories count 0). Returns (points, path) with the
+        path listed from the first prerequisite to story_id.
+        """
+        with self.lock:
+            best = {}
+            via = {}
+            on_stack = set()
+            stack = [(story_id, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if expanded:
+                    on_stack.discard(node)
+                    length, previous = 0, None
+                    for dep in self.upstream.get(node, ()):
+                        # Edges back into the current chain belong to a cycle; skip them
+                        if dep in best and (previous is None or best[dep] > length):
+                            length, previous = best[dep], dep
+                    best[node] = length + (self.points.get(node) or 0)
+                    via[node] = previous
+                    continue
+                if node in best or node in on_stack:
+                    continue
+                on_stack.add(node)
+                stack.append((node, True))
+                for dep in self.upstream.get(node, ()):
+                    if dep not in best and dep not in on_stack:
+                        stack.append((dep, False))
+
+        path = []
+        node = story_id
+        while node is not None:
+            path.append(node)
+            node = via.get(node)
+        return best.get(story_id, 0), path[::-1]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> DependencyIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DependencyIndex.load(db)
+    if not _index.follower.sync(db, _index.refresh):
+        with _index_lock:
+            _index = DependencyIndex.load(db)
+    return _index
+
+
+def find_cycle_in_db(db: Session, story_id: int, upstream: set):
+    """DependencyIndex.find_cycle over the committed story_dependencies rows."""
+    if story_id in upstream:
+        return [story_id, story_id]
+    parents = {node: None for node in upstream}
+    frontier = sorted(upstream)
+    while frontier:
+        rows = (
+            db.query(models.StoryDependency.story_id, models.StoryDependency.depends_on_id)
+            .filter(models.StoryDependency.story_id.in_(frontier))
+            .with_for_update(read=True)
+            .all()
+        )
+        frontier = []
+        for node, dep in sorted(rows):
+            if dep == story_id:
+                chain = [node]
+                while parents[chain[-1]] is not None:
+                    chain.append(parents[chain[-1]])
+                return [story_id] + chain[::-1] + [story_id]
+            if dep not in parents:
+                parents[dep] = node
+                frontier.append(dep)
+    return None
+
+
+def stage_story(db: Session, story: models.UserStory) -> set:
+    """
+    Validate and write story's dependency edges into db (not committed).
+    Returns the upstream ids to hand to commit_story() after the commit.
+    Raises HTTP 400 when the new dependencies would form a cycle.
+    """
+    index = get_index(db)
+    referenced = referenced_ids(story.dependencies, story.refinement_dependencies)
+    if referenced:
+        # Only references to existing stories of the same project become edges
+        referenced = {
+            row[0] for row in
+            db.query(models.UserStory.id).filter(
+                models.UserStory.project_id == story.project_id,
+                models.UserStory.id.in_(referenced),
+            ).all()
+        }
+
+    # The index may lag other workers' writes, so compare with and validate
+    # against committed rows (locking reads see them under any isolation level)
+    current = {
+        row[0] for row in
+        db.query(models.StoryDependency.depends_on_id)
+        .filter(models.StoryDependency.story_id == story.id)
+        .with_for_update(read=True)
+    }
+    if referenced == current:
+        return referenced
+
+    if referenced - current:
+        cycle = index.find_cycle(story.id, referenced)
+        if cycle is None:
+            # One dependency change per project at a time, so two workers
+            # cannot each add one half of a cycle
+            db.query(models.Project.id).filter(
+                models.Project.id == story.project_id
+            ).with_for_update().one_or_none()
+            cycle = find_cycle_in_db(db, story.id, referenced)
+        if cycle:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Dependency cycle: " + " → ".join(f"#{node}" for node in cycle),
+            )
+
+    db.query(models.StoryDependency).filter(
+        models.StoryDependency.story_id == story.id
+    ).delete(synchronize_session=False)
+    for depends_on_id in sorted(referenced):
+        db.add(models.StoryDependency(story_id=story.id, depends_on_id=depends_on_id))
+    return referenced
+
+
+def commit_story(db: Session, story_id: int, upstream: set, story_points=None):
+    get_index(db).set_story(story_id, upstream, story_points)
+
+
+def stage_delete(db: Session, story_id: int):
+    db.query(models.StoryDependency).filter(
+        (models.StoryDependency.story_id == story_id)
+        | (models.StoryDependency.depends_on_id == story_id)
+    ).delete(synchronize_session=False)
+
+
+def commit_delete(db: Session, story_id: int):
+    get_index(db).remove_story(story_id)
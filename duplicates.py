@@ -0,0 +1,291 @@
+"""
+Near-duplicate story detection with MinHash and locality-sensitive hashing.
+
+Each story's normalized title + description is cut into character shingles;
+NUM_PERM hash permutations reduce them to a MinHash signature whose matching
+fraction estimates the Jaccard similarity of two stories. Signatures are split
+into LSH_BANDS bands, and stories sharing any band land in the same bucket,
+so a lookup only compares against a handful of candidates instead of the
+whole backlog.
+
+DUPLICATE_CHECK controls POST /stories:
+    off    no check
+    warn   (default) the story is created and likely duplicates are returned
+    block  creation fails with 409 listing the duplicates, unless the request
+           passes allow_duplicate=true
+
+The index is per process, built on first use and updated after every story
+write (other workers' writes are picked up from the story_changes outbox).
+`python duplicates.py` (or the scan_duplicate_clusters task) rebuilds it and
+reports clusters of duplicates across the existing backlog.
+"""
+import os
+import re
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+import outbox
+
+DUPLICATE_CHECK = os.getenv("DUPLICATE_CHECK", "warn")
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.6"))
+MAX_DUPLICATES = 5
+
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 5
+
+# Multiply-shift hash family: h(x) = (a*x + b) mod 2^64, top 32 bits
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+
+_SHINGLE_BITS = 8 * SHINGLE_SIZE
+_SHINGLE_WEIGHTS = np.array([1 << (8 * i) for i in range(SHINGLE_SIZE)], dtype=np.uint64)
+SIGNATURE_BATCH = 64
+SHINGLE_CHUNK = 4096
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(title: str, description: str = None) -> str:
+    text = f"{title or ''} {description or ''}".lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def signatures(texts: list) -> list:
+    """
+    MinHash signatures (NUM_PERM uint32 values) for normalized texts, None
+    for empty ones. The whole batch is shingled and hashed in one pass:
+    every SHINGLE_SIZE-character window is packed into an integer, tagged
+    with its text's position, deduplicated, and min-reduced per text in
+    chunks of SHINGLE_CHUNK shingles.
+    """
+    encoded = [text.encode("ascii").ljust(SHINGLE_SIZE, b"\0") if text else b"" for text in texts]
+    lengths = np.array([len(data) for data in encoded], dtype=np.int64)
+    result = [None] * len(texts)
+    if not lengths.any():
+        return result
+
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    packed = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE) @ _SHINGLE_WEIGHTS
+    owner = np.repeat(np.arange(len(texts), dtype=np.uint64), lengths)[:packed.size]
+    ends = np.cumsum(lengths)
+    # Drop windows that run past the end of their text into the next one
+    valid = np.arange(packed.size) + SHINGLE_SIZE <= ends[owner.astype(np.int64)]
+    keys = np.unique((owner[valid] << np.uint64(_SHINGLE_BITS)) | packed[valid])
+    owner = (keys >> np.uint64(_SHINGLE_BITS)).astype(np.int64)
+    shingle = keys & np.uint64((1 << _SHINGLE_BITS) - 1)
+
+    # Hash SHINGLE_CHUNK shingles at a time so the NUM_PERM x shingles matrix
+    # stays bounded however long the texts are; keys are sorted by owner, so
+    # each chunk reduces per owner and folds into the running minima
+    minima = np.full((NUM_PERM, len(texts)), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for low in range(0, shingle.size, SHINGLE_CHUNK):
+        chunk_owner = owner[low:low + SHINGLE_CHUNK]
+        hashed = (_PERM_A[:, None] * shingle[None, low:low + SHINGLE_CHUNK] + _PERM_B[:, None]) >> np.uint64(32)
+        starts = np.flatnonzero(np.r_[True, chunk_owner[1:] != chunk_owner[:-1]])
+        owners = chunk_owner[starts]
+        minima[:, owners] = np.minimum(minima[:, owners], np.minimum.reduceat(hashed, starts, axis=1))
+    for position in np.unique(owner).tolist():
+        result[position] = minima[:, position].astype(np.uint32)
+    return result
+
+
+def signature(title: str, description: str = None):
+    """MinHash signature of one story, or None for empty text."""
+    return signatures([normalize(title, description)])[0]
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(first == second)) / NUM_PERM
+
+
+def _band_keys(sig: np.ndarray) -> list:
+    return [sig[i * LSH_ROWS:(i + 1) * LSH_ROWS].tobytes() for i in range(LSH_BANDS)]
+
+
+def _rows(db: Session):
+    return db.query(
+        models.UserStory.id, models.UserStory.title, models.UserStory.description, models.UserStory.project_id
+    )
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self.signatures = {}
+        self.titles = {}
+        self.projects = {}
+        # Bucket keys are (project_id, band hash): stories only collide within a project
+        self.buckets = [dict() for _ in range(LSH_BANDS)]
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db: Session) -> "DuplicateIndex":
+        index = cls()
+        index.follower = outbox.ChangeFollower(outbox.settled_cursor(db))
+        index._insert_rows(_rows(db).all())
+        return index
+
+    def _insert_rows(self, rows):
+        for start in range(0, len(rows), SIGNATURE_BATCH):
+            batch = rows[start:start + SIGNATURE_BATCH]
+            sigs = signatures([normalize(title, description) for _, title, description, _ in batch])
+            for (story_id, title, _, project_id), sig in zip(batch, sigs):
+                self._insert(story_id, title, sig, project_id)
+
+    def refresh(self, db: Session, changes: dict):
+        """Reload the given stories from the database."""
+        story_ids = sorted(changes)
+        for start in range(0, len(story_ids), outbox.REFRESH_BATCH_SIZE):
+            batch = story_ids[start:start + outbox.REFRESH_BATCH_SIZE]
+            rows = _rows(db).filter(models.UserStory.id.in_(batch)).all()
+            for story_id in set(batch) - {row[0] for row in rows}:
+                self.remove_story(story_id)
+            self._insert_rows(rows)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def set_story(self, story_id: int, title: str, description: str = None, project_id: int = None):
+        self._insert(story_id, title, signature(title, description), project_id)
+
+    def _insert(self, story_id: int, title: str, sig, project_id: int = None):
+        with self.lock:
+            self._remove(story_id)
+            if sig is None:
+                return
+            self.signatures[story_id] = sig
+            self.titles[story_id] = title
+            self.projects[story_id] = project_id
+            for band, key in enumerate(_band_keys(sig)):
+                self.buckets[band].setdefault((project_id, key), set()).add(story_id)
+
+    def remove_story(self, story_id: int):
+        with self.lock:
+            self._remove(story_id)
+
+    def _remove(self, story_id: int):
+        sig = self.signatures.pop(story_id, None)
+        self.titles.pop(story_id, None)
+        project_id = self.projects.pop(story_id, None)
+        if sig is None:
+            return
+        for band, key in enumerate(_band_keys(sig)):
+            bucket = self.buckets[band].get((project_id, key))
+            if bucket is not None:
+                bucket.discard(story_id)
+                if not bucket:
+                    del self.buckets[band][(project_id, key)]
+
+    def _candidates(self, sig: np.ndarray, project_id: int = None) -> set:
+        found = set()
+        for band, key in enumerate(_band_keys(sig)):
+            found.update(self.buckets[band].get((project_id, key), ()))
+        return found
+
+    def query(self, title: str, description: str = None, threshold: float = None,
+              exclude: int = None, limit: int = MAX_DUPLICATES, project_id: int = None) -> list:
+        """Stories of the project whose estimated similarity reaches threshold, most similar first."""
+        threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+        sig = signature(title, description)
+        if sig is None:
+            return []
+        with self.lock:
+            matches = []
+            for story_id in self._candidates(sig, project_id):
+                if story_id == exclude:
+                    continue
+                score = similarity(sig, self.signatures[story_id])
+                if score >= threshold:
+                    matches.append({"id": story_id, "title": self.titles[story_id], "similarity": round(score, 3)})
+        matches.sort(key=lambda m: (-m["similarity"], m["id"]))
+        return matches[:limit]
+
+    def clusters(self, threshold: float = None, project_id: int = None) -> list:
+        """
+        Groups of two or more stories linked by pairwise similarity >= threshold,
+        within one project (default: within each project).
+        """
+        threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+        parent = {}
+
+        def find(x):
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        with self.lock:
+            seen_buckets = set()
+            for band in self.buckets:
+                for (bucket_project, _), bucket in band.items():
+                    if len(bucket) < 2 or (project_id is not None and bucket_project != project_id):
+                        continue
+                    members = tuple(sorted(bucket))
+                    # Stories colliding in several bands only need comparing once
+                    if members in seen_buckets:
+                        continue
+                    seen_buckets.add(members)
+                    sigs = np.stack([self.signatures[m] for m in members])
+                    for start in range(0, len(members), 256):
+                        block = sigs[start:start + 256]
+                        scores = (block[:, None, :] == sigs[None, :, :]).sum(axis=2) / NUM_PERM
+                        rows, cols = np.nonzero(scores >= threshold)
+                        for row, col in zip((rows + start).tolist(), cols.tolist()):
+                            if row < col:
+                                parent[find(members[col])] = find(members[row])
+            groups = {}
+            for story_id in set(parent) | set(parent.values()):
+                groups.setdefault(find(story_id), set()).add(story_id)
+            return [
+                [{"id": story_id, "title": self.titles[story_id]} for story_id in sorted(members)]
+                for members in sorted(groups.values(), key=lambda m: (-len(m), min(m)))
+            ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> DuplicateIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DuplicateIndex.load(db)
+    if not _index.follower.sync(db, _index.refresh):
+        rebuild(db)
+    return _index
+
+
+def rebuild(db: Session) -> DuplicateIndex:
+    """Reload the process index from the database."""
+    global _index
+    index = DuplicateIndex.load(db)
+    with _index_lock:
+        _index = index
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Report clusters of near-duplicate stories")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        found = rebuild(session).clusters(args.threshold)
+    finally:
+        session.close()
+    for cluster in found:
+        print(", ".join(f"#{story['id']} {story['title']}" for story in cluster))
+    print(f"{len(found)} duplicate clusters")
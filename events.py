@@ -0,0 +1,176 @@
+"""
+Story change feed.
+
+add_story, update_story and delete_story publish an event straight after
+their commit (in tasks.after_story_change); clients receive them over
+Server-Sent Events (GET /stories/stream) or a WebSocket (/stories/ws)
+instead of polling GET /stories.
+
+The broker is chosen with EVENT_BROKER:
+    memory (default)  in-process fan-out; only reaches clients of this worker
+    redis             Redis pub/sub on REDIS_URL, so every worker sees every event
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENT_CHANNEL = os.getenv("EVENT_CHANNEL", "stories.events")
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+logger = logging.getLogger("events")
+
+
+class Subscription:
+    """One connected client: a bounded queue plus its status/assignee/project filters."""
+
+    def __init__(self, loop, statuses=None, assignees=None, project_id=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.statuses = {s.lower() for s in statuses} if statuses else None
+        self.assignees = {a.lower() for a in assignees} if assignees else None
+        self.project_id = project_id
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.project_id is not None and event.get("projectId") != self.project_id:
+            return False
+        if self.statuses is not None:
+            seen = {event.get("status"), event.get("previousStatus")}
+            if not any(s and s.lower() in self.statuses for s in seen):
+                return False
+        if self.assignees is not None:
+            seen = (event.get("assignees") or []) + (event.get("previousAssignees") or [])
+            if not any(a.lower() in self.assignees for a in seen):
+                return False
+        return True
+
+    def offer(self, event: dict):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind must resync with GET /stories
+            self.overflowed = True
+
+    async def get(self, timeout: float):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InMemoryBroker:
+    """Fans events out to the subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def subscribe(self, statuses=None, assignees=None, project_id=None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), statuses, assignees, project_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: dict):
+        """Thread-safe; called from sync endpoints running in the threadpool."""
+        self._dispatch(event)
+
+    def _dispatch(self, event: dict):
+        with self._lock:
+            self._sequence += 1
+            event = {**event, "seq": self._sequence}
+            targets = [s for s in self._subscribers if s.matches(event)]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Loop already closed; the client is gone
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(InMemoryBroker):
+    """Publishes through Redis pub/sub and fans messages out locally."""
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._channel = channel
+        self._listener = None
+
+    def subscribe(self, statuses=None, assignees=None, project_id=None) -> Subscription:
+        self._ensure_listener()
+        return super().subscribe(statuses, assignees, project_id)
+
+    def publish(self, event: dict):
+        try:
+            self._redis.publish(self._channel, json.dumps(event, default=str))
+        except Exception:
+            logger.exception("Failed to publish story event to Redis")
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="story-events", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._dispatch(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Story event listener lost its Redis connection; retrying")
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> InMemoryBroker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if EVENT_BROKER == "redis":
+                    _broker = RedisBroker(REDIS_URL, EVENT_CHANNEL)
+                else:
+                    _broker = InMemoryBroker()
+    return _broker
+
+
+def story_event(kind: str, story: dict, previous: dict = None) -> dict:
+    """
+    Build a story.<kind> event. `story` is a camelCase story dict (for deletes
+    just id, status, assignees and projectId); `previous` carries the status and assignees
+    before an update so filtered clients also learn when a card leaves them.
+    """
+    event = {
+        "type": f"story.{kind}",
+        "id": story.get("id"),
+        "status": story.get("status"),
+        "assignees": story.get("assignees") or [],
+        "projectId": story.get("projectId"),
+        "story": story,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+    if previous:
+        event["previousStatus"] = previous.get("status")
+        event["previousAssignees"] = previous.get("assignees") or []
+    return event
+
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for the multi-worker serving mode (SERVER_MODE=gunicorn in
+entrypoint.sh): `gunicorn -c gunicorn.conf.py main:app`.
+
+Every worker is a separate process with its own in-memory indexes; they are
+built lazily and catch up on other workers' writes through the story_changes
+outbox, so no shared state is needed beyond the database.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master and fork it, so workers start fast and share memory
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# A worker silent for `timeout` seconds is killed; on shutdown or reload,
+# workers get `graceful_timeout` seconds to finish in-flight requests
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers to bound memory growth; jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# UvicornWorker honours X-Forwarded-For from these addresses (see entrypoint.sh)
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+accesslog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # Pooled connections opened while preloading belong to the master; each
+    # worker must open its own instead of sharing the same sockets
+    from database import engine
+
+    engine.dispose(close=False)
@@ -1,16 +1,41 @@
 import auth
 from auth import create_access_token, verify_access_token
 from schemas import UserCreate, UserResponse
-from passlib.context import CryptContext
 import schemas
 import models
-from datetime import date, datetime
+import serializers
+import story_users
+import user_search
+import events
+import outbox
+import duplicates
+import deadlines
+import dependency_graph
+import planning
+import projects
+import ratelimit
+import ranking
+import related
+import tasks
+import analytics
+import archive
+import rollup
+import profiler
+import traffic
+import asyncio
+import json
+from collections import Counter
+from functools import lru_cache
+from datetime import date, datetime, timedelta
 from typing import Optional
-from database import SessionLocal
+from database import SessionLocal, engine
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.status import WS_1008_POLICY_VIOLATION
 from dotenv import load_dotenv
 from sqlalchemy import func
 from fastapi import Query
@@ -20,7 +45,15 @@ load_dotenv()
 
 app = FastAPI(title="Requirements Engineering Tool Prototype")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hasher, created on first use to keep passlib/bcrypt off the startup path."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 
 origins = [
     "http://localhost:5173",
@@ -31,14 +64,35 @@ origins = [
     "https://ser515-group1-frontend-repo.onrender.com",
 ]
 
+# Added before CORS so 429/503/504 responses still carry CORS headers;
+# deadlines go innermost so rate-limited requests never count as in flight
+if deadlines.REQUEST_DEADLINES != "off":
+    deadlines.install(app, engine)
+
+if ratelimit.RATE_LIMIT != "off":
+    ratelimit.install(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "Retry-After"],
 )
 
+if profiler.QUERY_PROFILER_ENABLED:
+    profiler.install(app, engine)
+
+if traffic.TRAFFIC_CAPTURE_FILE:
+    traffic.install(app)
+
+
+@app.on_event("startup")
+def start_task_scheduler():
+    # Runs in every worker after the fork; a no-op unless TASK_BACKEND=thread
+    tasks.start_scheduler()
+
 VALID_STATUSES = [
     "Backlog",
     "Proposed",
@@ -48,8 +102,6 @@ VALID_STATUSES = [
     "Sprint Ready",
 ]
 
-print("Valid statuses:", VALID_STATUSES)
-
 STATUS_CANONICAL = {s.lower(): s for s in VALID_STATUSES}
 
 STATUS_TRANSITIONS = {
@@ -320,6 +372,15 @@ def get_current_user(
     return user
 
 
+def get_project_id(
+        project_id: Optional[int] = Query(default=None, ge=1),
+        current_user: models.User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+) -> int:
+    """The project_id query parameter, checked against the caller's memberships (default: their first project)."""
+    return projects.resolve(db, current_user, project_id)
+
+
 @app.post("/users", response_model=schemas.UserResponse)
 def create_user(request: schemas.UserCreate, db: Session = Depends(get_db)):
     # Check if email already exists
@@ -353,7 +414,7 @@ def create_user(request: schemas.UserCreate, db: Session = Depends(get_db)):
     first_name = name_parts[0]
     last_name = name_parts[1] if len(name_parts) > 1 else ""
 
-    hashed = pwd_context.hash(request.password)
+    hashed = get_pwd_context().hash(request.password)
     user = models.User(
         username=request.username,
         first_name=first_name,
@@ -363,6 +424,8 @@ def create_user(request: schemas.UserCreate, db: Session = Depends(get_db)):
         role_code=request.role_code
     )
     db.add(user)
+    db.flush()
+    projects.join_default_project(db, user)
     db.commit()
     db.refresh(user)
     return user
@@ -380,7 +443,7 @@ def login_json(request: schemas.LoginRequest, db: Session = Depends(get_db)):
         )
 
     # Check if password is correct
-    if not pwd_context.verify(request.password, user.password_hash):
+    if not get_pwd_context().verify(request.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
@@ -440,7 +503,7 @@ def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(
         )
 
     # Hash the new password and update
-    user.password_hash = pwd_context.hash(request.new_password)
+    user.password_hash = get_pwd_context().hash(request.new_password)
     db.commit()
 
     return {"message": "Password reset successfully"}
@@ -456,11 +519,20 @@ def get_all_roles(db: Session = Depends(get_db)):
 
 
 @app.get("/users", response_model=list[schemas.UserResponse])
-def get_all_users(db: Session = Depends(get_db)):
+def get_all_users(
+    response: Response,
+    q: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db)
+):
     """
-    Get all users with their roles.
+    One page of users with their roles, ordered by username. `q` prefix-matches
+    username, first/last name and email (case-insensitive, every word must
+    match); the total number of matches is in X-Total-Count.
     """
-    users = db.query(models.User).all()
+    total, users = user_search.search(db, q, limit, offset)
+    response.headers["X-Total-Count"] = str(total)
     return users
 
 
@@ -501,6 +573,81 @@ def update_user_role(
     return user
 
 
+@app.get("/projects", response_model=list[schemas.ProjectResponse])
+def get_my_projects(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Projects the current user is a member of."""
+    project_ids = projects.member_project_ids(db, current_user)
+    if not project_ids:
+        return []
+    return db.query(models.Project).filter(models.Project.id.in_(project_ids)).order_by(models.Project.id).all()
+
+
+@app.post("/projects", response_model=schemas.ProjectResponse)
+def create_project(
+    request: schemas.ProjectCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    name = request.name.strip()
+    if not name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Project name cannot be empty"
+        )
+    if db.query(models.Project).filter_by(name=name).first():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Project name already taken"
+        )
+
+    project = models.Project(name=name, created_by=current_user.username)
+    db.add(project)
+    db.flush()
+    projects.add_member(db, project.id, current_user.id)
+    db.commit()
+    db.refresh(project)
+    return project
+
+
+@app.post("/projects/{project_id}/members")
+def add_project_member(
+    project_id: int,
+    request: schemas.ProjectMemberRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add a user to a project the current user belongs to."""
+    projects.require_member(db, current_user, project_id)
+    user = db.query(models.User).filter_by(id=request.user_id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    projects.add_member(db, project_id, user.id)
+    db.commit()
+    return {"message": "Member added successfully", "projectId": project_id, "userId": user.id}
+
+
+@app.delete("/projects/{project_id}/members/{user_id}")
+def remove_project_member(
+    project_id: int,
+    user_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    projects.require_member(db, current_user, project_id)
+    membership = db.get(models.ProjectMember, (project_id, user_id))
+    if membership is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Membership not found"
+        )
+    db.delete(membership)
+    db.commit()
+    return {"message": "Member removed successfully", "projectId": project_id, "userId": user_id}
+
+
 def parse_multi(value):
     if not value:
         return None
@@ -519,83 +666,99 @@ def get_stories(
     created_by: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    fields: Optional[str] = None,
+    sort: str = "mvp",
+    weights: Optional[str] = None,
+    include_archived: bool = False,
+    expand: Optional[str] = None,
+    project_id: int = Depends(get_project_id),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.UserStory)
+    sort_weights = ranking.parse_weights(sort, weights)
+    expand_users = story_users.parse_expand(expand)
+    output_fields = serializers.parse_fields(fields)
+    # Ranking needs bv, story_points and moscow_priority even when not requested
+    columns = serializers.select_fields(
+        output_fields, extra=("bv", "story_points", "moscow_priority"))
     assignees_list = parse_multi(assignees)
     status_list = parse_multi(status)
     tags_list = parse_multi(tags)
     created_list = parse_multi(created_by)
 
-    if assignees_list:
-        # Filter by assignees JSON array - check if any requested assignee is in the array
-        # Case-insensitive matching: check both lowercase and title case variations
-        conditions = []
-        for a in assignees_list:
-            conditions.append(func.json_contains(
-                models.UserStory.assignees, f'"{a.lower()}"'))
-            conditions.append(func.json_contains(
-                models.UserStory.assignees, f'"{a.title()}"'))
-        query = query.filter(or_(*conditions))
-
-    if status_list:
-        query = query.filter(
-            or_(*[func.lower(models.UserStory.status) == s for s in status_list])
-        )
-
-    if created_list:
-        query = query.filter(
-            or_(*[func.lower(models.UserStory.created_by) == c for c in created_list])
-        )
-
-    if tags_list:
-        query = query.filter(models.UserStory.tags.isnot(None))
-        query = query.filter(models.UserStory.tags != "")
-        query = query.filter(
-            or_(*[
-                func.lower(models.UserStory.tags).like(f"%{t}%")
-                for t in tags_list
-            ])
-        )
-
-    if start_date:
-        query = query.filter(models.UserStory.created_on >= start_date)
-
-    if end_date:
-        end_dt = datetime.combine(end_date, datetime.max.time())
-        query = query.filter(models.UserStory.created_on <= end_dt)
-
-    stories = query.all()
-
-    for s in stories:
-        if isinstance(s.tags, str):
-            s.tags = [tag.strip() for tag in s.tags.split(",") if tag.strip()]
-
-        # Calculate MVP score: Business Value (from bv field) / Story Points
-        # Use the actual bv field value, default to 0 if not set
-        business_value = s.bv if s.bv is not None else 0
-        if s.story_points is not None and s.story_points != 0 and s.story_points > 0 and business_value > 0:
-            s.mvp_score = business_value / s.story_points
-        else:
-            s.mvp_score = 0.0
-
-    # Sort stories by MoSCoW priority (primary), then by MVP score (secondary)
-    # MoSCoW priority order: Must > Should > Could > Won't
-    # "Must" stories always come first regardless of MVP score
-    moscow_order = {"Must": 4, "Should": 3, "Could": 2, "Won't": 1}
-
-    def sort_key(story):
-        moscow_priority_score = moscow_order.get(story.moscow_priority, 0)
-        # MoSCoW is PRIMARY, MVP score is SECONDARY (tiebreaker within same priority)
-        return (moscow_priority_score, story.mvp_score)
-
-    stories = sorted(stories, key=sort_key, reverse=True)
+    def filtered(model):
+        query = db.query(*serializers.story_columns(columns, model)).filter(
+            model.project_id == project_id)
+
+        if assignees_list:
+            # Filter by assignees JSON array - check if any requested assignee is in the array
+            # Case-insensitive matching: check both lowercase and title case variations
+            conditions = []
+            for a in assignees_list:
+                conditions.append(func.json_contains(
+                    model.assignees, f'"{a.lower()}"'))
+                conditions.append(func.json_contains(
+                    model.assignees, f'"{a.title()}"'))
+            query = query.filter(or_(*conditions))
+
+        # Stored status is canonical and created_by_key lowercase, so both
+        # compare the bare column and can use the (project_id, ..., created_on) indexes
+        if status_list:
+            query = query.filter(model.status.in_(
+                [STATUS_CANONICAL[s] for s in status_list if s in STATUS_CANONICAL]))
+
+        if created_list:
+            query = query.filter(model.created_by_key.in_(created_list))
+
+        if tags_list:
+            query = query.filter(model.tags.isnot(None))
+            query = query.filter(model.tags != "")
+            query = query.filter(
+                or_(*[
+                    func.lower(model.tags).like(f"%{t}%")
+                    for t in tags_list
+                ])
+            )
 
-    return stories
+        if start_date:
+            query = query.filter(model.created_on >= start_date)
+
+        if end_date:
+            end_dt = datetime.combine(end_date, datetime.max.time())
+            query = query.filter(model.created_on <= end_dt)
+
+        if expand_users:
+            query = story_users.with_creator(query, model)
+        return query.all()
+
+    rows = filtered(models.UserStory)
+    archived_from = len(rows)
+    if include_archived:
+        rows += filtered(models.ArchivedStory)
+
+    # Rows are plain tuples ordered like `columns`; skipping ORM instances and
+    # StoryResponse validation keeps large lists cheap. Scores and order are
+    # computed for the whole list at once (see ranking.py).
+    backlog = ranking.Backlog.from_rows(
+        rows, columns.index("id"), columns.index("bv"),
+        columns.index("story_points"), columns.index("moscow_priority"))
+    order, _ = ranking.rank(sort, backlog, sort_weights)
+    mvp_scores = ranking.mvp_scores(backlog).tolist()
+
+    stories = [
+        serializers.story_row_to_dict(
+            rows[i], columns, output_fields, mvp_score=mvp_scores[i])
+        for i in order.tolist()
+    ]
+    if include_archived:
+        for i, story in zip(order.tolist(), stories):
+            story["archived"] = i >= archived_from
+    if expand_users:
+        story_users.add_users(db, stories, [rows[i] for i in order.tolist()], len(columns))
+    return serializers.json_response(stories)
 
 
 @app.post("/stories")
-def add_story(request: schemas.StoryCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_story(request: schemas.StoryCreate, allow_duplicate: bool = False, project_id: int = Depends(get_project_id), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not request.title or not request.title.strip():
         raise HTTPException(
             status_code=400, detail={"message": "Title cannot be empty"}
@@ -604,6 +767,16 @@ def add_story(request: schemas.StoryCreate, current_user: models.User = Depends(
         raise HTTPException(
             status_code=400, detail={"message": "Description cannot be empty"}
         )
+
+    similar = []
+    if duplicates.DUPLICATE_CHECK != "off":
+        similar = duplicates.get_index(db).query(
+            request.title, request.description, project_id=project_id)
+        if similar and duplicates.DUPLICATE_CHECK == "block" and not allow_duplicate:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Story looks like a duplicate", "duplicates": similar},
+            )
     request.status = ensure_valid_status_or_400(request.status)
     # Assignees is optional - default to empty list
     assignees_value = request.assignees if request.assignees else []
@@ -626,6 +799,7 @@ def add_story(request: schemas.StoryCreate, current_user: models.User = Depends(
     ]
 
     new_story = models.UserStory(
+        project_id=project_id,
         title=request.title,
         description=request.description,
         assignees=assignees_value,
@@ -636,6 +810,7 @@ def add_story(request: schemas.StoryCreate, current_user: models.User = Depends(
         moscow_priority=request.moscow_priority,
         activity=initial_activity,
         created_by=current_user.username,
+        created_by_id=current_user.id,
         bv=getattr(request, "bv", None),
         refinement_session_scheduled=getattr(
             request, "refinement_session_scheduled", None),
@@ -652,12 +827,30 @@ def add_story(request: schemas.StoryCreate, current_user: models.User = Depends(
         tasks_identified=getattr(request, "tasks_identified", None)
     )
     db.add(new_story)
+    db.flush()
+    upstream = dependency_graph.stage_story(db, new_story)
+    story_users.stage_story(db, new_story)
+    analytics.record_transition(
+        db, new_story.id, None, new_story.status, current_user.username, project_id=new_story.project_id)
+    change_id = outbox.record_change(
+        db, new_story.id, "created", current_user.username, project_id=new_story.project_id)
     db.commit()
     db.refresh(new_story)
+    dependency_graph.commit_story(
+        db, new_story.id, upstream, new_story.story_points)
+    if duplicates.DUPLICATE_CHECK != "off":
+        duplicates.get_index(db).set_story(
+            new_story.id, new_story.title, new_story.description, new_story.project_id)
+    related.update_story(new_story)
 
     # Convert to StoryResponse schema to ensure proper camelCase serialization
     story_response = schemas.StoryResponse.from_orm(new_story)
-    return {"message": "Story added successfully", "story": story_response}
+    tasks.after_story_change(
+        change_id, "created", story_response.model_dump(mode="json", by_alias=True))
+    response = {"message": "Story added successfully", "story": story_response}
+    if duplicates.DUPLICATE_CHECK != "off":
+        response["duplicates"] = similar
+    return response
 
 
 @app.put("/stories/{story_id}")
@@ -670,10 +863,12 @@ def update_story(story_id: int, request: schemas.StoryCreate, current_user: mode
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Story not found"
         )
+    projects.require_member(db, current_user, story.project_id)
 
     if not story.activity:
         story.activity = []
 
+    previous = {"status": story.status, "assignees": list(story.assignees or [])}
     old_status = story.status
     desired_status = request.status if request.status is not None else old_status
     canonical_old = ensure_valid_status_or_400(old_status)
@@ -733,6 +928,8 @@ def update_story(story_id: int, request: schemas.StoryCreate, current_user: mode
 
         story.activity.append(
             {"timestamp": timestamp, "user": username, "action": activity_entry})
+        analytics.record_transition(
+            db, story.id, story.status, request.status, username, project_id=story.project_id)
         story.status = request.status
 
     # Handle tags
@@ -854,11 +1051,21 @@ def update_story(story_id: int, request: schemas.StoryCreate, current_user: mode
             request, "tasks_identified", story.tasks_identified
         )
 
+    upstream = dependency_graph.stage_story(db, story)
+    story_users.stage_story(db, story)
+    change_id = outbox.record_change(db, story.id, "updated", username, project_id=story.project_id)
     db.commit()
     db.refresh(story)
+    dependency_graph.commit_story(db, story.id, upstream, story.story_points)
+    if duplicates.DUPLICATE_CHECK != "off":
+        duplicates.get_index(db).set_story(
+            story.id, story.title, story.description, story.project_id)
+    related.update_story(story)
 
     # Convert to StoryResponse schema to ensure proper camelCase serialization
     story_response = schemas.StoryResponse.from_orm(story)
+    tasks.after_story_change(
+        change_id, "updated", story_response.model_dump(mode="json", by_alias=True), previous)
     return {"message": "Story updated successfully", "story": story_response}
 
 
@@ -872,24 +1079,397 @@ def delete_story(story_id: int, current_user: models.User = Depends(get_current_
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Story not found"
         )
+    projects.require_member(db, current_user, story.project_id)
 
+    deleted = {"id": story.id, "status": story.status,
+               "assignees": list(story.assignees or []), "projectId": story.project_id}
+    dependency_graph.stage_delete(db, story_id)
+    story_users.stage_delete(db, story_id)
     db.delete(story)
+    change_id = outbox.record_change(
+        db, story_id, "deleted", current_user.username, project_id=deleted["projectId"])
     db.commit()
+    dependency_graph.commit_delete(db, story_id)
+    if duplicates.DUPLICATE_CHECK != "off":
+        duplicates.get_index(db).remove_story(story_id)
+    related.remove_story(story_id)
+    tasks.after_story_change(change_id, "deleted", deleted)
     return {"message": "Story deleted successfully", "id": story_id}
 
+
+@app.post("/stories/{story_id}/restore")
+def restore_story(story_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    archived = db.get(models.ArchivedStory, story_id)
+    if archived is not None:
+        projects.require_member(db, current_user, archived.project_id)
+    story, upstream, change_id = archive.restore_story(
+        db, story_id, current_user.username)
+    db.commit()
+    db.refresh(story)
+    graph = dependency_graph.get_index(db)
+    for sid, ups in upstream.items():
+        points = story.story_points if sid == story_id else graph.points.get(sid)
+        dependency_graph.commit_story(db, sid, ups, points)
+    if duplicates.DUPLICATE_CHECK != "off":
+        duplicates.get_index(db).set_story(
+            story.id, story.title, story.description, story.project_id)
+    related.update_story(story)
+
+    story_response = schemas.StoryResponse.from_orm(story)
+    tasks.after_story_change(
+        change_id, "restored", story_response.model_dump(mode="json", by_alias=True))
+    return {"message": "Story restored successfully", "story": story_response}
+
+
+@app.get("/stories/ranking")
+def get_story_ranking(
+    sort: str = "mvp",
+    weights: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Ranked story ids for a project's whole backlog under a prioritization model.
+    Pass `weights` to see how the order changes with adjusted weights.
+    """
+    sort_weights = ranking.parse_weights(sort, weights)
+    backlog = ranking.load_backlog(db, project_id)
+    order, scores = ranking.rank(sort, backlog, sort_weights)
+    if limit is not None:
+        order = order[:limit]
+    return serializers.json_response({
+        "sort": sort,
+        "weights": sort_weights,
+        "total": len(backlog),
+        "ids": backlog.ids[order].tolist(),
+        "scores": scores[order].round(6).tolist(),
+    })
+
+
+def require_story_access(story_id: int, user: models.User, db: Session):
+    """404 unless the story exists, 403 unless user belongs to its project."""
+    project_id = db.query(models.UserStory.project_id).filter(models.UserStory.id == story_id).scalar()
+    if project_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    projects.require_member(db, user, project_id)
+
+
+def dependency_index_or_404(story_id: int, db: Session):
+    graph = dependency_graph.get_index(db)
+    if story_id not in graph:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    return graph
+
+
+@app.get("/stories/{story_id}/upstream")
+def get_story_upstream(
+    story_id: int,
+    depth: Optional[int] = Query(default=None, ge=1),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stories this story depends on, directly (depth 1) and transitively."""
+    require_story_access(story_id, current_user, db)
+    graph = dependency_index_or_404(story_id, db)
+    return {"id": story_id, "upstream": [
+        {"id": node, "depth": level} for node, level in graph.traverse(story_id, "upstream", depth)
+    ]}
+
+
+@app.get("/stories/{story_id}/downstream")
+def get_story_downstream(
+    story_id: int,
+    depth: Optional[int] = Query(default=None, ge=1),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stories blocked by this story, directly (depth 1) and transitively."""
+    require_story_access(story_id, current_user, db)
+    graph = dependency_index_or_404(story_id, db)
+    return {"id": story_id, "downstream": [
+        {"id": node, "depth": level} for node, level in graph.traverse(story_id, "downstream", depth)
+    ]}
+
+
+@app.get("/stories/{story_id}/critical-path")
+def get_story_critical_path(
+    story_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Longest dependency chain (by story points) that has to finish before and including this story."""
+    require_story_access(story_id, current_user, db)
+    graph = dependency_index_or_404(story_id, db)
+    points, path = graph.critical_path(story_id)
+    return {"id": story_id, "storyPoints": points, "length": len(path), "path": path}
+
+
+@app.get("/stories/{story_id}/related")
+def get_related_stories(
+    story_id: int,
+    k: int = Query(default=10, ge=1, le=100),
+    estimated_only: bool = False,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Most similar stories by TF-IDF cosine similarity of their text."""
+    require_story_access(story_id, current_user, db)
+    index = related.get_index(db)
+    if story_id not in index:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    return {"id": story_id, "related": index.related(story_id, k, estimated_only)}
+
+
+@app.get("/dependencies/order")
+def get_dependency_order(
+    ids: Optional[str] = None,
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Dependencies-first order of the given stories (comma-separated `ids`)
+    and everything they depend on; without `ids`, of every story that has
+    dependencies or dependents. Only stories of the project are listed;
+    those on a cycle are listed in `cyclic`.
+    """
+    story_ids = None
+    if ids:
+        try:
+            story_ids = [int(part) for part in ids.split(",") if part.strip()]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids must be a comma-separated list of story ids"
+            )
+    order, cyclic = dependency_graph.get_index(db).topological_order(story_ids)
+    in_project = {
+        row[0] for row in
+        db.query(models.UserStory.id).filter(models.UserStory.project_id == project_id)
+    }
+    order = [story_id for story_id in order if story_id in in_project]
+    cyclic = [story_id for story_id in cyclic if story_id in in_project]
+    return {"order": order, "cyclic": cyclic}
+
+
+@app.get("/stories/duplicates")
+def get_duplicate_clusters(
+    threshold: float = Query(default=duplicates.DUPLICATE_THRESHOLD, gt=0, le=1),
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """Clusters of near-duplicate stories across a project's backlog."""
+    clusters = duplicates.get_index(db).clusters(threshold, project_id)
+    return {"threshold": threshold, "clusters": clusters}
+
+
+@app.get("/stories/changes")
+def get_story_changes(
+    since: Optional[int] = Query(default=None, ge=0),
+    limit: int = Query(default=500, ge=1, le=5000),
+    fields: Optional[str] = None,
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Delta sync: stories created, updated or deleted after cursor `since`.
+
+    Call without `since` to get the current cursor before loading GET /stories,
+    then poll with the returned cursor. `changed` holds the current rows of
+    stories that still exist, `deleted` the ids of those that do not. When
+    `hasMore` is true, call again immediately with the new cursor.
+    """
+    if since is None:
+        # Settled, like every cursor handed out: a lower id may still commit above max(id)
+        return {"cursor": outbox.settled_cursor(db), "changed": [], "deleted": [], "hasMore": False}
+
+    latest, cursor, has_more = outbox.changes_since(db, since, limit, project_id)
+
+    output_fields = serializers.parse_fields(fields)
+    columns = serializers.select_fields(output_fields, extra=("id", "project_id"))
+    rows = []
+    if latest:
+        rows = db.query(*serializers.story_columns(columns)).filter(
+            models.UserStory.id.in_(list(latest))
+        ).all()
+    id_idx = columns.index("id")
+    existing = {row[id_idx] for row in rows}
+    project_idx = columns.index("project_id")
+    rows = [row for row in rows if row[project_idx] == project_id]
+
+    return serializers.json_response({
+        "cursor": cursor,
+        "changed": [
+            serializers.story_row_to_dict(row, columns, output_fields)
+            for row in rows
+        ],
+        "deleted": sorted(story_id for story_id in latest if story_id not in existing),
+        "hasMore": has_more,
+    })
+
+
+@app.post("/stories/changes/compact")
+def compact_story_changes(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Drop outbox rows superseded by a newer change to the same story."""
+    if current_user.role_code != "product-manager":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Don't have permission to perform this action"
+        )
+    return {"removed": outbox.compact(db)}
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@app.get("/stories/stream")
+async def stream_story_events(
+    request: Request,
+    status: Optional[str] = None,
+    assignees: Optional[str] = None,
+    project_id: int = Depends(get_project_id),
+):
+    """
+    Server-Sent Events feed of story.created / story.updated / story.deleted
+    in a project. Optional comma-separated status and assignees filters; an
+    update is sent if the story matched before or after the change.
+    """
+    broker = events.get_broker()
+    subscription = broker.subscribe(parse_multi(status), parse_multi(assignees), project_id)
+
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.overflowed:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # The outbox cursor lets a reconnecting client resume with
+                # GET /stories/changes?since=<Last-Event-ID>
+                event_id = event.get("cursor", event["seq"])
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            if subscription.overflowed:
+                # Client fell too far behind; it should refetch GET /stories
+                yield "event: resync\ndata: {}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def websocket_project_id(token: str, project_id: Optional[int]) -> int:
+    """get_project_id for a WebSocket's token query parameter."""
+    db = SessionLocal()
+    try:
+        return get_project_id(project_id, get_current_user(token, db), db)
+    finally:
+        db.close()
+
+
+@app.websocket("/stories/ws")
+async def story_events_websocket(
+    websocket: WebSocket,
+    status: Optional[str] = None,
+    assignees: Optional[str] = None,
+    project_id: Optional[int] = Query(default=None, ge=1),
+    token: str = "",
+):
+    """
+    WebSocket variant of /stories/stream with the same filters and payloads.
+    Browsers cannot set headers on a WebSocket, so the bearer token comes as
+    the `token` query parameter.
+    """
+    try:
+        project_id = await run_in_threadpool(websocket_project_id, token, project_id)
+    except HTTPException:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    broker = events.get_broker()
+    subscription = broker.subscribe(parse_multi(status), parse_multi(assignees), project_id)
+    try:
+        while not subscription.overflowed:
+            try:
+                event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "ping"})
+                continue
+            await websocket.send_json(event)
+        await websocket.send_json({"type": "resync"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
+
+
 # Endpoint for filtering ideas
 
 
-@app.get("/filter", response_model=list[schemas.StoryResponse])
-def filter_stories(search: Optional[str] = None, db: Session = Depends(get_db)):
-    if not search:
-        return db.query(models.UserStory).all()
+def story_list(db: Session, filtered, columns, output_fields, include_archived: bool,
+               expand_users: bool = False) -> list:
+    """
+    Response dicts for the filtered(model) query over the hot stories table,
+    followed by the archive's (flagged "archived") when include_archived is
+    set, with creator and assignee users when expand_users is set.
+    """
+    models_to_read = [models.UserStory] + ([models.ArchivedStory] if include_archived else [])
+    stories, all_rows = [], []
+    for model in models_to_read:
+        query = filtered(model)
+        if expand_users:
+            query = story_users.with_creator(query, model)
+        rows = query.all()
+        for row in rows:
+            story = serializers.story_row_to_dict(row, columns, output_fields)
+            if include_archived:
+                story["archived"] = model is models.ArchivedStory
+            stories.append(story)
+        all_rows.extend(rows)
+    if expand_users:
+        story_users.add_users(db, stories, all_rows, len(columns))
+    return stories
 
-    if search.isdigit():
-        story_id = int(search)
-        return db.query(models.UserStory).filter(models.UserStory.id == story_id).all()
-    else:
-        return db.query(models.UserStory).filter(models.UserStory.title.icontains(search)).all()
+
+@app.get("/filter", response_model=list[schemas.StoryResponse])
+def filter_stories(search: Optional[str] = None, fields: Optional[str] = None, include_archived: bool = False, expand: Optional[str] = None, project_id: int = Depends(get_project_id), db: Session = Depends(get_db)):
+    expand_users = story_users.parse_expand(expand)
+    output_fields = serializers.parse_fields(fields)
+    columns = serializers.select_fields(output_fields)
+
+    def filtered(model):
+        query = db.query(*serializers.story_columns(columns, model)).filter(
+            model.project_id == project_id)
+        if search:
+            if search.isdigit():
+                story_id = int(search)
+                query = query.filter(model.id == story_id)
+            else:
+                query = query.filter(model.title.icontains(search))
+        return query
+
+    return serializers.json_response(
+        story_list(db, filtered, columns, output_fields, include_archived, expand_users))
 
 
 @app.get("/profile", response_model=schemas.UserResponse)
@@ -899,36 +1479,160 @@ def get_user_profile(current_user: models.User = Depends(get_current_user)):
 
 @app.get("/workspace", response_model=schemas.WorkspaceSummary)
 def get_workspace_data(
+        fields: Optional[str] = None,
+        expand: Optional[str] = None,
+        project_id: int = Depends(get_project_id),
         current_user: models.User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
     username = current_user.username
-
-    stories = db.query(models.UserStory).filter(
-        models.UserStory.assignees == username
-    ).all()
+    expand_users = story_users.parse_expand(expand)
+    output_fields = serializers.parse_fields(fields)
+    # status is always needed for the by_status summary
+    columns = serializers.select_fields(output_fields, extra=("status",))
+    status_idx = columns.index("status")
+
+    query = db.query(*serializers.story_columns(columns)).filter(
+        models.UserStory.project_id == project_id,
+        models.UserStory.id.in_(
+            db.query(models.StoryAssignee.story_id)
+            .filter(models.StoryAssignee.user_id == current_user.id)
+        )
+    )
+    if expand_users:
+        query = story_users.with_creator(query, models.UserStory)
+    rows = query.all()
 
     by_status = {}
-    for s in stories:
-        by_status[s.status] = by_status.get(s.status, 0) + 1
-    return schemas.WorkspaceSummary(
-        username=username,
-        total_stories=len(stories),
-        by_status=by_status,
-        stories=stories,
-    )
+    for row in rows:
+        by_status[row[status_idx]] = by_status.get(row[status_idx], 0) + 1
+    stories = [
+        serializers.story_row_to_dict(row, columns, output_fields)
+        for row in rows
+    ]
+    if expand_users:
+        story_users.add_users(db, stories, rows, len(columns))
+    return serializers.json_response({
+        "username": username,
+        "totalStories": len(rows),
+        "byStatus": by_status,
+        "stories": stories,
+    })
 
 
 @app.get("/backlog", response_model=list[schemas.StoryResponse])
 def get_backlog_stories(
-        current_user: models.User = Depends(get_current_user),
+        fields: Optional[str] = None,
+        include_archived: bool = False,
+        expand: Optional[str] = None,
+        project_id: int = Depends(get_project_id),
         db: Session = Depends(get_db)
 ):
-    stories = db.query(models.UserStory).filter(
-        models.UserStory.status == "Backlog"
-    ).all()
+    expand_users = story_users.parse_expand(expand)
+    output_fields = serializers.parse_fields(fields)
+    columns = serializers.select_fields(output_fields)
+
+    def filtered(model):
+        return db.query(*serializers.story_columns(columns, model)).filter(
+            model.project_id == project_id,
+            model.status == "Backlog"
+        )
 
-    for s in stories:
-        if isinstance(s.tags, str):
-            s.tags = [tag.strip() for tag in s.tags.split(",") if tag.strip()]
-    return stories
+    return serializers.json_response(
+        story_list(db, filtered, columns, output_fields, include_archived, expand_users))
+
+
+@app.get("/analytics/flow")
+def get_flow_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    period: str = Query(default="week", pattern="^(day|week|month)$"),
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Time spent in each status, cycle time (start to done), lead time
+    (creation to done), throughput and aging WIP, computed from the status
+    transition history. start_date/end_date limit which completions count
+    towards cycle time, lead time and throughput.
+    """
+    start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end = datetime.combine(end_date, datetime.max.time()) if end_date else None
+    return analytics.flow_metrics(db, project_id, start=start, end=end, period=period)
+
+
+@app.get("/analytics/cfd")
+def get_cumulative_flow(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Cumulative flow diagram: a project's stories per status at the end of
+    each day, read from the daily rollup. Defaults to the last 30 days.
+    """
+    end = end_date or date.today()
+    start = start_date or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if (end - start).days > 366 * 5:
+        raise HTTPException(status_code=400, detail="Date range is limited to five years")
+    return rollup.cumulative_flow(db, project_id, start, end, VALID_STATUSES)
+
+
+@app.post("/planning/sprint")
+def plan_sprint(
+    request: schemas.SprintPlanRequest,
+    project_id: int = Depends(get_project_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Suggest the Ready To Commit stories that maximize business value within
+    the sprint capacity. Must stories are always included, and a story is
+    only suggested together with the stories it depends on.
+    """
+    statuses = dict(
+        db.query(models.UserStory.id, models.UserStory.status)
+        .filter(models.UserStory.project_id == project_id)
+        .all()
+    )
+
+    query = db.query(
+        models.UserStory.id,
+        models.UserStory.title,
+        models.UserStory.story_points,
+        models.UserStory.bv,
+        models.UserStory.moscow_priority,
+        models.UserStory.sprint_capacity,
+    ).filter(
+        models.UserStory.project_id == project_id,
+        models.UserStory.status == planning.CANDIDATE_STATUS,
+    )
+    if request.story_ids:
+        query = query.filter(models.UserStory.id.in_(request.story_ids))
+    rows = query.all()
+
+    capacity = request.capacity
+    if capacity is None:
+        capacities = Counter(row.sprint_capacity for row in rows if row.sprint_capacity)
+        if not capacities:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No capacity given and no candidate story has a sprint capacity"
+            )
+        capacity = capacities.most_common(1)[0][0]
+
+    graph = dependency_graph.get_index(db)
+    candidates = [
+        planning.Candidate(
+            row.id, row.title, row.story_points, row.bv, row.moscow_priority,
+            graph.upstream_of(row.id),
+        )
+        for row in rows
+    ]
+    done_ids = {story_id for story_id, s in statuses.items() if s in planning.DONE_STATUSES}
+    try:
+        return planning.plan(candidates, capacity, done_ids=done_ids, existing_ids=statuses.keys())
+    except planning.PlanningError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
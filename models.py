@@ -1,7 +1,21 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Date, func, Boolean, JSON, ForeignKey, Index
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import validates
 from database import Base
 
 
+def search_key(value):
+    """The one normalization of user search keys, for stored keys and queries alike."""
+    return value.lower() if value else None
+
+
+def search_key_type(length: int):
+    # Binary collation on MySQL: the default utf8mb4_0900_ai_ci ignores case
+    # and accents and orders differently from the code-point ranges
+    # user_search builds, so those ranges would miss matching rows
+    return String(length).with_variant(mysql.VARCHAR(length, collation="utf8mb4_bin"), "mysql")
+
+
 class Role(Base):
     __tablename__ = "roles"
     
@@ -9,9 +23,25 @@ class Role(Base):
     name = Column(String(250), nullable=False)
 
 
-class UserStory(Base):
-    __tablename__ = "stories"
+class Project(Base):
+    """A team's workspace; every story belongs to exactly one."""
+    __tablename__ = "projects"
+
     id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(250), nullable=False, unique=True)
+    created_by = Column(String(250), nullable=True)
+    created_on = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ProjectMember(Base):
+    __tablename__ = "project_members"
+
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class StoryFields:
+    """Columns shared by stories and stories_archive."""
     title = Column(String(250), nullable=False)
     description = Column(Text, nullable=False)
     assignees = Column(JSON, nullable=True, default=[])  # Changed to JSON array for multiple assignees
@@ -22,6 +52,8 @@ class UserStory(Base):
     moscow_priority = Column(String(50), nullable=True)
     activity = Column(JSON, nullable=True, default=[])
     created_by = Column(String(250), nullable=True)
+    # lower(created_by), kept in sync on write so creator filters can use an index
+    created_by_key = Column(String(250), nullable=True)
     created_on = Column(DateTime(timezone=True), server_default=func.now())
     bv = Column(Integer, nullable=True) 
     refinement_session_scheduled = Column(Boolean,nullable=True,)
@@ -36,6 +68,45 @@ class UserStory(Base):
     team_commits = Column(Boolean, nullable=True)
     tasks_identified = Column(Boolean, nullable=True)
 
+    @validates("created_by")
+    def _sync_created_by_key(self, key, value):
+        self.created_by_key = value.lower() if value else None
+        return value
+
+
+class UserStory(StoryFields, Base):
+    __tablename__ = "stories"
+    # Story queries are project-scoped, so secondary indexes lead with project_id
+    __table_args__ = (
+        Index("ix_stories_project_id_status_created_on", "project_id", "status", "created_on"),
+        Index("ix_stories_project_id_created_by_key_created_on", "project_id", "created_by_key", "created_on"),
+        Index("ix_stories_project_id_created_on", "project_id", "created_on"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, server_default="1")
+    created_by_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+
+
+class ArchivedStory(StoryFields, Base):
+    """A story moved out of the hot stories table by the retention policy (archive.py)."""
+    __tablename__ = "stories_archive"
+    __table_args__ = (
+        Index("ix_stories_archive_project_id_archived_on", "project_id", "archived_on"),
+        Index("ix_stories_archive_project_id_status_created_on", "project_id", "status", "created_on"),
+        Index("ix_stories_archive_project_id_created_by_key_created_on",
+              "project_id", "created_by_key", "created_on"),
+    )
+
+    # Keeps the story's original id so it can be restored under it
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    project_id = Column(Integer, nullable=False, server_default="1")
+    created_by_id = Column(Integer, nullable=True)
+    archived_on = Column(DateTime(timezone=True), nullable=False)
+    archived_reason = Column(String(50), nullable=True)
+    # Stories whose dependency edges pointed at this one, re-linked on restore
+    dependents = Column(JSON, nullable=True)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -47,4 +118,78 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     is_active = Column(Boolean, nullable=False, server_default="1")
     role_code = Column(String(100), ForeignKey("roles.code"), nullable=True)
-    created_on = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_on = Column(DateTime(timezone=True), server_default=func.now())
+    # Lowercased copies for case-insensitive prefix search (GET /users?q=)
+    username_key = Column(search_key_type(250), nullable=True, index=True)
+    first_name_key = Column(search_key_type(250), nullable=True, index=True)
+    last_name_key = Column(search_key_type(250), nullable=True, index=True)
+    email_key = Column(search_key_type(255), nullable=True, index=True)
+
+    @validates("username", "first_name", "last_name", "email")
+    def _sync_search_key(self, key, value):
+        setattr(self, f"{key}_key", search_key(value))
+        return value
+
+
+class StoryChange(Base):
+    """Outbox row written in the same transaction as every story mutation."""
+    __tablename__ = "story_changes"
+
+    # Monotonic cursor for GET /stories/changes
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    story_id = Column(Integer, nullable=False, index=True)
+    operation = Column(String(20), nullable=False)  # created / updated / deleted / archived / restored
+    changed_by = Column(String(250), nullable=True)
+    changed_on = Column(DateTime(timezone=True), server_default=func.now())
+    # Project of the story, so deletions can be filtered after the row is gone
+    project_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_story_changes_project_id_id", "project_id", "id"),
+    )
+
+
+class StatusTransition(Base):
+    """One row per status movement of a story, including its creation."""
+    __tablename__ = "story_status_transitions"
+    __table_args__ = (
+        Index("ix_story_status_transitions_story_id_changed_on", "story_id", "changed_on"),
+        Index("ix_story_status_transitions_project_id_changed_on", "project_id", "changed_on"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    story_id = Column(Integer, nullable=False)
+    from_status = Column(String(250), nullable=True)  # None for the creation event
+    to_status = Column(String(250), nullable=False)
+    changed_by = Column(String(250), nullable=True)
+    changed_on = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Project of the story, so a project's history is read without joining stories
+    project_id = Column(Integer, nullable=True)
+
+
+class StoryAssignee(Base):
+    """A user assigned to a story, resolved from the story's assignees list."""
+    __tablename__ = "story_assignees"
+
+    # No foreign key to stories: rows stay with a story while it is archived
+    story_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class StoryDependency(Base):
+    """Edge: story_id depends on depends_on_id (parsed from the dependency lists)."""
+    __tablename__ = "story_dependencies"
+
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True)
+    depends_on_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class DailyStatusRollup(Base):
+    """Stories entering and leaving each status per day; summed, they give the CFD."""
+    __tablename__ = "daily_status_rollup"
+
+    project_id = Column(Integer, primary_key=True, server_default="1")
+    day = Column(Date, primary_key=True)
+    status = Column(String(250), primary_key=True)
+    entered = Column(Integer, nullable=False, default=0)
+    exited = Column(Integer, nullable=False, default=0)
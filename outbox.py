@@ -0,0 +1,172 @@
+"""
+Transactional outbox for story mutations and the delta-sync reader behind
+GET /stories/changes.
+
+record_change() adds a story_changes row to the caller's session, so it is
+committed (or rolled back) together with the story write itself. The row id
+is the sync cursor.
+
+ChangeFollower uses the same cursor to keep per-process caches (dependency
+graph, duplicate and related-story indexes) in step with writes committed by
+other workers.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+# Auto-increment ids are assigned at insert, not at commit, so a slow
+# transaction can commit a lower id after a higher one became visible.
+# Readers only see rows older than this window so cursors never skip one.
+CHANGE_SETTLE_SECONDS = float(os.getenv("CHANGE_SETTLE_SECONDS", "1"))
+COMPACTION_BATCH_SIZE = 1000
+# How often a per-process cache checks for other workers' writes, and how many
+# changes it replays before giving up and reloading from scratch
+CACHE_SYNC_SECONDS = float(os.getenv("CACHE_SYNC_SECONDS", "1"))
+CACHE_SYNC_MAX_CHANGES = 5000
+REFRESH_BATCH_SIZE = 500
+
+
+def record_change(db: Session, story_id: int, operation: str, changed_by: str = None, *, project_id: int) -> int:
+    """
+    Add an outbox row to db and return its id (the change cursor). The row is
+    flushed, not committed; the caller's commit makes it durable.
+    """
+    change = models.StoryChange(
+        story_id=story_id,
+        operation=operation,
+        changed_by=changed_by,
+        project_id=project_id,
+        # Set by the app (not the DB clock) so changes_since compares like with like
+        changed_on=datetime.now(),
+    )
+    db.add(change)
+    db.flush()
+    return change.id
+
+
+def current_cursor(db: Session) -> int:
+    return db.query(func.max(models.StoryChange.id)).scalar() or 0
+
+
+def settled_cursor(db: Session) -> int:
+    """Newest cursor that changes_since() would hand out right now."""
+    settled = datetime.now() - timedelta(seconds=CHANGE_SETTLE_SECONDS)
+    row = (
+        db.query(models.StoryChange.id)
+        .filter(models.StoryChange.changed_on <= settled)
+        .order_by(models.StoryChange.id.desc())
+        .first()
+    )
+    return row[0] if row else 0
+
+
+def changes_since(db: Session, since: int, limit: int, project_id: int = None):
+    """
+    Outbox rows after `since` (of one project, or all), collapsed to the
+    latest operation per story. Returns (latest_by_story, next_cursor, has_more).
+    """
+    settled = datetime.now() - timedelta(seconds=CHANGE_SETTLE_SECONDS)
+    query = (
+        db.query(models.StoryChange.id, models.StoryChange.story_id, models.StoryChange.operation)
+        .filter(models.StoryChange.id > since)
+        .filter(models.StoryChange.changed_on <= settled)
+    )
+    if project_id is not None:
+        query = query.filter(models.StoryChange.project_id == project_id)
+    rows = query.order_by(models.StoryChange.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for change_id, story_id, operation in rows:
+        latest[story_id] = operation
+    next_cursor = rows[-1][0] if rows else since
+    return latest, next_cursor, has_more
+
+
+def compact(db: Session, batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+    """
+    Delete outbox rows superseded by a newer row for the same story.
+
+    Any cursor stays valid: every story changed after it still has its newest
+    row, so the table shrinks to one row per story ever touched. Walks the
+    table in id ranges of batch_size rows, each checked against the story_id
+    index and deleted in its own transaction, so the cost stays linear in the
+    table size. Returns the number of rows removed.
+    """
+    newer = aliased(models.StoryChange)
+    low, removed = 0, 0
+    while True:
+        chunk = (
+            db.query(models.StoryChange.id)
+            .filter(models.StoryChange.id > low)
+            .order_by(models.StoryChange.id)
+            .limit(batch_size)
+            .subquery()
+        )
+        high = db.query(func.max(chunk.c.id)).scalar()
+        if high is None:
+            break
+        ids = [
+            row[0] for row in
+            db.query(models.StoryChange.id)
+            .filter(models.StoryChange.id > low, models.StoryChange.id <= high)
+            .filter(
+                db.query(newer.id)
+                .filter(newer.story_id == models.StoryChange.story_id, newer.id > models.StoryChange.id)
+                .exists()
+            )
+        ]
+        if ids:
+            db.query(models.StoryChange).filter(
+                models.StoryChange.id.in_(ids)
+            ).delete(synchronize_session=False)
+        db.commit()
+        removed += len(ids)
+        low = high
+    return removed
+
+
+class ChangeFollower:
+    """
+    Outbox position of a per-process cache. Create it with
+    ChangeFollower(settled_cursor(db)) before the cache reads its rows, so
+    nothing committed during the load is missed; replaying a change the
+    cache already has is harmless.
+    """
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def sync(self, db: Session, apply) -> bool:
+        """
+        Call apply(db, {story_id: operation}) with the stories changed since
+        the last sync, at most every CACHE_SYNC_SECONDS. Returns False when
+        more than CACHE_SYNC_MAX_CHANGES are waiting and the cache should be
+        reloaded instead.
+        """
+        now = time.monotonic()
+        if now - self.checked_at < CACHE_SYNC_SECONDS:
+            return True
+        # Another thread is already catching up
+        if not self._lock.acquire(blocking=False):
+            return True
+        try:
+            latest, cursor, has_more = changes_since(db, self.cursor, CACHE_SYNC_MAX_CHANGES)
+            if has_more:
+                return False
+            if latest:
+                apply(db, latest)
+            self.cursor = cursor
+            self.checked_at = now
+            return True
+        finally:
+            self._lock.release()
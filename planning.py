@@ -0,0 +1,265 @@
+"""
+Sprint planning: pick the Ready To Commit stories that maximize total
+business value within a story-point capacity.
+
+Constraints:
+    Must      every "Must" candidate (with its prerequisites) is always planned
+    depends   a story is only planned together with the candidates it depends
+              on (edges from dependency_graph); dependencies on stories that
+              are already Sprint Ready are satisfied, dependencies on
+              anything else block the story
+
+Candidates are grouped into dependency components. Each component offers a
+few closed choices (sets that include every prerequisite of their members),
+which turns the problem into a multiple-choice knapsack solved exactly with
+a NumPy DP over capacity. When the DP table would be too large, or a
+component has too many closed choices, a greedy value-density heuristic is
+used instead.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+DONE_STATUSES = {"Sprint Ready"}
+CANDIDATE_STATUS = "Ready To Commit"
+
+# DP table cells (groups x capacity) above which the greedy fallback is used
+EXACT_DP_MAX_CELLS = 5_000_000
+MAX_CHOICES_PER_GROUP = 256
+
+Candidate = namedtuple("Candidate", "id title story_points bv moscow_priority depends_on")
+
+
+class PlanningError(ValueError):
+    pass
+
+
+def _closures(candidates: dict) -> dict:
+    """Each candidate plus every candidate it transitively depends on."""
+    closures = {}
+    for story_id in candidates:
+        seen = {story_id}
+        stack = [story_id]
+        while stack:
+            for dep in candidates[stack.pop()].depends_on:
+                if dep in candidates and dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        closures[story_id] = frozenset(seen)
+    return closures
+
+
+def _components(candidates: dict) -> list:
+    """Weakly connected components of the dependency graph among candidates."""
+    parent = {story_id: story_id for story_id in candidates}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for story_id, candidate in candidates.items():
+        for dep in candidate.depends_on:
+            if dep in candidates:
+                parent[find(story_id)] = find(dep)
+
+    groups = {}
+    for story_id in candidates:
+        groups.setdefault(find(story_id), []).append(story_id)
+    return list(groups.values())
+
+
+def _closed_choices(members, closures, forced):
+    """
+    Every union of member closures that contains `forced`, or None when there
+    are more than MAX_CHOICES_PER_GROUP of them.
+    """
+    base = frozenset().union(*(closures[m] for m in members if m in forced))
+    choices = {base}
+    for member in members:
+        extended = {choice | closures[member] for choice in choices}
+        choices |= extended
+        if len(choices) > MAX_CHOICES_PER_GROUP:
+            return None
+    return list(choices)
+
+
+def _solve_dp(groups, capacity):
+    """
+    Multiple-choice knapsack: exactly one choice per group (possibly the
+    empty/forced base), maximizing value. Returns the chosen sets or None
+    when nothing fits.
+    """
+    neg = -np.inf
+    best = np.full(capacity + 1, neg)
+    best[0] = 0.0
+    picks = np.zeros((len(groups), capacity + 1), dtype=np.int16)
+
+    for g, choices in enumerate(groups):
+        new = np.full(capacity + 1, neg)
+        for c, (weight, value, _) in enumerate(choices):
+            if weight > capacity:
+                continue
+            shifted = np.full(capacity + 1, neg)
+            shifted[weight:] = best[:capacity + 1 - weight] + value
+            better = shifted > new
+            new[better] = shifted[better]
+            picks[g, better] = c
+        best = new
+
+    if not np.isfinite(best).any():
+        return None
+    # Highest value, then fewest points
+    top = best.max()
+    used = int(np.flatnonzero(best == top)[0])
+
+    chosen = []
+    for g in range(len(groups) - 1, -1, -1):
+        weight, _, members = groups[g][picks[g, used]]
+        chosen.append(members)
+        used -= weight
+    return chosen
+
+
+def _solve_greedy(candidates, closures, forced, capacity):
+    """Forced closures first, then dependency bundles by business value per point."""
+    selected = set().union(*(closures[s] for s in forced)) if forced else set()
+    used = sum(candidates[s].story_points for s in selected)
+    if used > capacity:
+        return None
+
+    # Rank each story by the value density of the bundle it brings along
+    ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+    bv = np.array([sum(candidates[d].bv or 0 for d in closures[s]) for s in ids.tolist()], dtype=np.float64)
+    points = np.array([sum(candidates[d].story_points for d in closures[s]) for s in ids.tolist()],
+                      dtype=np.float64)
+    density = np.divide(bv, points, out=np.full(len(ids), np.inf), where=points > 0)
+    for story_id in ids[np.argsort(-density, kind="stable")].tolist():
+        if story_id in selected:
+            continue
+        bundle = closures[story_id] - selected
+        weight = sum(candidates[s].story_points for s in bundle)
+        if used + weight <= capacity:
+            selected |= bundle
+            used += weight
+    return [selected]
+
+
+def plan(candidates: list, capacity: int, done_ids=frozenset(), existing_ids=None) -> dict:
+    """
+    Choose candidates for a sprint of `capacity` points.
+
+    candidates    Candidate tuples (status Ready To Commit)
+    done_ids      ids whose dependencies count as satisfied (Sprint Ready)
+    existing_ids  every story id that exists; dependencies on unknown ids are
+                  ignored. None treats every reference as existing.
+    Raises PlanningError when the Must stories alone do not fit.
+    """
+    blocked = {}
+    by_id = {}
+    for candidate in candidates:
+        if candidate.story_points is None:
+            blocked[candidate.id] = "not estimated"
+            continue
+        by_id[candidate.id] = candidate
+
+    # A story depending on something that is neither done nor plannable is blocked,
+    # and so is everything depending on it
+    changed = True
+    while changed:
+        changed = False
+        for story_id, candidate in list(by_id.items()):
+            for dep in candidate.depends_on:
+                if dep == story_id or dep in done_ids or dep in by_id:
+                    continue
+                if existing_ids is not None and dep not in existing_ids:
+                    continue
+                state = "blocked" if dep in blocked else "neither Sprint Ready nor a candidate"
+                blocked[story_id] = f"depends on #{dep}, which is {state}"
+                del by_id[story_id]
+                changed = True
+                break
+
+    forced = {s for s, c in by_id.items() if c.moscow_priority == "Must"}
+    blocked_musts = sorted(c.id for c in candidates if c.id in blocked and c.moscow_priority == "Must")
+
+    closures = _closures(by_id)
+    must_points = sum(by_id[s].story_points for s in set().union(*(closures[s] for s in forced))) if forced else 0
+    if must_points > capacity:
+        raise PlanningError(
+            f"Must stories and their dependencies need {must_points} points, "
+            f"more than the capacity of {capacity}"
+        )
+
+    groups = []
+    exact = True
+    for members in _components(by_id):
+        choices = _closed_choices(members, closures, forced)
+        if choices is None:
+            exact = False
+            break
+        groups.append([
+            (sum(by_id[s].story_points for s in choice), sum(by_id[s].bv or 0 for s in choice), choice)
+            for choice in choices
+        ])
+    # No plan can use more points than all candidates together, so the DP
+    # never needs more columns than that
+    dp_capacity = min(capacity, sum(c.story_points for c in by_id.values()))
+    if exact and max(len(groups), 1) * (dp_capacity + 1) > EXACT_DP_MAX_CELLS:
+        exact = False
+
+    if not groups:
+        chosen = []
+    elif exact:
+        chosen = _solve_dp(groups, dp_capacity)
+    else:
+        chosen = _solve_greedy(by_id, closures, forced, capacity)
+    selected_ids = set().union(*chosen) if chosen else set()
+
+    # Dependencies first, otherwise by business value per point
+    selected = sorted(
+        (by_id[s] for s in selected_ids),
+        key=lambda c: (-(c.bv or 0) / c.story_points if c.story_points else float("-inf"), c.id),
+    )
+    ordered, placed, visiting = [], set(), set()
+    for candidate in selected:
+        stack = [(candidate, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current.id in placed:
+                continue
+            if expanded:
+                placed.add(current.id)
+                ordered.append(current)
+                continue
+            if current.id in visiting:
+                # Dependency cycle: the members are planned together, in any order
+                continue
+            visiting.add(current.id)
+            stack.append((current, True))
+            for dep in sorted(current.depends_on, reverse=True):
+                if dep in selected_ids and dep not in placed and dep not in visiting:
+                    stack.append((by_id[dep], False))
+
+    return {
+        "capacity": capacity,
+        "algorithm": "dp" if exact else "greedy",
+        "totalPoints": sum(c.story_points for c in ordered),
+        "totalBusinessValue": sum(c.bv or 0 for c in ordered),
+        "selected": [
+            {
+                "id": c.id,
+                "title": c.title,
+                "storyPoints": c.story_points,
+                "bv": c.bv,
+                "moscowPriority": c.moscow_priority,
+                "dependsOn": sorted(d for d in c.depends_on if d in selected_ids),
+            }
+            for c in ordered
+        ],
+        "mustIncluded": sorted(forced),
+        "notSelected": sorted(set(by_id) - selected_ids),
+        "blocked": [{"id": s, "reason": blocked[s]} for s in sorted(blocked)],
+        "blockedMust": blocked_musts,
+    }
@@ -0,0 +1,170 @@
+"""
+Opt-in SQL query profiler.
+
+Hooks SQLAlchemy's before/after_cursor_execute and handle_error events to
+collect, per HTTP request, the number of statements issued, their durations
+and a normalized fingerprint of each statement. At the end of a request a
+one-line summary is logged, fingerprints seen N_PLUS_ONE_THRESHOLD or more
+times are flagged as a likely N+1 pattern, and any statement slower than
+SLOW_QUERY_MS is appended to the slow-query log.
+
+Enable with QUERY_PROFILER=1; nothing is registered otherwise.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+QUERY_PROFILER_LOG_LEVEL = os.getenv("QUERY_PROFILER_LOG_LEVEL", "INFO")
+
+logger = logging.getLogger("query_profiler")
+slow_logger = logging.getLogger("query_profiler.slow")
+
+_current_profile = contextvars.ContextVar("query_profile", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*[?%:\w()]+\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Reduce a SQL statement to its shape: literals become '?', IN lists
+    collapse to a single placeholder and whitespace is squashed.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def fingerprint(statement: str) -> str:
+    """Short stable id for a normalized statement."""
+    return hashlib.md5(normalize_statement(statement).encode("utf-8")).hexdigest()[:12]
+
+
+class RequestProfile:
+    """Queries collected while serving a single request."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.total_ms = 0.0
+        self.by_fingerprint = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "statement": ""})
+
+    def record(self, statement: str, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        entry = self.by_fingerprint[fingerprint(statement)]
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        if not entry["statement"]:
+            entry["statement"] = normalize_statement(statement)
+
+    def repeated(self):
+        """Fingerprints issued often enough to look like an N+1 pattern."""
+        return {
+            fp: entry for fp, entry in self.by_fingerprint.items()
+            if entry["count"] >= N_PLUS_ONE_THRESHOLD
+        }
+
+    def report(self):
+        logger.info(
+            "%s: %d queries in %.1f ms (%d distinct)",
+            self.route, self.count, self.total_ms, len(self.by_fingerprint),
+        )
+        for fp, entry in self.by_fingerprint.items():
+            logger.debug(
+                "  [%s] x%d %.1f ms  %s",
+                fp, entry["count"], entry["total_ms"], entry["statement"],
+            )
+        for fp, entry in self.repeated().items():
+            logger.warning(
+                "%s: possible N+1, statement [%s] ran %d times: %s",
+                self.route, fp, entry["count"], entry["statement"],
+            )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, which is discarded with it
+    # whether the statement succeeds or fails (internal statements have none)
+    if context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(statement, context)
+
+
+def _handle_error(exception_context):
+    # Failed statements (timeouts included) are timed too
+    context = exception_context.execution_context
+    if context is not None and exception_context.statement is not None:
+        _record(exception_context.statement, context, failed=True)
+
+
+def _record(statement, context, failed: bool = False):
+    started = getattr(context, "_query_start_time", None)
+    if started is None:
+        return
+    del context._query_start_time
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, duration_ms)
+
+    if duration_ms >= SLOW_QUERY_MS:
+        slow_logger.warning(
+            "%.1f ms [%s]%s %s",
+            duration_ms,
+            profile.route if profile is not None else "-",
+            " failed" if failed else "",
+            _WHITESPACE.sub(" ", statement).strip(),
+        )
+
+
+class QueryProfilerMiddleware:
+    """ASGI middleware that opens a RequestProfile around each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_profile.reset(token)
+            profile.report()
+
+
+def install(app, engine):
+    """Attach the cursor hooks to engine and the middleware to app."""
+    if not slow_logger.handlers:
+        handler = logging.FileHandler(SLOW_QUERY_LOG)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_logger.addHandler(handler)
+    if not logging.getLogger().handlers and not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(QUERY_PROFILER_LOG_LEVEL)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    app.add_middleware(QueryProfilerMiddleware)
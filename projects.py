@@ -0,0 +1,67 @@
+"""
+Project (workspace) scoping.
+
+Every story belongs to one project and story queries filter on project_id,
+which leads every secondary index on stories, so a team's queries only read
+its own partition of the table. Authenticated endpoints take an optional
+`project_id` and check membership; without it they use the caller's first
+project. Read endpoints and the live feeds go through the same check. The
+migration created the default project for all pre-existing stories and
+users, and new users join it on sign-up.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+import models
+
+DEFAULT_PROJECT_ID = 1
+
+
+def member_project_ids(db: Session, user: models.User) -> list:
+    return [
+        row[0] for row in
+        db.query(models.ProjectMember.project_id)
+        .filter(models.ProjectMember.user_id == user.id)
+        .order_by(models.ProjectMember.project_id)
+    ]
+
+
+def is_member(db: Session, user: models.User, project_id: int) -> bool:
+    return db.get(models.ProjectMember, (project_id, user.id)) is not None
+
+
+def require_member(db: Session, user: models.User, project_id: int):
+    """Raise 403 unless user belongs to the project."""
+    if not is_member(db, user, project_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not a member of project {project_id}"
+        )
+
+
+def resolve(db: Session, user: models.User, project_id: Optional[int] = None) -> int:
+    """The requested project if user is a member, else the user's first project."""
+    if project_id is not None:
+        require_member(db, user, project_id)
+        return project_id
+    project_ids = member_project_ids(db, user)
+    if not project_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a member of any project"
+        )
+    return project_ids[0]
+
+
+def add_member(db: Session, project_id: int, user_id: int):
+    """Add a membership (not committed); a no-op if it exists."""
+    if db.get(models.ProjectMember, (project_id, user_id)) is None:
+        db.add(models.ProjectMember(project_id=project_id, user_id=user_id))
+
+
+def join_default_project(db: Session, user: models.User):
+    """Make a newly registered user a member of the default project, if there is one."""
+    if db.get(models.Project, DEFAULT_PROJECT_ID) is not None:
+        add_member(db, DEFAULT_PROJECT_ID, user.id)
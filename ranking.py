@@ -0,0 +1,201 @@
+"""
+Vectorized backlog prioritization.
+
+Every model scores the whole backlog at once from NumPy arrays and returns
+an ordering computed with a stable np.lexsort, so equal stories keep their
+input order. Available models (`sort=` on GET /stories):
+
+    mvp              MoSCoW first, then business value / story points
+                     (the historical GET /stories order)
+    wsjf             Weighted Shortest Job First: cost of delay / job size,
+                     with cost of delay = business value + time criticality
+                     derived from the MoSCoW priority
+    weighted_moscow  one additive score: MoSCoW weight + business value /
+                     story points, so a high-value Should can outrank a
+                     low-value Must
+
+Weights can be overridden per request for what-if ranking
+(`weights=business_value:2,time_criticality:0.5`).
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+import models
+
+# Index into the MoSCoW arrays below; 0 is "no priority set"
+MOSCOW_CODES = {"Must": 4, "Should": 3, "Could": 2, "Won't": 1}
+
+DEFAULT_WEIGHTS = {
+    "mvp": {},
+    "wsjf": {
+        "business_value": 1.0,
+        "time_criticality": 1.0,
+        "must": 20.0,
+        "should": 13.0,
+        "could": 5.0,
+        "wont": 0.0,
+    },
+    "weighted_moscow": {
+        "must": 100.0,
+        "should": 10.0,
+        "could": 1.0,
+        "wont": 0.0,
+        "mvp": 1.0,
+    },
+}
+MODELS = tuple(DEFAULT_WEIGHTS)
+
+
+class Backlog:
+    """Column arrays for a set of stories, aligned by position."""
+
+    def __init__(self, ids, bv, story_points, moscow):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        # Missing business value / points are NaN so models can treat them explicitly
+        self.bv = np.asarray(bv, dtype=np.float64)
+        self.story_points = np.asarray(story_points, dtype=np.float64)
+        self.moscow = np.asarray(moscow, dtype=np.int8)
+
+    @classmethod
+    def from_rows(cls, rows, id_idx, bv_idx, points_idx, moscow_idx):
+        count = len(rows)
+        return cls(
+            np.fromiter((row[id_idx] for row in rows), dtype=np.int64, count=count),
+            np.fromiter((np.nan if row[bv_idx] is None else row[bv_idx] for row in rows),
+                        dtype=np.float64, count=count),
+            np.fromiter((np.nan if row[points_idx] is None else row[points_idx] for row in rows),
+                        dtype=np.float64, count=count),
+            np.fromiter((MOSCOW_CODES.get(row[moscow_idx], 0) for row in rows), dtype=np.int8, count=count),
+        )
+
+    def __len__(self):
+        return int(self.ids.size)
+
+
+def parse_weights(model: str, raw: Optional[str]) -> dict:
+    """
+    Merge a `weights=` query value (name:number, comma separated) over the
+    model's defaults. Raises HTTP 400 on unknown models, names or values.
+    """
+    if model not in DEFAULT_WEIGHTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown sort '{model}'. Allowed values: {', '.join(MODELS)}",
+        )
+    weights = dict(DEFAULT_WEIGHTS[model])
+    if not raw:
+        return weights
+    for part in raw.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition(":")
+        name = name.strip().lower().replace("'", "")
+        if name not in weights:
+            allowed = ", ".join(weights) or "none"
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown weight '{name}' for sort '{model}'. Allowed weights: {allowed}",
+            )
+        try:
+            weights[name] = float(value)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Weight '{name}' must be a number",
+            )
+        if not np.isfinite(weights[name]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Weight '{name}' must be a finite number",
+            )
+    return weights
+
+
+def mvp_scores(backlog: Backlog) -> np.ndarray:
+    """Business value / story points; 0 when either is missing or not positive."""
+    valid = (backlog.bv > 0) & (backlog.story_points > 0)
+    scores = np.zeros(len(backlog), dtype=np.float64)
+    np.divide(backlog.bv, backlog.story_points, out=scores, where=valid)
+    return scores
+
+
+def _moscow_weights(backlog: Backlog, weights: dict) -> np.ndarray:
+    table = np.array([0.0, weights["wont"], weights["could"], weights["should"], weights["must"]])
+    return table[backlog.moscow]
+
+
+def score(model: str, backlog: Backlog, weights: dict):
+    """
+    Returns (sort_keys, scores): sort_keys is a tuple of arrays from most to
+    least significant, all ranked descending.
+    """
+    if model == "mvp":
+        scores = mvp_scores(backlog)
+        return (backlog.moscow.astype(np.float64), scores), scores
+
+    if model == "wsjf":
+        business_value = np.nan_to_num(backlog.bv, nan=0.0)
+        cost_of_delay = (weights["business_value"] * business_value
+                         + weights["time_criticality"] * _moscow_weights(backlog, weights))
+        sized = backlog.story_points > 0
+        scores = np.zeros(len(backlog), dtype=np.float64)
+        np.divide(cost_of_delay, backlog.story_points, out=scores, where=sized)
+        # Unsized stories cannot be scheduled yet and sink below every sized one
+        return (sized.astype(np.float64), scores), scores
+
+    if model == "weighted_moscow":
+        scores = _moscow_weights(backlog, weights) + weights["mvp"] * mvp_scores(backlog)
+        return (scores,), scores
+
+    raise ValueError(f"Unknown ranking model '{model}'")
+
+
+def rank(model: str, backlog: Backlog, weights: dict = None):
+    """Positions of `backlog` in ranked order, and every story's score."""
+    if weights is None:
+        weights = DEFAULT_WEIGHTS[model]
+    keys, scores = score(model, backlog, weights)
+    if not len(backlog):
+        return np.empty(0, dtype=np.intp), scores
+    # np.lexsort sorts ascending by the last key first; negate for descending
+    order = np.lexsort(tuple(-key for key in reversed(keys)))
+    return order, scores
+
+
+# ---------------------------------------------------------------------------
+# Whole-backlog arrays, cached per process
+# ---------------------------------------------------------------------------
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_backlog(db: Session, project_id: int) -> Backlog:
+    """
+    Arrays for every story of a project, reloaded only when the story_changes
+    cursor has moved (every create, update and delete writes an outbox row).
+    """
+    import outbox
+
+    stories = db.query(models.UserStory.id).filter(models.UserStory.project_id == project_id)
+    cursor = (outbox.current_cursor(db), stories.count())
+    with _cache_lock:
+        cached = _cache.get(project_id)
+        if cached is not None and cached[0] == cursor:
+            return cached[1]
+
+    rows = db.query(
+        models.UserStory.id,
+        models.UserStory.bv,
+        models.UserStory.story_points,
+        models.UserStory.moscow_priority,
+    ).filter(models.UserStory.project_id == project_id).order_by(models.UserStory.id).all()
+    backlog = Backlog.from_rows(rows, 0, 1, 2, 3)
+
+    with _cache_lock:
+        _cache[project_id] = (cursor, backlog)
+    return backlog
@@ -0,0 +1,212 @@
+"""
+Token-bucket rate limiting.
+
+Every HTTP request takes one token from up to three buckets: its client IP
+(RATE_LIMIT_IP), its user when it carries a valid bearer token
+(RATE_LIMIT_USER), and, for routes listed in RATE_LIMIT_ROUTES, a per-route
+bucket of that user (or IP when anonymous). A request goes through only if
+every bucket has a token; otherwise it is answered 429 with Retry-After and
+no bucket is charged. Limits are written "<requests>/<seconds>": the bucket
+holds <requests> tokens and refills completely over <seconds>.
+
+The bucket store is chosen with RATE_LIMIT:
+    memory (default)  per-process buckets; each worker enforces the limits alone
+    redis             buckets in Redis on REDIS_URL, shared by every worker
+    off               no middleware is installed
+
+Client IPs come from the ASGI scope. entrypoint.sh and gunicorn.conf.py
+serve with forwarded headers from FORWARDED_ALLOW_IPS, so behind the proxy
+they are the real clients rather than the proxy's address.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import orjson
+from jose import JWTError, jwt
+
+import auth
+
+RATE_LIMIT = os.getenv("RATE_LIMIT", "memory")
+RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "1200/60")
+RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "600/60")
+# Expensive routes: full-table story reads and bcrypt-bound logins
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "GET /stories=120/60,POST /login=20/60")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = "ratelimit:"
+# Least recently used buckets beyond this are dropped (and start full again)
+MAX_MEMORY_BUCKETS = 100_000
+
+logger = logging.getLogger("ratelimit")
+
+
+class Limit:
+    def __init__(self, spec: str):
+        requests, seconds = spec.split("/")
+        self.capacity = float(requests)
+        self.rate = self.capacity / float(seconds)
+
+
+def parse_routes(spec: str, value=None) -> list:
+    """
+    [(method, path regex, rule, value)] from "GET /stories=120/60,...";
+    `value` converts the text after "=" (a Limit by default). Path segments
+    like {id} match any single segment.
+    """
+    value = value or Limit
+    routes = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        rule, setting = entry.rsplit("=", 1)
+        method, path = rule.split(None, 1)
+        pattern = re.compile("^" + re.sub(r"\\{[^/]+\\}", "[^/]+", re.escape(path)) + "$")
+        routes.append((method.upper(), pattern, rule, value(setting)))
+    return routes
+
+
+@lru_cache(maxsize=4096)
+def token_subject(token: str):
+    """The username a bearer token was issued to, or None if it does not verify."""
+    try:
+        return jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+class MemoryBuckets:
+    """Buckets of this process, as key -> (tokens, monotonic timestamp)."""
+
+    def __init__(self, max_buckets: int = MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, buckets: list) -> float:
+        """Charge one token from every (key, Limit); 0, or seconds until all have one."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, limit in buckets:
+                tokens, stamp = self._buckets.get(key, (limit.capacity, now))
+                levels.append(min(limit.capacity, tokens + (now - stamp) * limit.rate))
+            wait = max((1 - tokens) / limit.rate for tokens, (_, limit) in zip(levels, buckets))
+            charge = 1 if wait <= 0 else 0
+            for tokens, (key, _) in zip(levels, buckets):
+                self._buckets[key] = (tokens - charge, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return max(wait, 0.0)
+
+
+# Same all-or-nothing check as MemoryBuckets.take, atomic on the Redis server
+# clock. KEYS are the buckets, ARGV holds capacity, rate pairs.
+TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'stamp')
+    local tokens = tonumber(state[1]) or capacity
+    local stamp = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+    levels[i] = tokens
+    wait = math.max(wait, (1 - tokens) / rate)
+end
+local charge = 0
+if wait <= 0 then charge = 1 end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - charge), 'stamp', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by every worker; fails open when Redis is unavailable."""
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.Redis.from_url(url)
+        self._take = self._redis.register_script(TAKE_SCRIPT)
+
+    async def take(self, buckets: list) -> float:
+        args = []
+        for _, limit in buckets:
+            args += [limit.capacity, limit.rate]
+        try:
+            wait = await self._take(keys=[REDIS_PREFIX + key for key, _ in buckets], args=args)
+        except Exception:
+            logger.exception("Rate limit check failed; letting the request through")
+            return 0.0
+        return max(float(wait), 0.0)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 once a client's bucket is empty."""
+
+    def __init__(self, app, store, ip_limit: Limit, user_limit: Limit, routes: list):
+        self.app = app
+        self.store = store
+        self.ip_limit = ip_limit
+        self.user_limit = user_limit
+        self.routes = routes
+
+    def buckets(self, scope) -> list:
+        ip = (scope.get("client") or ("unknown",))[0]
+        user = None
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    user = token_subject(token)
+                break
+        client = f"user:{user}" if user else f"ip:{ip}"
+        buckets = [(f"ip:{ip}", self.ip_limit)]
+        if user:
+            buckets.append((client, self.user_limit))
+        for method, pattern, rule, limit in self.routes:
+            if scope["method"] == method and pattern.match(scope["path"]):
+                buckets.append((f"route:{rule}:{client}", limit))
+                break
+        return buckets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        wait = await self.store.take(self.buckets(scope))
+        if wait <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": orjson.dumps({"detail": "Too many requests"})})
+
+
+def install(app):
+    """Attach the rate limiter to app with the RATE_LIMIT store."""
+    store = RedisBuckets(REDIS_URL) if RATE_LIMIT == "redis" else MemoryBuckets()
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=store,
+        ip_limit=Limit(RATE_LIMIT_IP),
+        user_limit=Limit(RATE_LIMIT_USER),
+        routes=parse_routes(RATE_LIMIT_ROUTES),
+    )
@@ -0,0 +1,281 @@
+"""
+"Related stories" from TF-IDF vectors.
+
+Every story's title (counted twice), description and acceptance criteria are
+tokenized into sublinear term frequencies. Rows live in a scipy CSR matrix
+plus a small set of pending rows for stories written since the last
+compaction, so an update only touches its own row; idf weights and row norms
+are derived from document frequencies at query time. GET
+/stories/{id}/related scores the whole backlog with one sparse
+matrix-vector product and returns the top-k cosine matches from the
+story's own project.
+
+The index is per process, built on the first related-stories request and
+updated after every story write from then on; writes made by other workers
+are picked up from the story_changes outbox.
+"""
+import math
+import re
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+import outbox
+
+COMPACT_MIN_PENDING = 1000
+COMPACT_PENDING_RATIO = 0.1
+
+_TOKEN = re.compile(r"[a-z0-9]{2,}")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can do for from has have i in is it its me my "
+    "not of on or so that the their them there this to us was we when which who "
+    "will with want user should able".split()
+)
+
+
+def _texts(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [str(v) for v in value.values() if v]
+    if isinstance(value, list):
+        return [text for item in value for text in _texts(item)]
+    return [str(value)]
+
+
+def terms(title: str, description: str = None, acceptance_criteria=None) -> dict:
+    """term -> sublinear term frequency (1 + ln count)."""
+    text = " ".join([title or "", title or "", description or ""] + _texts(acceptance_criteria)).lower()
+    counts = {}
+    for token in _TOKEN.findall(text):
+        if token not in STOP_WORDS:
+            counts[token] = counts.get(token, 0) + 1
+    return {term: 1.0 + math.log(count) for term, count in counts.items()}
+
+
+def _rows(db: Session):
+    return db.query(
+        models.UserStory.id,
+        models.UserStory.title,
+        models.UserStory.description,
+        models.UserStory.acceptance_criteria,
+        models.UserStory.status,
+        models.UserStory.story_points,
+        models.UserStory.project_id,
+    )
+
+
+class RelatedIndex:
+    def __init__(self):
+        # scipy is only imported once an index is built, not at app startup
+        from scipy import sparse
+
+        self.vocabulary = {}
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.rows = {}        # story_id -> (columns, weights)
+        self.meta = {}        # story_id -> (title, status, story_points, project_id)
+        self.base = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self.base_squared = self.base
+        self.base_ids = np.empty(0, dtype=np.int64)
+        self.base_projects = np.empty(0, dtype=np.int64)
+        self.base_alive = np.empty(0, dtype=bool)
+        self.base_position = {}
+        self.pending = set()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, db: Session) -> "RelatedIndex":
+        index = cls()
+        index.follower = outbox.ChangeFollower(outbox.settled_cursor(db))
+        for row in _rows(db).yield_per(1000):
+            index._store(*row)
+        index._compact()
+        return index
+
+    def refresh(self, db: Session, changes: dict):
+        """Reload the given stories from the database."""
+        story_ids = sorted(changes)
+        for start in range(0, len(story_ids), outbox.REFRESH_BATCH_SIZE):
+            batch = story_ids[start:start + outbox.REFRESH_BATCH_SIZE]
+            rows = _rows(db).filter(models.UserStory.id.in_(batch)).all()
+            with self.lock:
+                for story_id in set(batch) - {row[0] for row in rows}:
+                    self._forget(story_id)
+                for row in rows:
+                    self.set_story(*row)
+
+    def __contains__(self, story_id):
+        return story_id in self.rows
+
+    def _column(self, term: str) -> int:
+        column = self.vocabulary.get(term)
+        if column is None:
+            column = self.vocabulary[term] = len(self.vocabulary)
+            if column >= self.df.size:
+                self.df = np.concatenate([self.df, np.zeros(self.df.size, dtype=np.int64)])
+        return column
+
+    def _store(self, story_id, title, description, criteria, status, points, project_id=None):
+        self._forget(story_id)
+        weights = terms(title, description, criteria)
+        columns = np.fromiter((self._column(t) for t in weights), dtype=np.int64, count=len(weights))
+        values = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+        order = np.argsort(columns)
+        self.rows[story_id] = (columns[order], values[order])
+        self.meta[story_id] = (title, status, points, project_id)
+        self.df[columns] += 1
+        self.pending.add(story_id)
+
+    def _forget(self, story_id):
+        previous = self.rows.pop(story_id, None)
+        self.meta.pop(story_id, None)
+        self.pending.discard(story_id)
+        if previous is not None:
+            self.df[previous[0]] -= 1
+        position = self.base_position.get(story_id)
+        if position is not None:
+            self.base_alive[position] = False
+
+    def _compact(self):
+        """Fold every row into a fresh CSR matrix."""
+        from scipy import sparse
+
+        ids = np.fromiter(self.rows, dtype=np.int64, count=len(self.rows))
+        columns = [self.rows[i][0] for i in ids.tolist()]
+        values = [self.rows[i][1] for i in ids.tolist()]
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([c.size for c in columns], out=indptr[1:])
+        self.base = sparse.csr_matrix(
+            (np.concatenate(values) if values else np.empty(0),
+             np.concatenate(columns) if columns else np.empty(0, dtype=np.int64),
+             indptr),
+            shape=(len(ids), len(self.vocabulary)),
+        )
+        self.base_squared = self.base.multiply(self.base).tocsr()
+        self.base_ids = ids
+        self.base_projects = self._projects_of(ids)
+        self.base_alive = np.ones(len(ids), dtype=bool)
+        self.base_position = {story_id: i for i, story_id in enumerate(ids.tolist())}
+        self.pending = set()
+
+    def _projects_of(self, ids: np.ndarray) -> np.ndarray:
+        return np.fromiter(
+            (self.meta[i][3] or 0 for i in ids.tolist()), dtype=np.int64, count=ids.size)
+
+    def set_story(self, story_id, title, description, criteria, status, points, project_id=None):
+        with self.lock:
+            self._store(story_id, title, description, criteria, status, points, project_id)
+            if len(self.pending) > max(COMPACT_MIN_PENDING, COMPACT_PENDING_RATIO * len(self.base_ids)):
+                self._compact()
+
+    def remove_story(self, story_id):
+        with self.lock:
+            self._forget(story_id)
+
+    def related(self, story_id: int, k: int = 10, estimated_only: bool = False) -> list:
+        """Top-k matches among the stories of the same project."""
+        from scipy import sparse
+
+        with self.lock:
+            if story_id not in self.rows:
+                return []
+            documents = len(self.rows)
+            vocabulary = len(self.vocabulary)
+            idf = np.log((1.0 + documents) / (1.0 + self.df[:vocabulary])) + 1.0
+
+            columns, values = self.rows[story_id]
+            query = np.zeros(vocabulary)
+            query[columns] = values * idf[columns]
+            query_norm = np.linalg.norm(query)
+            if query_norm == 0:
+                return []
+
+            # Stored rows are raw tf; apply idf on the fly: score = tf . (q * idf) / |tf * idf|
+            ids = [self.base_ids]
+            projects = [self.base_projects]
+            matrices = [(self.base, self.base_squared)]
+            alive = [self.base_alive]
+            if self.pending:
+                pending_ids = sorted(self.pending)
+                rows = [self.rows[i] for i in pending_ids]
+                indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+                np.cumsum([r[0].size for r in rows], out=indptr[1:])
+                matrix = sparse.csr_matrix(
+                    (np.concatenate([r[1] for r in rows]), np.concatenate([r[0] for r in rows]), indptr),
+                    shape=(len(rows), vocabulary),
+                )
+                matrices.append((matrix, matrix.multiply(matrix).tocsr()))
+                ids.append(np.array(pending_ids, dtype=np.int64))
+                projects.append(self._projects_of(ids[-1]))
+                alive.append(np.ones(len(rows), dtype=bool))
+
+            scores, all_ids, all_alive = [], np.concatenate(ids), np.concatenate(alive)
+            for matrix, squared in matrices:
+                width = matrix.shape[1]
+                weighted = query[:width] * idf[:width]
+                dots = matrix @ weighted
+                norms = np.sqrt(squared @ (idf[:width] ** 2))
+                scores.append(np.divide(dots, norms * query_norm, out=np.zeros_like(dots), where=norms > 0))
+            scores = np.concatenate(scores)
+
+            scores[~all_alive] = -1.0
+            scores[all_ids == story_id] = -1.0
+            scores[np.concatenate(projects) != (self.meta[story_id][3] or 0)] = -1.0
+            if estimated_only:
+                missing = np.fromiter(
+                    (self.meta.get(i, (None, None, None, None))[2] is None for i in all_ids.tolist()),
+                    dtype=bool, count=all_ids.size,
+                )
+                scores[missing] = -1.0
+
+            k = min(k, scores.size)
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            result = []
+            for position in top.tolist():
+                if scores[position] <= 0:
+                    break
+                related_id = int(all_ids[position])
+                title, status, points, _ = self.meta[related_id]
+                result.append({
+                    "id": related_id,
+                    "title": title,
+                    "status": status,
+                    "storyPoints": points,
+                    "similarity": round(float(scores[position]), 4),
+                })
+            return result
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> RelatedIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RelatedIndex.load(db)
+    if not _index.follower.sync(db, _index.refresh):
+        with _index_lock:
+            _index = RelatedIndex.load(db)
+    return _index
+
+
+def update_story(story: models.UserStory):
+    """Refresh a story's row if the index has been built in this process."""
+    if _index is not None:
+        _index.set_story(story.id, story.title, story.description,
+                         story.acceptance_criteria, story.status, story.story_points, story.project_id)
+
+
+def remove_story(story_id: int):
+    if _index is not None:
+        _index.remove_story(story_id)
@@ -0,0 +1,183 @@
+"""
+Daily cumulative-flow rollup.
+
+daily_status_rollup holds, per project, day and status, how many stories
+entered and left that status. The number of stories in a status at the end of day D is
+the sum of (entered - exited) over all days up to D, so a CFD for any range
+is read from this small table alone, never from stories.
+
+Rows are maintained two ways:
+    incrementally   record_transition()/record_exit() upsert today's row in
+                    a background task after the story write
+                    (tasks.count_status_change)
+    nightly         rebuild() recomputes whole days from
+                    story_status_transitions (plus deletions from the
+                    story_changes outbox); run it for all history with
+                    `python rollup.py --full`
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+import models
+import projects
+
+ROLLUP_REBUILD_DAYS = int(os.getenv("ROLLUP_REBUILD_DAYS", "7"))
+REBUILD_BATCH_SIZE = 5000
+
+rollup_table = models.DailyStatusRollup.__table__
+
+
+def _upsert(db: Session, project_id: int, day: date, status: str, entered: int, exited: int):
+    dialect = db.get_bind().dialect.name
+    values = {"project_id": project_id, "day": day, "status": status, "entered": entered, "exited": exited}
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        statement = insert(rollup_table).values(**values)
+        statement = statement.on_duplicate_key_update(
+            entered=rollup_table.c.entered + statement.inserted.entered,
+            exited=rollup_table.c.exited + statement.inserted.exited,
+        )
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        statement = insert(rollup_table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[rollup_table.c.project_id, rollup_table.c.day, rollup_table.c.status],
+            set_={
+                "entered": rollup_table.c.entered + statement.excluded.entered,
+                "exited": rollup_table.c.exited + statement.excluded.exited,
+            },
+        )
+    db.execute(statement)
+
+
+def record_transition(db: Session, project_id: int, from_status, to_status: str, when: datetime = None):
+    """Count a story moving from from_status (None on creation) to to_status."""
+    day = (when or datetime.now()).date()
+    if from_status:
+        _upsert(db, project_id, day, from_status, 0, 1)
+    _upsert(db, project_id, day, to_status, 1, 0)
+
+
+def record_exit(db: Session, project_id: int, status: str, when: datetime = None):
+    """Count a deleted story leaving its last status."""
+    _upsert(db, project_id, (when or datetime.now()).date(), status, 0, 1)
+
+
+def _day_counts(db: Session, start: date = None, end: date = None) -> Counter:
+    """(project_id, day, status, "entered"/"exited") -> count, recomputed from the transition log."""
+    counts = Counter()
+    last_status = {}
+    Transition = models.StatusTransition
+    query = (
+        db.query(Transition.story_id, Transition.project_id, Transition.from_status,
+                 Transition.to_status, Transition.changed_on)
+        .order_by(Transition.changed_on, Transition.id)
+    )
+    if end is not None:
+        query = query.filter(Transition.changed_on < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    for story_id, project_id, from_status, to_status, changed_on in query.yield_per(REBUILD_BATCH_SIZE):
+        last_status[story_id] = to_status
+        day = changed_on.date()
+        if start is not None and day < start:
+            continue
+        project_id = project_id or projects.DEFAULT_PROJECT_ID
+        if from_status:
+            counts[(project_id, day, from_status, "exited")] += 1
+        counts[(project_id, day, to_status, "entered")] += 1
+
+    deletions = db.query(
+        models.StoryChange.story_id, models.StoryChange.project_id, models.StoryChange.changed_on
+    ).filter(models.StoryChange.operation == "deleted")
+    for story_id, project_id, changed_on in deletions:
+        day = changed_on.date()
+        if story_id not in last_status or (start and day < start) or (end and day > end):
+            continue
+        counts[(project_id or projects.DEFAULT_PROJECT_ID, day, last_status[story_id], "exited")] += 1
+    return counts
+
+
+def rebuild(db: Session, start: date = None, end: date = None) -> int:
+    """
+    Recompute the rollup for days start..end (default: all history up to
+    yesterday, leaving today's live increments alone). Returns rows written.
+    """
+    end = end or date.today() - timedelta(days=1)
+    counts = _day_counts(db, start, end)
+
+    rows = {}
+    for (project_id, day, status, column), count in counts.items():
+        row = rows.setdefault((project_id, day, status), {
+            "project_id": project_id, "day": day, "status": status, "entered": 0, "exited": 0})
+        row[column] = count
+
+    delete = db.query(models.DailyStatusRollup).filter(models.DailyStatusRollup.day <= end)
+    if start is not None:
+        delete = delete.filter(models.DailyStatusRollup.day >= start)
+    delete.delete(synchronize_session=False)
+    if rows:
+        db.execute(rollup_table.insert(), list(rows.values()))
+    db.commit()
+    return len(rows)
+
+
+def cumulative_flow(db: Session, project_id: int, start: date, end: date, statuses=()) -> dict:
+    """
+    Stories of a project per status at the end of every day in start..end.
+    `statuses` fixes the series order; statuses not listed follow alphabetically.
+    """
+    Rollup = models.DailyStatusRollup
+    opening = Counter()
+    rows = db.query(Rollup.status, Rollup.entered, Rollup.exited).filter(
+        Rollup.project_id == project_id, Rollup.day < start)
+    for status, entered, exited in rows:
+        opening[status] += entered - exited
+
+    deltas = {}
+    rows = db.query(Rollup.day, Rollup.status, Rollup.entered, Rollup.exited).filter(
+        Rollup.project_id == project_id, Rollup.day >= start, Rollup.day <= end
+    )
+    for day, status, entered, exited in rows:
+        deltas.setdefault(day, Counter())[status] += entered - exited
+
+    seen = set(opening)
+    for day_deltas in deltas.values():
+        seen.update(day_deltas)
+    order = list(statuses) + sorted(seen - set(statuses))
+
+    days = []
+    series = {status: [] for status in order}
+    running = Counter(opening)
+    day = start
+    while day <= end:
+        running.update(deltas.get(day, {}))
+        days.append(day.isoformat())
+        for status in order:
+            series[status].append(running[status])
+        day += timedelta(days=1)
+    return {"dates": days, "series": series}
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily_status_rollup table")
+    parser.add_argument("--full", action="store_true", help="rebuild all history")
+    parser.add_argument("--days", type=int, default=ROLLUP_REBUILD_DAYS,
+                        help="days before today to rebuild (default: %(default)s)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        since = None if args.full else date.today() - timedelta(days=args.days)
+        print(f"Rebuilt {rebuild(session, start=since)} rollup rows")
+    finally:
+        session.close()
@@ -136,6 +136,8 @@ class StoryResponse(BaseModel):
     skills_available: Optional[bool] = None
     team_commits: Optional[bool] = None
     tasks_identified: Optional[bool] = None
+    project_id: Optional[int] = None
+    created_by_id: Optional[int] = None
 
     @field_validator("assignees", mode="before")
     @classmethod
@@ -235,6 +237,22 @@ class UpdateRoleRequest(BaseModel):
         ..., description="Role code to assign (product-manager, stakeholder, dev-team, scrum-master)")
 
 
+class SprintPlanRequest(BaseModel):
+    capacity: Optional[int] = Field(
+        default=None, ge=1, le=10_000,
+        description="Story points available; defaults to the candidates' most common sprint capacity",
+    )
+    story_ids: Optional[List[int]] = Field(
+        default=None,
+        description="Limit candidates to these Ready To Commit stories",
+    )
+
+    model_config = ConfigDict(
+        alias_generator=to_camel_case,
+        populate_by_name=True,
+    )
+
+
 class WorkspaceSummary(BaseModel):
     username: str
     total_stories: int
@@ -256,3 +274,29 @@ class RoleResponse(BaseModel):
         alias_generator=to_camel_case,
         populate_by_name=True,
     )
+
+
+class ProjectCreate(BaseModel):
+    name: str = Field(..., max_length=250, description="Unique project name")
+
+
+class ProjectResponse(BaseModel):
+    id: int
+    name: str
+    created_by: Optional[str] = None
+    created_on: Optional[datetime] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        alias_generator=to_camel_case,
+        populate_by_name=True,
+    )
+
+
+class ProjectMemberRequest(BaseModel):
+    user_id: int = Field(..., description="Id of the user to add")
+
+    model_config = ConfigDict(
+        alias_generator=to_camel_case,
+        populate_by_name=True,
+    )
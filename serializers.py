@@ -0,0 +1,132 @@
+"""
+Fast serialization path for story lists.
+
+Builds camelCase dicts straight from row tuples and encodes them with orjson,
+skipping the per-row ORM instantiation and StoryResponse validation that
+dominate CPU on large responses. The output matches what StoryResponse
+produces for the same row.
+
+List endpoints also accept a sparse fieldset (`fields=title,status,storyPoints`);
+only the requested columns are selected, so heavy JSON columns such as
+activity are neither fetched from the database nor serialized.
+"""
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+
+import models
+from helper import to_camel_case
+
+# Column order of every row tuple handled here (StoryResponse minus mvp_score)
+STORY_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "assignees",
+    "status",
+    "tags",
+    "acceptance_criteria",
+    "story_points",
+    "moscow_priority",
+    "activity",
+    "created_by",
+    "created_on",
+    "bv",
+    "refinement_session_scheduled",
+    "groomed",
+    "dependencies",
+    "session_documented",
+    "refinement_dependencies",
+    "team_approval",
+    "po_approval",
+    "sprint_capacity",
+    "skills_available",
+    "team_commits",
+    "tasks_identified",
+    "project_id",
+    "created_by_id",
+)
+STORY_COLUMNS = tuple(getattr(models.UserStory, name) for name in STORY_FIELDS)
+
+# Everything a StoryResponse carries; mvp_score is computed, not stored
+RESPONSE_FIELDS = STORY_FIELDS + ("mvp_score",)
+
+# camelCase keys are computed once instead of per row by the alias generator
+_CAMEL_KEYS = {name: to_camel_case(name) for name in RESPONSE_FIELDS}
+_SNAKE_KEYS = {camel: name for name, camel in _CAMEL_KEYS.items()}
+_LIST_FIELDS = {"assignees", "tags"}
+
+
+def split_list(value) -> list:
+    """Same normalization as StoryResponse.parse_assignees / parse_tags."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return []
+
+
+def parse_fields(raw: Optional[str]) -> Optional[tuple]:
+    """
+    Parse a `fields=` query value (camelCase or snake_case names, comma
+    separated) into response field names. Returns None when every field was
+    requested; id is always included. Raises HTTP 400 on unknown names.
+    """
+    if not raw:
+        return None
+    requested = {"id"}
+    for part in raw.split(","):
+        key = part.strip()
+        if not key:
+            continue
+        name = _SNAKE_KEYS.get(key, key)
+        if name not in RESPONSE_FIELDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown field '{key}'. Allowed values: {', '.join(_CAMEL_KEYS.values())}",
+            )
+        requested.add(name)
+    return tuple(name for name in RESPONSE_FIELDS if name in requested)
+
+
+def select_fields(fields: Optional[tuple], extra: tuple = ()) -> tuple:
+    """
+    Stored columns to fetch for a parsed fieldset, plus any `extra` columns the
+    endpoint needs for filtering, sorting or grouping.
+    """
+    wanted = set(fields or STORY_FIELDS) | set(extra)
+    return tuple(name for name in STORY_FIELDS if name in wanted)
+
+
+def story_columns(names: tuple, model=models.UserStory) -> tuple:
+    """Columns of `model` (stories or stories_archive) for the given field names."""
+    return tuple(getattr(model, name) for name in names)
+
+
+def story_row_to_dict(row, columns=STORY_FIELDS, fields=None, mvp_score=None) -> dict:
+    """
+    Turn a row tuple ordered like `columns` into a camelCase response dict
+    holding `fields` (all response fields when None).
+    """
+    values = dict(zip(columns, row))
+    values["mvp_score"] = mvp_score
+    data = {}
+    for name in fields or RESPONSE_FIELDS:
+        value = values[name]
+        if name in _LIST_FIELDS:
+            value = split_list(value)
+        data[_CAMEL_KEYS[name]] = value
+    return data
+
+
+def json_response(content, status_code: int = 200) -> Response:
+    """Encode content with orjson, bypassing FastAPI's response_model pass."""
+    return Response(
+        content=orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS),
+        status_code=status_code,
+        media_type="application/json",
+    )
@@ -0,0 +1,158 @@
+"""
+Container startup: wait for the database and bring the schema to head.
+
+    python startup.py
+
+1. wait    connect until the database answers (STARTUP_DB_WAIT_SECONDS)
+2. check   compare the stamped Alembic revision with the script heads; a
+           replica booting against an up-to-date schema stops here
+3. migrate take a migration lock so only one replica runs `alembic upgrade
+           head`, re-check under the lock (another replica may have just
+           finished), then upgrade
+
+The lock is GET_LOCK on MySQL and a session advisory lock on PostgreSQL;
+SQLite has a single writer and needs none. STARTUP_MIGRATIONS=off skips
+steps 2-3 (replicas that never migrate), =always upgrades without checking.
+Each phase's duration is logged.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from database import engine
+
+STARTUP_MIGRATIONS = os.getenv("STARTUP_MIGRATIONS", "auto")
+STARTUP_DB_WAIT_SECONDS = float(os.getenv("STARTUP_DB_WAIT_SECONDS", "180"))
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", "600"))
+MIGRATION_LOCK_NAME = "agile_tool_migrations"
+# pg_advisory_lock takes a bigint key rather than a name
+MIGRATION_LOCK_KEY = 7265616765
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+logger = logging.getLogger("startup")
+
+
+def _finish_phase(name: str, started: float, timings: dict):
+    timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("startup phase %s took %.1f ms", name, timings[name])
+
+
+@contextmanager
+def phase(name: str, timings: dict):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _finish_phase(name, started, timings)
+
+
+def wait_for_database(timeout: float = STARTUP_DB_WAIT_SECONDS):
+    """Retry a trivial query with backoff until it succeeds or timeout passes."""
+    deadline = time.monotonic() + timeout
+    delay = 0.2
+    while True:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return
+        except Exception as exc:
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(f"Database not reachable after {timeout:.0f}s: {exc}") from exc
+            logger.info("Waiting for the database (%s)", exc.__class__.__name__)
+            time.sleep(delay)
+            delay = min(delay * 2, 3)
+
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
+
+def current_heads(connection) -> set:
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def script_heads(config: Config) -> set:
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+@contextmanager
+def migration_lock(connection):
+    """Hold a database-wide lock for the duration of the block."""
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        acquired = connection.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT_SECONDS},
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError(f"Could not acquire the migration lock within {MIGRATION_LOCK_TIMEOUT_SECONDS}s")
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+    elif dialect == "postgresql":
+        connection.execute(text(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT_SECONDS}s'"))
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    else:
+        yield
+
+
+def migrate(mode: str = STARTUP_MIGRATIONS, timings: dict = None) -> bool:
+    """Upgrade the schema to head if needed. Returns whether an upgrade ran."""
+    timings = {} if timings is None else timings
+    if mode == "off":
+        return False
+    config = alembic_config()
+    with phase("check", timings):
+        heads = script_heads(config)
+        if mode != "always":
+            with engine.connect() as connection:
+                if current_heads(connection) == heads:
+                    logger.info("Schema already at head %s; skipping migrations", ", ".join(sorted(heads)))
+                    return False
+
+    # AUTOCOMMIT so the session-level lock is not tied to a transaction left open
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        waiting = time.perf_counter()
+        with migration_lock(lock_connection):
+            _finish_phase("lock", waiting, timings)
+            with phase("migrate", timings):
+                if mode != "always":
+                    with engine.connect() as connection:
+                        if current_heads(connection) == heads:
+                            logger.info("Another replica migrated the schema while we waited")
+                            return False
+                command.upgrade(config, "head")
+    return True
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+    # alembic.ini's logging config (applied by env.py) sets the root level to WARNING
+    logger.setLevel(logging.INFO)
+    timings = {}
+    started = time.perf_counter()
+    with phase("wait", timings):
+        wait_for_database()
+    migrate(timings=timings)
+    logger.info(
+        "startup finished in %.1f ms (%s)",
+        (time.perf_counter() - started) * 1000,
+        ", ".join(f"{name} {ms} ms" for name, ms in timings.items()),
+    )
+
+
+if __name__ == "__main__":
+    main()
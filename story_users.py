@@ -0,0 +1,110 @@
+"""
+Story creators and assignees as user references.
+
+Stories keep their username-based `created_by` and `assignees` fields for
+the API, and on every write the names are resolved to `created_by_id` and
+rows in story_assignees (foreign keys to users). With `expand=users` the
+list endpoints return each story's `createdByUser` (outer-joined in the
+story query itself) and `assigneeUsers` (one batched story_assignees/users
+query per response), so clients no longer download GET /users to render
+names.
+"""
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+import serializers
+
+# Fields of a user embedded in an expanded story
+USER_COLUMNS = (models.User.id, models.User.username, models.User.first_name, models.User.last_name)
+EXPAND_BATCH_SIZE = 1000
+
+
+def parse_expand(raw) -> bool:
+    """Whether `expand=` asks for users; raises HTTP 400 on anything else."""
+    if not raw:
+        return False
+    requested = {part.strip() for part in raw.split(",") if part.strip()}
+    unknown = requested - {"users"}
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown expand value '{sorted(unknown)[0]}'. Allowed values: users",
+        )
+    return "users" in requested
+
+
+def with_creator(query, model):
+    """Add the creator's USER_COLUMNS to a story query (after the story columns)."""
+    return query.add_columns(*USER_COLUMNS).outerjoin(
+        models.User, models.User.id == model.created_by_id)
+
+
+def _user_dict(user_id, username, first_name, last_name):
+    if user_id is None:
+        return None
+    return {"id": user_id, "username": username, "firstName": first_name, "lastName": last_name}
+
+
+def assignee_users(db: Session, story_ids: list) -> dict:
+    """story id -> [user dict] of its assignees."""
+    found = {}
+    for start in range(0, len(story_ids), EXPAND_BATCH_SIZE):
+        rows = (
+            db.query(models.StoryAssignee.story_id, *USER_COLUMNS)
+            .join(models.User, models.User.id == models.StoryAssignee.user_id)
+            .filter(models.StoryAssignee.story_id.in_(story_ids[start:start + EXPAND_BATCH_SIZE]))
+            .order_by(models.StoryAssignee.story_id, models.User.username)
+        )
+        for story_id, *user in rows:
+            found.setdefault(story_id, []).append(_user_dict(*user))
+    return found
+
+
+def add_users(db: Session, stories: list, rows: list, offset: int):
+    """
+    Set createdByUser and assigneeUsers on response dicts built from `rows`
+    of a with_creator() query whose story columns end at `offset`.
+    """
+    assignees = assignee_users(db, [story["id"] for story in stories])
+    for story, row in zip(stories, rows):
+        story["createdByUser"] = _user_dict(*row[offset:offset + len(USER_COLUMNS)])
+        story["assigneeUsers"] = assignees.get(story["id"], [])
+
+
+def stage_story(db: Session, story: models.UserStory):
+    """Resolve story's created_by and assignees to user ids and rewrite its story_assignees rows (not committed)."""
+    names = set(serializers.split_list(story.assignees))
+    if story.created_by:
+        names.add(story.created_by)
+    # Exact matches use the username index; case-insensitive fallback for the rest
+    ids = {}
+    if names:
+        for user_id, username in db.query(models.User.id, models.User.username).filter(
+                models.User.username.in_(names)):
+            ids[username.lower()] = user_id
+    missing = {name.lower() for name in names} - set(ids)
+    if missing:
+        for user_id, username in db.query(models.User.id, models.User.username).filter(
+                func.lower(models.User.username).in_(missing)):
+            ids[username.lower()] = user_id
+
+    if story.created_by and story.created_by_id is None:
+        story.created_by_id = ids.get(story.created_by.lower())
+
+    wanted = {ids[name.lower()] for name in serializers.split_list(story.assignees) if name.lower() in ids}
+    current = {
+        row[0] for row in
+        db.query(models.StoryAssignee.user_id).filter(models.StoryAssignee.story_id == story.id)
+    }
+    if wanted != current:
+        stage_delete(db, story.id)
+        for user_id in sorted(wanted):
+            db.add(models.StoryAssignee(story_id=story.id, user_id=user_id))
+
+
+def stage_delete(db: Session, story_id: int):
+    db.query(models.StoryAssignee).filter(
+        models.StoryAssignee.story_id == story_id
+    ).delete(synchronize_session=False)
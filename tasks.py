@@ -0,0 +1,510 @@
+"""
+Background task layer for post-commit work.
+
+Endpoints call enqueue() after their commit; the selected backend runs the
+task off the request path. After a story write that is webhook delivery and
+the daily rollup count (count_status_change); the transition row and the
+story's activity entries stay in the write's transaction, since they are
+part of what the response and the change feed return.
+
+    TASK_BACKEND=thread  (default) in-process worker threads
+    TASK_BACKEND=eager   run inline, synchronously (tests and debugging)
+    TASK_BACKEND=celery  Celery with the Redis broker at CELERY_BROKER_URL;
+                         start workers with `celery -A tasks worker -B`
+
+Every task is retried with exponential backoff and runs at most once per
+idempotency key: the key is claimed before the task body runs and only
+marked done once it succeeds, so retries and duplicate enqueues are safe.
+
+NIGHTLY_TASKS (outbox compaction, rollup rebuild, duplicate scan, archival)
+run on Celery beat, or with the thread backend on a scheduler thread in each
+web process (start_scheduler) at NIGHTLY_TASKS_AT. A database lock keeps two
+processes from running the same one at once; all of them are idempotent.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+TASK_BACKEND = os.getenv("TASK_BACKEND", "thread")
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+WEBHOOK_URLS = [u.strip() for u in os.getenv("WEBHOOK_URLS", "").split(",") if u.strip()]
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+# Worker threads of TASK_BACKEND=thread
+TASK_WORKER_THREADS = int(os.getenv("TASK_WORKER_THREADS", "4"))
+
+# Local time (HH:MM) of the nightly tasks under the thread backend
+NIGHTLY_TASKS_AT = os.getenv("NIGHTLY_TASKS_AT", "03:00")
+NIGHTLY_TASKS = ("compact_story_changes", "rebuild_status_rollup", "scan_duplicate_clusters", "archive_stories")
+
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+CLAIM_TTL_SECONDS = 300
+
+logger = logging.getLogger("tasks")
+
+_registry = {}
+
+
+# ---------------------------------------------------------------------------
+# Idempotency
+# ---------------------------------------------------------------------------
+
+class MemoryIdempotencyStore:
+    """Per-process claim/done markers with expiry."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return False
+            self._entries[key] = ("running", now + CLAIM_TTL_SECONDS)
+            if len(self._entries) > 100_000:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+            return True
+
+    def done(self, key: str):
+        with self._lock:
+            self._entries[key] = ("done", time.monotonic() + IDEMPOTENCY_TTL_SECONDS)
+
+    def release(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    """Claim/done markers shared by every Celery worker."""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def claim(self, key: str) -> bool:
+        return bool(self._redis.set(f"task:{key}", "running", nx=True, ex=CLAIM_TTL_SECONDS))
+
+    def done(self, key: str):
+        self._redis.set(f"task:{key}", "done", ex=IDEMPOTENCY_TTL_SECONDS)
+
+    def release(self, key: str):
+        self._redis.delete(f"task:{key}")
+
+
+_idempotency = None
+
+
+def _idempotency_store():
+    global _idempotency
+    if _idempotency is None:
+        if TASK_BACKEND == "celery":
+            _idempotency = RedisIdempotencyStore(CELERY_BROKER_URL)
+        else:
+            _idempotency = MemoryIdempotencyStore()
+    return _idempotency
+
+
+def run_task(name: str, kwargs: dict, idempotency_key: str = None):
+    """
+    Run a registered task body once. Raises on failure so the backend can
+    retry; returns without running when the key was already processed.
+    """
+    fn = _registry[name]["fn"]
+    if idempotency_key is None:
+        return fn(**kwargs)
+
+    store = _idempotency_store()
+    key = f"{name}:{idempotency_key}"
+    if not store.claim(key):
+        logger.debug("Skipping %s, already processed", key)
+        return None
+    try:
+        result = fn(**kwargs)
+    except Exception:
+        store.release(key)
+        raise
+    store.done(key)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class ThreadBackend:
+    """
+    Runs tasks on a small pool of daemon worker threads, so one slow task (a
+    webhook waiting out its timeout) does not hold up the rest; retries are
+    rescheduled with timers.
+    """
+
+    def __init__(self, workers: int = TASK_WORKER_THREADS):
+        self._queue = queue.Queue()
+        self._threads = [None] * workers
+        self._lock = threading.Lock()
+        # Retries waiting on their timer; they are not in the queue yet
+        self._timers = set()
+
+    def submit(self, name, kwargs, idempotency_key, attempt=0):
+        self._ensure_workers()
+        self._queue.put((name, kwargs, idempotency_key, attempt))
+
+    def _ensure_workers(self):
+        with self._lock:
+            for i, thread in enumerate(self._threads):
+                if thread is None or not thread.is_alive():
+                    thread = threading.Thread(target=self._work, name=f"task-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads[i] = thread
+
+    def _work(self):
+        while True:
+            name, kwargs, idempotency_key, attempt = self._queue.get()
+            try:
+                run_task(name, kwargs, idempotency_key)
+            except Exception:
+                options = _registry[name]
+                if attempt >= options["max_retries"]:
+                    logger.exception("Task %s failed after %d attempts", name, attempt + 1)
+                    continue
+                delay = options["retry_backoff"] * (2 ** attempt)
+                logger.warning("Task %s failed, retrying in %.1fs", name, delay)
+                self._retry_later(delay, (name, kwargs, idempotency_key, attempt + 1))
+            finally:
+                self._queue.task_done()
+
+    def _retry_later(self, delay, args):
+        def fire():
+            # Queued before the timer is dropped, so join() always sees one of the two
+            self.submit(*args)
+            with self._lock:
+                self._timers.discard(timer)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def join(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every submitted task has finished running, retries still
+        waiting on their timer included (tests, shutdown). Returns False if
+        work was still pending after timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                pending = self._queue.unfinished_tasks or self._timers
+            if not pending:
+                return True
+            time.sleep(0.01)
+        return False
+
+
+class EagerBackend:
+    """Runs tasks inline, retrying immediately; for tests and local debugging."""
+
+    def submit(self, name, kwargs, idempotency_key, attempt=0):
+        options = _registry[name]
+        for attempt in range(options["max_retries"] + 1):
+            try:
+                return run_task(name, kwargs, idempotency_key)
+            except Exception:
+                if attempt >= options["max_retries"]:
+                    logger.exception("Task %s failed after %d attempts", name, attempt + 1)
+
+
+class CeleryBackend:
+    def submit(self, name, kwargs, idempotency_key, attempt=0):
+        celery_app.send_task(name, kwargs={"kwargs": kwargs, "idempotency_key": idempotency_key})
+
+
+celery_app = None
+if TASK_BACKEND == "celery":
+    import events
+
+    # Events published by Celery workers (e.g. archive_stories) must reach the web processes
+    if events.EVENT_BROKER != "redis":
+        raise RuntimeError("TASK_BACKEND=celery requires EVENT_BROKER=redis")
+
+    from celery import Celery
+
+    celery_app = Celery("agile_tasks", broker=CELERY_BROKER_URL)
+    celery_app.conf.update(
+        task_serializer="json",
+        accept_content=["json"],
+        task_acks_late=True,
+        task_reject_on_worker_lost=True,
+        worker_prefetch_multiplier=1,
+    )
+
+
+def task(name: str, max_retries: int = 3, retry_backoff: float = 1.0):
+    """Register fn as a background task under `name`."""
+    def decorator(fn):
+        _registry[name] = {"fn": fn, "max_retries": max_retries, "retry_backoff": retry_backoff}
+        if celery_app is not None:
+            @celery_app.task(
+                name=name, bind=True, autoretry_for=(Exception,),
+                max_retries=max_retries, retry_backoff=retry_backoff, retry_jitter=True,
+            )
+            def celery_task(self, kwargs, idempotency_key=None):
+                return run_task(name, kwargs, idempotency_key)
+        return fn
+    return decorator
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if TASK_BACKEND == "celery":
+            _backend = CeleryBackend()
+        elif TASK_BACKEND == "eager":
+            _backend = EagerBackend()
+        else:
+            _backend = ThreadBackend()
+    return _backend
+
+
+def enqueue(name: str, idempotency_key: str = None, **kwargs):
+    """Schedule a registered task. kwargs must be JSON-serializable."""
+    if name not in _registry:
+        raise KeyError(f"Unknown task '{name}'")
+    try:
+        get_backend().submit(name, kwargs, idempotency_key)
+    except Exception:
+        # Post-commit work must never fail the request that triggered it
+        logger.exception("Could not enqueue task %s", name)
+
+
+# ---------------------------------------------------------------------------
+# Tasks
+# ---------------------------------------------------------------------------
+
+@task("deliver_webhook", max_retries=5, retry_backoff=2.0)
+def deliver_webhook(url: str, event: dict):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(event).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "X-Event-Type": event.get("type", ""),
+            "X-Event-Id": str(event.get("cursor", "")),
+        },
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT_SECONDS) as response:
+        if response.status >= 400:
+            raise RuntimeError(f"Webhook {url} answered {response.status}")
+
+
+@task("compact_story_changes")
+def compact_story_changes():
+    import outbox
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return outbox.compact(db)
+    finally:
+        db.close()
+
+
+@task("rebuild_status_rollup")
+def rebuild_status_rollup(days: int = None, full: bool = False):
+    """Recompute the last `days` days of daily_status_rollup, or all of it with full=True."""
+    from datetime import date, timedelta
+
+    import rollup
+    from database import SessionLocal
+
+    days = rollup.ROLLUP_REBUILD_DAYS if days is None else days
+    db = SessionLocal()
+    try:
+        start = None if full else date.today() - timedelta(days=days)
+        return rollup.rebuild(db, start=start)
+    finally:
+        db.close()
+
+
+@task("scan_duplicate_clusters")
+def scan_duplicate_clusters(threshold: float = None):
+    """Rebuild the near-duplicate index from the database and log duplicate clusters."""
+    import duplicates
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        clusters = duplicates.rebuild(db).clusters(threshold)
+    finally:
+        db.close()
+    for cluster in clusters:
+        logger.info("Possible duplicate stories: %s", ", ".join(f"#{s['id']}" for s in cluster))
+    return len(clusters)
+
+
+@task("archive_stories")
+def archive_stories(dry_run: bool = False):
+    """Move stories past the retention policy into stories_archive (archive.py)."""
+    import archive
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        due = archive.due_for_archive(db)
+        if dry_run:
+            return len(due)
+        archived = archive.archive_stories(db, due)
+    finally:
+        db.close()
+    for change_id, story in archived:
+        after_story_change(change_id, "archived", story)
+    logger.info("Archived %d stories", len(archived))
+    return len(archived)
+
+
+@task("count_status_change")
+def count_status_change(project_id: int, day: str, from_status: str = None, to_status: str = None):
+    """Count one story entering to_status and/or leaving from_status in daily_status_rollup."""
+    import rollup
+    from database import SessionLocal
+
+    when = datetime.fromisoformat(day)
+    db = SessionLocal()
+    try:
+        if to_status:
+            rollup.record_transition(db, project_id, from_status, to_status, when)
+        else:
+            rollup.record_exit(db, project_id, from_status, when)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _status_change(kind: str, story: dict, previous: dict = None):
+    """(from_status, to_status) of a story change, or None if its status did not change."""
+    if kind == "created":
+        return None, story["status"]
+    if kind == "updated" and previous and previous["status"] != story["status"]:
+        return previous["status"], story["status"]
+    if kind == "deleted":
+        return story["status"], None
+    return None
+
+
+def after_story_change(change_id: int, kind: str, story: dict, previous: dict = None):
+    """
+    Post-commit fan-out for a story mutation: live-feed event, rollup count
+    and webhooks. change_id is the story_changes outbox id and doubles as
+    the event id and the tasks' idempotency key.
+
+    The event is published right here, in the process that made the change:
+    with an in-memory broker only this process has the subscribers, and a
+    queued publish would wait behind slow tasks such as webhook deliveries.
+    """
+    import events
+
+    event = events.story_event(kind, story, previous)
+    event["cursor"] = change_id
+    events.get_broker().publish(event)
+    status_change = _status_change(kind, story, previous)
+    if status_change is not None:
+        enqueue(
+            "count_status_change", idempotency_key=str(change_id),
+            project_id=story["projectId"], day=datetime.now().isoformat(),
+            from_status=status_change[0], to_status=status_change[1],
+        )
+    for url in WEBHOOK_URLS:
+        enqueue("deliver_webhook", idempotency_key=f"{change_id}:{url}", url=url, event=event)
+
+
+if celery_app is not None:
+    celery_app.conf.beat_schedule = {
+        f"{name}-nightly": {"task": name, "schedule": 24 * 3600, "kwargs": {"kwargs": {}}}
+        for name in NIGHTLY_TASKS
+    }
+
+
+# ---------------------------------------------------------------------------
+# Nightly scheduler for the thread backend
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def _task_lock(name: str):
+    """Yield whether this process got the database-wide lock for task `name` (never waits)."""
+    from sqlalchemy import text
+
+    from database import engine
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        dialect = connection.dialect.name
+        if dialect == "mysql":
+            acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": f"task:{name}"}).scalar() == 1
+            release = text("SELECT RELEASE_LOCK(:name)"), {"name": f"task:{name}"}
+        elif dialect == "postgresql":
+            key = zlib.crc32(f"task:{name}".encode())
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+            release = text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+        else:
+            # SQLite: a single host; its writes are serialized anyway
+            acquired, release = True, None
+        try:
+            yield acquired
+        finally:
+            if acquired and release is not None:
+                connection.execute(*release)
+
+
+def run_nightly_tasks():
+    """Run every NIGHTLY_TASKS entry that no other process is running right now."""
+    for name in NIGHTLY_TASKS:
+        try:
+            with _task_lock(name) as acquired:
+                if not acquired:
+                    logger.info("Skipping %s, running in another process", name)
+                    continue
+                logger.info("Running nightly task %s", name)
+                run_task(name, {})
+        except Exception:
+            logger.exception("Nightly task %s failed", name)
+
+
+def seconds_until(at: str, now: datetime = None) -> float:
+    """Seconds from now until the next local HH:MM."""
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+_scheduler = None
+
+
+def start_scheduler():
+    """Start the nightly scheduler thread of this process (thread backend only; idempotent)."""
+    global _scheduler
+    if TASK_BACKEND != "thread" or (_scheduler is not None and _scheduler.is_alive()):
+        return
+
+    def loop():
+        while True:
+            time.sleep(seconds_until(NIGHTLY_TASKS_AT))
+            run_nightly_tasks()
+
+    _scheduler = threading.Thread(target=loop, name="task-scheduler", daemon=True)
+    _scheduler.start()
@@ -0,0 +1,152 @@
+"""
+Opt-in traffic capture.
+
+Records one JSON line per HTTP request to TRAFFIC_CAPTURE_FILE: route
+template, concrete path, query parameters, the shape of the JSON body,
+response status and server-side duration. Credentials never leave the
+process: Authorization headers are reduced to an "auth" flag and sensitive
+body keys (passwords, tokens) are redacted. Set TRAFFIC_CAPTURE_BODIES=1 to
+also keep the redacted body values so bench/replay.py can resend them as-is.
+
+Enable by setting TRAFFIC_CAPTURE_FILE; nothing is registered otherwise.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from urllib.parse import parse_qsl
+
+TRAFFIC_CAPTURE_FILE = os.getenv("TRAFFIC_CAPTURE_FILE")
+TRAFFIC_CAPTURE_BODIES = os.getenv("TRAFFIC_CAPTURE_BODIES", "0") == "1"
+MAX_CAPTURED_BODY_BYTES = 256 * 1024
+
+SENSITIVE_KEYS = {"password", "new_password", "newPassword", "password_hash", "access_token", "accessToken", "token"}
+SENSITIVE_PARAMS = {"token", "access_token"}
+REDACTED = "***"
+
+
+def body_shape(value):
+    """Describe a JSON value by its structure rather than its content."""
+    if isinstance(value, dict):
+        return {k: body_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return {"list": len(value), "item": body_shape(value[0]) if value else None}
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: (REDACTED if k in SENSITIVE_KEYS else redact(v)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+class TraceWriter:
+    """Appends trace records from a background thread so requests never block on disk."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def write(self, record: dict):
+        # Started on first use so each forked server worker gets its own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._thread.start()
+        self._queue.put(record)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                f.write(json.dumps(record, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware that records a sanitized trace of every HTTP request."""
+
+    def __init__(self, app, writer: TraceWriter):
+        self.app = app
+        self.writer = writer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        captured = 0
+        status_holder = {}
+
+        async def receive_wrapper():
+            nonlocal captured
+            message = await receive()
+            if message["type"] == "http.request" and captured < MAX_CAPTURED_BODY_BYTES:
+                body = message.get("body", b"")
+                chunks.append(body)
+                captured += len(body)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.writer.write(self._record(scope, b"".join(chunks), status_holder.get("status"), started_at, duration_ms))
+
+    def _record(self, scope, raw_body, status_code, started_at, duration_ms):
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        route = scope.get("route")
+        params = [
+            [k, REDACTED if k in SENSITIVE_PARAMS else v]
+            for k, v in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        ]
+        record = {
+            "ts": round(started_at, 6),
+            "method": scope["method"],
+            "route": getattr(route, "path", None) or scope["path"],
+            "path": scope["path"],
+            "params": params,
+            "auth": "authorization" in headers,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 3),
+        }
+        if raw_body and "json" in headers.get("content-type", ""):
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                body = None
+            if body is not None:
+                record["body_shape"] = body_shape(body)
+                if TRAFFIC_CAPTURE_BODIES:
+                    record["body"] = redact(body)
+        return record
+
+
+def install(app):
+    """Attach the capture middleware to app, writing to TRAFFIC_CAPTURE_FILE."""
+    app.add_middleware(TrafficCaptureMiddleware, writer=TraceWriter(TRAFFIC_CAPTURE_FILE))
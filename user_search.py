@@ -0,0 +1,57 @@
+"""
+Paginated, prefix-searchable user directory for GET /users.
+
+Each searchable field has an indexed lowercased copy on users
+(`username_key`, `first_name_key`, `last_name_key`, `email_key`, kept in
+sync by the model with models.search_key, which also normalizes the query),
+and a prefix is matched as the range `prefix <= key < next(prefix)`, which
+every backend answers from the index. The ranges compare code points, so the
+key columns use a binary collation on MySQL. Every word of the query must
+prefix-match one of the fields, so "ada lov" finds Ada Lovelace.
+"""
+import sys
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+import models
+
+SEARCH_KEYS = (
+    models.User.username_key,
+    models.User.first_name_key,
+    models.User.last_name_key,
+    models.User.email_key,
+)
+
+
+def prefix_upper(prefix: str):
+    """
+    Smallest string greater than every string starting with prefix, or None
+    when there is none (the prefix is only U+10FFFF code points).
+    """
+    # U+10FFFF has no successor: drop it and bump the code point before it
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def matches(word: str):
+    word = models.search_key(word)
+    upper = prefix_upper(word)
+    if upper is None:
+        return or_(*(key >= word for key in SEARCH_KEYS))
+    return or_(*(and_(key >= word, key < upper) for key in SEARCH_KEYS))
+
+
+def search(db: Session, q, limit: int, offset: int):
+    """(total, users) for one page of users matching q, ordered by username."""
+    query = db.query(models.User)
+    for word in (q or "").split():
+        query = query.filter(matches(word))
+    total = query.count()
+    users = (
+        query.order_by(models.User.username_key, models.User.id)
+        .offset(offset).limit(limit).all()
+    )
+    return total, users